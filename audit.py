@@ -8,7 +8,11 @@ exception class names and short tags, not payloads — stdout hygiene in bot.py'
 text handler applies to this collection too.
 
 Writes are best-effort: a broken audit write must not take down a login or an
-upload, so failures are printed loudly and swallowed.
+upload, so failures are printed loudly and swallowed. They are also written
+behind (write_behind.py): an event is buffered and inserted in a batch, so no
+login or upload waits on the audit trail. The buffer is bounded; while Mongo
+is down, events past the bound are dropped and counted, never queued without
+limit. shutdown() flushes it.
 """
 
 import os
@@ -16,8 +20,10 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from db import db
+from write_behind import Buffer
 
 auth_events_col = db["auth_events"]
+_buffer = Buffer(auth_events_col, "auth events")
 
 RETENTION_DAYS = int(os.getenv("AUTH_EVENTS_RETENTION_DAYS", "365"))
 
@@ -33,18 +39,15 @@ async def log_auth_event(
     detail: Optional[str] = None,
 ) -> None:
     assert event in EVENTS, f"unknown auth event: {event}"
-    try:
-        await auth_events_col.insert_one(
-            {
-                "telegram_id": telegram_id,
-                "event": event,
-                "ts": datetime.now(timezone.utc),
-                "outcome": outcome,
-                "detail": detail,
-            }
-        )
-    except Exception as e:
-        print(f"⚠️  auth event write failed ({event}, user={telegram_id}): {e}", flush=True)
+    _buffer.add(
+        {
+            "telegram_id": telegram_id,
+            "event": event,
+            "ts": datetime.now(timezone.utc),
+            "outcome": outcome,
+            "detail": detail,
+        }
+    )
 
 
 async def create_indexes() -> None:
@@ -1,14 +1,15 @@
-"""Telegram layer: handlers, per-user single-flighting, and user-facing copy.
+"""Telegram layer: handlers and per-user single-flighting.
 
 The workout flow itself (quota, LLM parse, upload, token refresh) lives in
-workout_service.py and returns a typed Outcome; this module only decides what
-to say to the user. Login/logout stay here because they are inherently
+workout_service.py and returns a typed Outcome; the words for each outcome
+live in replies.py, shared with worker.py. Login/logout stay here because they are inherently
 conversational (two-prompt handshake, scrubbing the password message).
 """
 
 import os
 import traceback
 
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from pyrogram import Client, filters, raw
 from pyrogram.types import (
@@ -18,11 +19,21 @@ from pyrogram.types import (
     WebAppInfo,
 )
 
+import bot_api
+import redis_conn
+import replies
 import session
 import token_crypto
+import token_refresher
+import upload_outbox
+import user_lock
+import webhook
+import work_stream
+import workout_queue
+import write_behind
 from audit import create_indexes as create_audit_indexes
 from audit import log_auth_event
-from garmin import login_to_garmin, workout_url
+from garmin import close_http, login_to_garmin, workout_url
 from garmin_curl_login import GarminInvalidCredentials
 from rate_limiter import (
     RateLimiterUnavailable,
@@ -39,11 +50,13 @@ from user import (
     delete_user,
     get_user,
     has_garmin_auth,
+    mark_active,
     save_user,
 )
 from webapp_server import start_webapp
+from workout_ai import Priority, close_clients
 from workout_log import create_indexes as create_workout_indexes
-from workout_service import FailureCode, Success, process_workout
+from workout_service import process_workout
 
 # Load environment variables
 load_dotenv()
@@ -54,58 +67,33 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 # deploy's TLS). Unset means the /settings button can't be offered — Telegram
 # refuses non-HTTPS web_app URLs — so the command degrades to an explanation.
 WEBAPP_URL = os.getenv("WEBAPP_URL", "")
+# Where workouts run. "local": in this process, as always. "stream": this
+# process only receives updates and hands authorized plans to worker.py
+# processes over Redis (work_stream.py), so workout throughput scales past one
+# process. Needs Redis.
+WORKOUT_DISPATCH = os.getenv("WORKOUT_DISPATCH", "local")
+# How updates arrive. "polling": Pyrogram's MTProto connection, as always.
+# "webhook": Telegram POSTs them to the webapp server (webhook.py), and the
+# Pyrogram client only sends. Needs WEBHOOK_URL and WEBHOOK_SECRET.
+TELEGRAM_UPDATES = os.getenv("TELEGRAM_UPDATES", "polling")
 
 # States
 AWAIT_USERNAME = "await_username"
 AWAIT_PASSWORD = "await_password"
 AUTHORIZED = "authorized"
 
-# One workout at a time per user. Maps a user_id to the live "Uploading..." notice
-# while their workout is in flight (None during the brief window after the slot is
-# claimed but before the notice is sent). Presence of the key — not its value — is
-# the lock; a user already present has further messages ignored, not queued. In
-# process only, which is all we need: a long-polling bot is a single Telegram
-# consumer, so one process holds all of a user's traffic.
-_active_notice: dict[int, "Message | None"] = {}
-
-_PROCESSING_TEXT = "Uploading your workout to Garmin Connect..."
-
-# Appended to the processing notice when we ignore a message sent mid-flight.
-_BUSY_SUFFIX = (
-    "\n\n⚠️ I can only process one workout at a time. "
-    "I'm ignoring new messages until this one finishes — resend them after."
-)
-
-# What each service failure sounds like to the user. {detail} is filled from
-# Failure.detail (only RATE_LIMITED uses it — the limiter's own message names
-# the window and the wait).
-_FAILURE_REPLIES: dict[FailureCode, str] = {
-    FailureCode.RATE_LIMITED: "⚠️ {detail}",
-    FailureCode.LIMITER_DOWN: (
-        "Can't process workouts right now — usage tracking is unavailable. "
-        "Please try again in a few minutes."
-    ),
-    FailureCode.LLM_BUSY: "I'm handling a lot of workouts right now. Send that again in a moment.",
-    FailureCode.CONFIG_ERROR: "Something's broken on my side. Please try again later.",
-    FailureCode.PROVIDER_QUOTA: (
-        "⛔ I've run out of AI credits, so I can't parse workouts right now. "
-        "Your workout text is fine — this attempt wasn't counted against your "
-        "quota. Please try again later."
-    ),
-    FailureCode.PARSE_TIMEOUT: "Parsing timed out. Please try again.",
-    FailureCode.PARSE_FAILED: (
-        "I couldn't turn that into a workout. Try describing the intervals "
-        "with distances and paces, e.g. '2km warmup, 10x400m @ 3:45, 2km cooldown'."
-    ),
-    FailureCode.TOKEN_UNREADABLE: (
-        "Your stored Garmin session is unreadable. Use /logout then /start to log in again."
-    ),
-    FailureCode.AUTH_EXPIRED: "Session expired and refresh failed. Use /logout then /start to re-login.",
-    FailureCode.UPLOAD_FAILED: "Failed to import workout into Garmin. Please try again.",
-}
+# The LLM queue class for a user's NEXT workout, when it shouldn't be plain
+# INTERACTIVE: the first one after a (re-)login, or a resend after a failure
+# that was ours rather than theirs. Consumed by that next workout. In process:
+# losing a hint on restart, or to another replica, only costs a little queue
+# position.
+_priority_hint: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
 
 # Initialize Pyrogram Client
-app = Client("garmin_bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+app = Client(
+    "garmin_bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN,
+    no_updates=TELEGRAM_UPDATES == "webhook",
+)
 
 # /start command: begin login flow
 @app.on_message(filters.command("start") & filters.private)
@@ -135,6 +123,8 @@ async def logout_handler(client: Client, message: Message):
     user_data = await get_user(user_id)
     if user_data and user_data.get("state") == AUTHORIZED:
         await delete_user(user_id)
+        await workout_queue.clear(user_id)
+        await upload_outbox.clear(user_id)
         await log_auth_event(user_id, "logout")
         # Honest copy: there is no revocation endpoint reachable from this flow
         # (scraped SSO session, not a registered OAuth app), so deleting our copy
@@ -216,6 +206,7 @@ async def handle_password(message: Message, user_id: int, user_data: dict):
         user_data.update({"garmin_auth": token, "state": AUTHORIZED})
         await save_user(user_id, user_data)
         await log_auth_event(user_id, "login_success")
+        _priority_hint[user_id] = Priority.FIRST_TIME
         return await message.reply(
             "Successfully logged in! Send me any workout plan (text) to import into your Garmin Connect account."
         )
@@ -243,43 +234,135 @@ async def handle_password(message: Message, user_id: int, user_data: dict):
 
 
 async def handle_workout(message: Message, user_id: int, user_data: dict):
-    # One workout at a time per user. Claim the slot synchronously — there is no
-    # await between the `in` check and the assignment — so two messages racing on
-    # separate dispatcher workers cannot both pass. A user already in flight has
-    # this message IGNORED (not queued); we just annotate their live notice.
-    if user_id in _active_notice:
-        notice = _active_notice[user_id]
-        if notice is not None:
-            try:
-                await notice.edit_text(_PROCESSING_TEXT + _BUSY_SUFFIX)
-            except Exception:
-                pass  # a repeat edit is "message not modified" — nothing to do
+    # Keeps the user in token_refresher's sweep (at most one write an hour).
+    await mark_active(user_id, user_data)
+    # One workout at a time per user, across every process: whoever takes the
+    # user's lease (user_lock.py) runs this plan and every plan queued behind
+    # it. A user already in flight has this message queued instead.
+    if WORKOUT_DISPATCH == "stream":
+        return await _dispatch(message, user_id)
+    lease = await user_lock.acquire(user_id)
+    if lease is not None:
+        return await _work_through(lease, (message, user_data))
+
+    position = await _enqueue(message, user_id)
+    if position is not None and (lease := await user_lock.acquire(user_id)) is not None:
+        # The workout in flight finished while we were queueing, and its
+        # holder has already found the queue empty: nobody is left to drain it.
+        await _work_through(lease)
+
+
+async def _enqueue(message: Message, user_id: int, priority: str | None = None) -> int | None:
+    """Queue a plan sent mid-flight and show where it stands: a reply for the
+    plan, and the live notice (on whichever process holds the lease) updated."""
+    position = await workout_queue.push(
+        user_id, message.chat.id, message.id, message.text, priority=priority
+    )
+    if position is not None:
+        await message.reply(f"📥 Queued — #{position} in line, right after the current workout.")
+    notice = await user_lock.notice(user_id)
+    suffix = replies.BUSY_SUFFIX if position is None else replies.queued_suffix(position)
+    if notice is not None:
+        try:
+            await app.edit_message_text(*notice, replies.PROCESSING_TEXT + suffix)
+        except Exception:
+            pass  # a repeat edit is "message not modified" — nothing to do
+    elif position is None:
+        await message.reply(replies.BUSY_SUFFIX.strip())
+    return position
+
+
+async def _dispatch(message: Message, user_id: int):
+    """Stream dispatch: queue the plan for a worker, which sends the processing
+    notice and the result itself."""
+    hint = _priority_hint.pop(user_id, None)
+    if await user_lock.held(user_id) or await workout_queue.depth(user_id):
+        position = await _enqueue(message, user_id, hint and hint.value)
+    else:
+        position = await workout_queue.push(
+            user_id, message.chat.id, message.id, message.text, priority=hint and hint.value
+        )
+    if position is None:
+        if hint is not None:
+            _priority_hint[user_id] = hint  # still owed to their next plan
         return
-    _active_notice[user_id] = None  # slot claimed; real notice stored below
+    await work_stream.signal(user_id)
 
-    async def on_accepted():
-        _active_notice[user_id] = await message.reply(_PROCESSING_TEXT)
 
-    async def notify(text: str):
-        await message.reply(text)
+def _reply_to(entry: dict):
+    async def reply(text: str):
+        return await app.send_message(
+            entry["chat_id"], text, reply_to_message_id=entry["message_id"]
+        )
+
+    return reply
 
+
+async def _work_through(lease: user_lock.Lease, first: tuple[Message, dict] | None = None):
+    """Hold the user's lease: run `first`, then every plan queued behind it."""
+    user_id = lease.uid
+    while lease is not None:
+        try:
+            await _drain(lease, first)
+        finally:
+            # Release no matter how we leave — success, handled reply, or a
+            # crash. (A crashed process is covered by the lease's TTL.)
+            await user_lock.release(lease)
+        first = None
+        # A plan queued after our last pop, whose sender met our lease.
+        lease = await user_lock.acquire(user_id) if await workout_queue.depth(user_id) else None
+
+
+async def _drain(lease: user_lock.Lease, first: tuple[Message, dict] | None) -> None:
+    user_id = lease.uid
+    if first is not None:
+        message, user_data = first
+        await _run_guarded(lease, user_data, message.text, message.reply)
+    # A lost lease has a new holder, who owns the queue from here.
+    while not lease.lost and (entry := await workout_queue.pop(user_id)) is not None:
+        reply = _reply_to(entry)
+        if workout_queue.expired(entry):
+            await reply(replies.EXPIRED_TEXT)
+            continue
+        # Re-read: the previous workout may have refreshed the token, or
+        # the user may have logged out while this plan waited.
+        user_data = await get_user(user_id)
+        if not user_data or user_data.get("state") != AUTHORIZED:
+            await workout_queue.clear(user_id)
+            break
+        await user_lock.set_notice(lease, None)
+        await _run_guarded(lease, user_data, entry["text"], reply)
+
+
+async def _run_guarded(lease: user_lock.Lease, user_data: dict, text: str, reply) -> None:
+    # An unexpected crash in one workout must not strand the plans queued
+    # behind it; report it and move on to the next.
     try:
-        outcome = await process_workout(
-            user_id, user_data, message.text, notify=notify, on_accepted=on_accepted
-        )
-        if isinstance(outcome, Success):
-            return await message.reply(
-                f"Workout successfully imported! 🎉\n"
-                f"{workout_url(outcome.workout_id)}\n\n"
-                f"⚡ Processed in {outcome.processing_ms:.0f}ms"
-            )
-        reply = _FAILURE_REPLIES[outcome.code].format(detail=outcome.detail)
-        return await message.reply(reply)
-    finally:
-        # Release the slot no matter how we leave — success, handled reply, or a
-        # crash. Without this a single unexpected exception would wedge the user
-        # into a permanent "busy" state with no workout ever processing.
-        _active_notice.pop(user_id, None)
+        await _run_workout(lease, user_data, text, reply)
+    except Exception:
+        traceback.print_exc()
+        await reply(replies.CRASHED_TEXT)
+
+
+async def _run_workout(lease: user_lock.Lease, user_data: dict, text: str, reply) -> None:
+    user_id = lease.uid
+
+    async def on_accepted():
+        depth = await workout_queue.depth(user_id)
+        notice = await reply(replies.PROCESSING_TEXT + replies.queued_suffix(depth))
+        await user_lock.set_notice(lease, (notice.chat.id, notice.id))
+
+    outcome = await process_workout(
+        user_id,
+        user_data,
+        text,
+        notify=reply,
+        on_accepted=on_accepted,
+        priority=_priority_hint.pop(user_id, Priority.INTERACTIVE),
+    )
+    if replies.resend_after(outcome):
+        _priority_hint[user_id] = Priority.RESEND
+    await reply(replies.outcome_text(outcome))
 
 
 _STATE_HANDLERS = {
@@ -316,6 +399,38 @@ async def text_handler(client: Client, message: Message):
     await handler(message, user_id, user_data)
 
 
+# Webhook mode's stand-in for the @app.on_message filters above: a command
+# goes to its handler, anything else (unknown commands included, as with
+# filters.text) to text_handler.
+_COMMAND_HANDLERS = {
+    "start": start_handler,
+    "logout": logout_handler,
+    "settings": settings_handler,
+    "stats": stats_handler,
+}
+
+
+async def handle_update(update: dict) -> None:
+    """Run one Bot API update from the webhook through the same handlers."""
+    message = webhook.message_from(update, app)
+    if message is None:
+        return
+    handler = _COMMAND_HANDLERS.get(message.command, text_handler)
+    await handler(app, message)
+
+
+async def _outbox_delivered(user_id: int, name: str, workout_id: str | None) -> None:
+    # Private chats: the chat id is the user id.
+    if workout_id is not None:
+        text = f"✅ Garmin is back — \"{name}\" is now in your library.\n{workout_url(workout_id)}"
+    else:
+        text = f"❌ I couldn't get \"{name}\" into Garmin Connect after all. Please send it again."
+    try:
+        await app.send_message(user_id, text)
+    except Exception as e:
+        print(f"⚠️  outbox notice to user={user_id} failed: {e}", flush=True)
+
+
 async def startup():
     """Initialize indexes and other startup tasks.
 
@@ -327,14 +442,45 @@ async def startup():
     """
     await init_rate_limiter()
     token_crypto.init()
+    if TELEGRAM_UPDATES == "webhook" and not (webhook.WEBHOOK_URL and webhook.WEBHOOK_SECRET):
+        raise RuntimeError(
+            "TELEGRAM_UPDATES=webhook needs WEBHOOK_URL (this server's public HTTPS "
+            "URL) and WEBHOOK_SECRET."
+        )
+    if WORKOUT_DISPATCH == "stream":
+        if redis_conn.client is None:
+            raise RuntimeError(
+                "WORKOUT_DISPATCH=stream needs Redis to reach the workers — set REDIS_URL."
+            )
+        await work_stream.init_group()
+        print("✓ Stream dispatch: workouts go to worker.py processes")
     await create_user_indexes()
     await create_workout_indexes()
     await create_audit_indexes()
-    print("✓ Mongo indexes created (users, workout_logs, auth_events)")
+    await upload_outbox.create_indexes()
+    print("✓ Mongo indexes created (users, workout_logs, auth_events, upload_outbox)")
+    if token_refresher.start():
+        print("✓ Background token refresh started")
+    if upload_outbox.start(_outbox_delivered):
+        print("✓ Upload outbox worker started")
 
 
 async def shutdown():
     """Release what startup() acquired. Mirrors it in reverse."""
+    if await upload_outbox.stop():
+        print("✓ Upload outbox worker stopped")
+    if await token_refresher.stop():
+        print("✓ Background token refresh stopped")
+    if await close_clients():
+        print("✓ LLM clients closed")
+    if await bot_api.close():
+        print("✓ Bot API session closed")
+    # After everything that logs, before Mongo goes away with the process.
+    written = await write_behind.flush_all()
+    dropped = sum(s["dropped"] for s in write_behind.stats().values())
+    print(f"✓ Write-behind logs flushed ({written} written, {dropped} dropped while full)")
+    if await close_http():
+        print("✓ Garmin HTTP sessions closed")
     if await close_connections():
         print("✓ Redis connections closed")
 
@@ -343,10 +489,19 @@ if __name__ == "__main__":
 
     async def main():
         await startup()
-        webapp_runner = await start_webapp()
+        use_webhook = TELEGRAM_UPDATES == "webhook"
+        webapp_runner = await start_webapp(webhook.WEBHOOK_SECRET if use_webhook else None)
         print("Starting Pyrogram...")
         await app.start()
         print(f"Bot started as @{app.me.username}")
+        if use_webhook:
+            webhook.start(handle_update)
+            await bot_api.set_webhook(
+                webhook.WEBHOOK_URL.rstrip("/") + webhook.WEBHOOK_PATH,
+                webhook.WEBHOOK_SECRET,
+                max_connections=webhook.WEBHOOK_WORKERS,
+            )
+            print(f"✓ Receiving updates by webhook ({webhook.WEBHOOK_WORKERS} workers)")
         if WEBAPP_URL:
             # Make settings permanently reachable: the bot's default menu
             # button (☰ next to the message box in every private chat) opens
@@ -365,11 +520,15 @@ if __name__ == "__main__":
             print("✓ Default menu button → settings Mini App")
         # finally, not a trailing statement: idle() returns on SIGTERM, which is how
         # Railway stops us. An exception escaping it must not skip the teardown.
+        # Stop taking updates, finish the ones accepted (they need the client
+        # to reply), then disconnect.
         try:
             await idle()
         finally:
-            await app.stop()
             await webapp_runner.cleanup()
+            if await webhook.stop():
+                print("✓ Webhook queue drained")
+            await app.stop()
             await shutdown()
 
     # Must use app.run() — it reuses the event loop that Pyrogram's
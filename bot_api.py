@@ -0,0 +1,73 @@
+"""Send-only Telegram Bot API client, for processes that don't receive updates.
+
+worker.py (stream dispatch) replies to users but must not receive their
+messages: a second Pyrogram client on the bot token would start pulling
+updates too, and the dispatcher and workers would split them — the very
+problem stream dispatch exists to solve. Plain HTTPS calls to the Bot API
+(sendMessage, editMessageText) send without consuming anything. The bot
+process also uses it for the one Bot API-only call it needs, setWebhook.
+
+One aiohttp session per process, opened on first use; close() at shutdown.
+TELEGRAM_BOT_TOKEN is read per call, so load_dotenv() may run after import.
+"""
+
+import os
+
+import aiohttp
+
+API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+TIMEOUT_S = 30
+
+_session: aiohttp.ClientSession | None = None
+
+
+class BotApiError(RuntimeError):
+    """Telegram answered ok=false (bad chat, message gone, flood wait...)."""
+
+
+async def _call(method: str, params: dict) -> dict:
+    global _session
+    if _session is None:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=TIMEOUT_S))
+    url = f"{API_BASE}/bot{os.getenv('TELEGRAM_BOT_TOKEN', '')}/{method}"
+    async with _session.post(url, json=params) as resp:
+        body = await resp.json(content_type=None)
+    if not body.get("ok"):
+        raise BotApiError(f"{method}: {body.get('error_code')} {body.get('description')}")
+    return body["result"]
+
+
+async def send_message(chat_id: int, text: str, reply_to_message_id: int | None = None) -> int:
+    """Send `text`; returns the new message's id."""
+    params: dict = {"chat_id": chat_id, "text": text}
+    if reply_to_message_id is not None:
+        # The plan may have been deleted while it waited; reply anyway.
+        params["reply_parameters"] = {
+            "message_id": reply_to_message_id,
+            "allow_sending_without_reply": True,
+        }
+    return (await _call("sendMessage", params))["message_id"]
+
+
+async def edit_message_text(chat_id: int, message_id: int, text: str) -> None:
+    await _call("editMessageText", {"chat_id": chat_id, "message_id": message_id, "text": text})
+
+
+async def set_webhook(url: str, secret: str, max_connections: int) -> None:
+    """Point Telegram's update delivery at `url` (webhook.py)."""
+    await _call("setWebhook", {
+        "url": url,
+        "secret_token": secret,
+        "allowed_updates": ["message"],
+        "max_connections": max_connections,
+    })
+
+
+async def close() -> bool:
+    """Close the HTTP session. False if none was opened."""
+    global _session
+    if _session is None:
+        return False
+    session, _session = _session, None
+    await session.close()
+    return True
@@ -5,10 +5,12 @@ Providers differ in call shape, so there is one runner per family:
   - openai reasoning (o3/gpt-5/gpt-5.6):  reasoning_effort, max_completion_tokens, no temp/seed
   - anthropic        (haiku/sonnet): extended thinking, max_tokens
   - gemini (openai-compatible):      OpenAI SDK pointed at Google's endpoint
+  - rules (workout_ai/fastpath.py):  the deterministic parser; no key, no network
 
 Each runner returns the parsed result as a dict (exclude_none), or raises on a
 refusal/truncation. A model is only run if its api_key_env var is set, so adding
-a provider you don't have a key for is harmless (it's skipped).
+a provider you don't have a key for is harmless (it's skipped); a spec with no
+api_key_env always runs.
 """
 
 import os
@@ -18,6 +20,7 @@ from typing import Awaitable, Callable
 from anthropic import AsyncAnthropic
 from openai import AsyncOpenAI
 
+from workout_ai import fastpath
 from workout_ai.models import Workout
 from workout_ai.providers import claude as _claude_provider
 from workout_ai.providers import openai as _openai_provider
@@ -105,12 +108,22 @@ async def run_gemini(system_prompt: str, description: str, model: str) -> dict:
     return _openai_dump(completion)
 
 
+async def run_fastpath(system_prompt: str, description: str, model: str) -> dict:
+    # Scored against the same checks as the LLMs. An abstention is reported as
+    # an error: production would have sent that case to the provider instead,
+    # so what matters here is that every answer it does give passes.
+    result = fastpath.parse(description)
+    if result is None:
+        raise ValueError("abstained (outside the fast-path grammar)")
+    return result
+
+
 @dataclass
 class ModelSpec:
     label: str          # provider/short-name shown in the report
     model: str          # the API model id
     runner: Runner
-    api_key_env: str    # only run if this env var is set
+    api_key_env: str | None  # only run if this env var is set; None: always
     reasoning_prompt: bool = False  # use SYSTEM_PROMPT_REASONING.md, as prod would
 
 
@@ -132,4 +145,6 @@ MODELS = [
     ModelSpec("anthropic/sonnet-4.6", "claude-sonnet-4-6", run_anthropic, "ANTHROPIC_API_KEY"),
     # "other provider" example — skipped unless GEMINI_API_KEY is set.
     ModelSpec("google/gemini-2.5-flash", "gemini-2.5-flash", run_gemini, "GEMINI_API_KEY"),
+    # The pre-LLM fast path production tries first. Free to run, so always on.
+    ModelSpec("rules/fastpath", "fastpath", run_fastpath, None),
 ]
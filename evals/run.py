@@ -104,6 +104,10 @@ def _report(results, models, runs):
         print(f"    {m.label:<26} {passed:>3}/{total:<3} ({pct:5.1f}%)   avg {avg:4.1f}s")
 
 
+def _has_key(model) -> bool:
+    return model.api_key_env is None or bool(os.environ.get(model.api_key_env))
+
+
 def _rate(t):
     return t[0] / t[1] if t[1] else 0
 
@@ -113,8 +117,8 @@ async def main():
     runs = int(os.environ.get("EVAL_RUNS", "1"))
     filters = [a.lower() for a in sys.argv[1:]]
 
-    available = [m for m in MODELS if os.environ.get(m.api_key_env)]
-    skipped = [m for m in MODELS if not os.environ.get(m.api_key_env)]
+    available = [m for m in MODELS if _has_key(m)]
+    skipped = [m for m in MODELS if not _has_key(m)]
     if filters:
         available = [m for m in available if any(f in m.label.lower() for f in filters)]
 
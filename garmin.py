@@ -1,10 +1,24 @@
 import asyncio
+import base64
+import json
 import os
-
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+from cachetools import TTLCache
+from curl_cffi.requests import AsyncSession
+from curl_cffi.requests.exceptions import HTTPError as CurlHTTPError
 from garth.exc import GarthHTTPError
+from garth.http import USER_AGENT
 from garth.http import Client as GarthClient
 from requests import HTTPError
+from requests.adapters import HTTPAdapter
 
+import garmin_breaker
+import upload_ledger
 from garmin_convert import convert
 
 
@@ -17,6 +31,20 @@ class GarminAuthExpired(Exception):
 #  * curl  — curl_cffi w/ Chrome TLS impersonation; bypasses CF JA3 fingerprinting.
 LOGIN_METHOD = os.getenv("GARMIN_LOGIN_METHOD", "garth")
 
+# --- Upload transport: "async" (default) or "garth" ---
+#  * async — curl_cffi AsyncSession on the event loop (upload_async, refresh_token_async).
+#  * garth — the garth client in a worker thread, pooled per user (_client_for).
+UPLOAD_TRANSPORT = os.getenv("GARMIN_UPLOAD_TRANSPORT", "async")
+# Most requests the async session keeps in flight (curl handles), and the
+# threads reserved for SSO logins, which are still synchronous.
+GARMIN_HTTP_MAX_CLIENTS = int(os.getenv("GARMIN_HTTP_MAX_CLIENTS", "64"))
+GARMIN_LOGIN_THREADS = int(os.getenv("GARMIN_LOGIN_THREADS", "4"))
+UPLOAD_TIMEOUT_S = 15
+
+# Pooled per-user upload clients (_client_for).
+GARMIN_CLIENT_POOL_SIZE = int(os.getenv("GARMIN_CLIENT_POOL_SIZE", "256"))
+GARMIN_CLIENT_TTL_S = int(os.getenv("GARMIN_CLIENT_TTL_S", "1800"))
+
 # Startup diagnostic: confirms from the deploy logs whether the OAuth proxy env
 # was actually picked up (the #1 cause of "still 429 on Railway" is the proxy
 # being unset/undeployed, so traffic still goes direct to Garmin's blocked IP).
@@ -54,13 +82,37 @@ async def login_to_garmin(login: str, password: str) -> str:
         client.login(login, password)
         return client.dumps()
 
-    return await asyncio.to_thread(_do_login)
+    return await _in_login_thread(_do_login)
 
 
 async def login_to_garmin_curl(login: str, password: str) -> str:
     """Login via curl_cffi w/ Chrome TLS fingerprint. Bypasses CF JA3 blocks."""
     from garmin_curl_login import curl_login
-    return await asyncio.to_thread(curl_login, login, password)
+    return await _in_login_thread(curl_login, login, password)
+
+
+# SSO logins are a multi-step synchronous form flow and still run in threads,
+# but in their own GARMIN_LOGIN_THREADS-sized pool rather than asyncio's
+# default executor. There a burst of logins queued behind (and in front of)
+# every other to_thread caller, and the executor's size, not anything we chose,
+# was the cap. Here the cap is explicit, and a login burst can only wait on
+# other logins; uploads and refreshes don't use threads at all (upload_async).
+_login_executor = ThreadPoolExecutor(
+    max_workers=GARMIN_LOGIN_THREADS, thread_name_prefix="garmin-login"
+)
+
+
+async def _in_login_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_login_executor, fn, *args)
+
+
+def token_expires_at(token: str) -> int | None:
+    """When the token's OAuth2 half expires (epoch seconds), or None if unreadable."""
+    try:
+        _, oauth2 = json.loads(base64.b64decode(token))
+        return int(oauth2["expires_at"])
+    except Exception:
+        return None
 
 
 def refresh_token(token: str) -> str:
@@ -70,9 +122,6 @@ def refresh_token(token: str) -> str:
     impersonation rather than garth's plain-requests refresh, since that
     endpoint 429s from Railway's IP just like the initial exchange.
     """
-    import base64
-    import json
-
     from garmin_oauth import (
         _exchange_oauth1_for_oauth2_curl,
         _get_oauth_consumer,
@@ -86,11 +135,160 @@ def refresh_token(token: str) -> str:
 
 
 async def refresh_token_async(token: str) -> str:
-    return await asyncio.to_thread(refresh_token, token)
+    """refresh_token on the event loop: the same signed exchange, no thread."""
+    from garmin_oauth import _to_garth_token
+
+    oauth1, _ = json.loads(base64.b64decode(token))
+    oauth2 = await _breaker_tracked(_exchange_async(oauth1))
+    return _to_garth_token(oauth1, oauth2)
+
+
+async def _breaker_tracked(call):
+    """Await a Garmin call and report how it went to garmin_breaker."""
+    try:
+        result = await call
+    except BaseException as e:
+        await garmin_breaker.record(e)
+        raise
+    await garmin_breaker.record(None)
+    return result
+
+
+async def _exchange_async(oauth1: dict) -> dict:
+    from garmin_oauth import _exchange_oauth1_for_oauth2_async, _get_oauth_consumer_async
+
+    session = _async_session()
+    consumer = await _get_oauth_consumer_async(session)
+    return await _exchange_oauth1_for_oauth2_async(session, oauth1, consumer)
+
+
+# One curl_cffi AsyncSession per event loop (in practice: the bot's). Like the
+# garth adapter below, it owns the connection pool, so uploads and refreshes
+# from every user share keep-alive connections to connectapi / the Worker; the
+# tokens travel per request, never on the session. It impersonates Chrome
+# like the rest of the Garmin traffic (garmin_oauth), since connectapi sits
+# behind the same Cloudflare classifier. Closed by close_http() at shutdown.
+_sessions: dict[asyncio.AbstractEventLoop, AsyncSession] = {}
+
+
+def _async_session() -> AsyncSession:
+    from garmin_oauth import IMPERSONATE
+
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None:
+        session = AsyncSession(impersonate=IMPERSONATE, max_clients=GARMIN_HTTP_MAX_CLIENTS)
+        _sessions[loop] = session
+    return session
+
+
+async def close_http() -> int:
+    """Close the async Garmin sessions. Best-effort: never blocks the exit.
+
+    Returns how many sessions were closed.
+    """
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    for session in sessions:
+        try:
+            await session.close()
+        except Exception as e:
+            print(f"⚠️  Garmin session close failed: {e}", flush=True)
+    return len(sessions)
+
+
+async def upload_async(token: str, garmin_json: dict) -> tuple[str, str | None]:
+    """upload_garmin_payload without garth or a thread: same contract."""
+    body, refreshed = await _connectapi_async(
+        token, "POST", "/workout-service/workout", garmin_json
+    )
+    return body["workoutId"], refreshed
+
+
+async def _connectapi_async(
+    token: str, method: str, path: str, json_body: dict | None = None
+) -> tuple[dict | None, str | None]:
+    """One connectapi call on the event loop: (response JSON or None, refreshed token or None).
+
+    garth's connectapi() is two requests we can make ourselves: if the OAuth2
+    half has expired, re-run the signed OAuth1->OAuth2 exchange (garth's
+    refresh_oauth2, and our refresh_token), then send the request with the
+    OAuth2 bearer. Both go through the OAuth proxy when it is configured, like
+    garth's calls do through _GarminProxyAdapter. A refreshed token is returned
+    for the caller to persist, exactly as the garth path reports it.
+    """
+    from garmin_oauth import _proxied_url, _proxy_headers, _to_garth_token
+
+    oauth1, oauth2 = json.loads(base64.b64decode(token))
+    refreshed = None
+    if oauth2.get("expires_at", 0) < time.time():
+        oauth2 = await _exchange_async(oauth1)
+        refreshed = _to_garth_token(oauth1, oauth2)
+
+    url = f"https://connectapi.garmin.com{path}"
+    headers = {
+        **USER_AGENT,
+        "Authorization": f"{oauth2['token_type'].title()} {oauth2['access_token']}",
+    }
+    resp = await _async_session().request(
+        method,
+        _proxied_url(url),
+        json=json_body,
+        headers=_proxy_headers(url, headers),
+        timeout=UPLOAD_TIMEOUT_S,
+    )
+    if resp.status_code == 401:
+        raise GarminAuthExpired(f"401 from {path}: {resp.text[:200]}")
+    resp.raise_for_status()
+    return (resp.json() if resp.content else None), refreshed
+
+
+class _GarminProxyAdapter(HTTPAdapter):
+    """Rewrites connectapi.garmin.com requests to the Cloudflare Worker."""
+
+    def __init__(self, base: str, secret: str, **kwargs):
+        self.base = base
+        self.secret = secret
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.netloc == "connectapi.garmin.com":
+            request.headers["X-Garmin-Host"] = parts.netloc
+            request.headers["X-Proxy-Auth"] = self.secret  # non-empty; garmin_oauth asserts it
+            # Drop the stale Host so urllib3 derives it from the worker URL.
+            request.headers.pop("Host", None)
+            request.url = self.base + parts.path + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+# One adapter for every pooled client. A requests adapter owns the urllib3
+# connection pool (and is thread-safe), so mounting the same instance on each
+# user's session shares keep-alive connections to connectapi / the Worker
+# across users, while the sessions themselves, which hold the tokens, stay
+# per user.
+_shared_adapter: HTTPAdapter | None = None
+_shared_adapter_lock = threading.Lock()
+
+
+def _adapter(max_retries) -> HTTPAdapter:
+    global _shared_adapter
+    with _shared_adapter_lock:
+        if _shared_adapter is None:
+            from garmin_oauth import _OAUTH_PROXY_BASE, _OAUTH_PROXY_SECRET
+
+            if _OAUTH_PROXY_BASE:
+                _shared_adapter = _GarminProxyAdapter(
+                    _OAUTH_PROXY_BASE, _OAUTH_PROXY_SECRET, max_retries=max_retries
+                )
+            else:
+                _shared_adapter = HTTPAdapter(max_retries=max_retries)
+        return _shared_adapter
 
 
 def _install_garth_proxy(client: GarthClient) -> None:
-    """Route a garth client's connectapi.garmin.com calls through the OAuth proxy.
+    """Mount the shared adapter on a garth client, routing its
+    connectapi.garmin.com calls through the OAuth proxy.
 
     Two garth call sites hit connectapi.garmin.com, which Railway's egress IP
     is 429-blocked on (the same IP block as the OAuth exchange):
@@ -98,64 +296,73 @@ def _install_garth_proxy(client: GarthClient) -> None:
       2. the OAuth2 *refresh* garth does internally when the token is expired
          (Client.request -> refresh_oauth2 -> sso.exchange).
 
-    Mount a requests adapter that rewrites that host to the Cloudflare Worker
-    (which re-originates from a non-blocked IP) and adds the X-Garmin-Host /
-    shared-secret headers the Worker expects. The worker hop also sidesteps
-    garth's Cloudflare JA3 fingerprint (TLS is now to workers.dev).
+    With GARMIN_OAUTH_PROXY set, the adapter rewrites that host to the
+    Cloudflare Worker (which re-originates from a non-blocked IP) and adds the
+    X-Garmin-Host / shared-secret headers the Worker expects. The worker hop
+    also sidesteps garth's Cloudflare JA3 fingerprint (TLS is now to
+    workers.dev). Unset (local / residential IPs), it is a plain adapter, kept
+    only for the shared connection pool.
 
     Mount on the generic "https://" prefix, NOT "https://connectapi.garmin.com":
     garth's exchange session (GarminOAuth1Session) only inherits the parent's
     "https://" adapter, so a host-specific mount would miss the refresh path.
     The adapter only rewrites connectapi.garmin.com and passes everything else
     (e.g. sso.garmin.com) through untouched.
-
-    No-op when GARMIN_OAUTH_PROXY is unset (local / residential IPs).
     """
-    from garmin_oauth import _OAUTH_PROXY_BASE, _OAUTH_PROXY_SECRET
-
-    if not _OAUTH_PROXY_BASE:
-        return
-
-    from urllib.parse import urlsplit
-
-    from requests.adapters import HTTPAdapter
+    # Preserve garth's retry policy on the adapter we replace.
+    existing = client.sess.adapters.get("https://")
+    client.sess.mount("https://", _adapter(getattr(existing, "max_retries", 0)))
 
-    base = _OAUTH_PROXY_BASE
-    secret = _OAUTH_PROXY_SECRET
 
-    # Preserve garth's existing retry policy on the adapter we replace.
-    _existing = client.sess.adapters.get("https://")
-    _max_retries = getattr(_existing, "max_retries", 0)
+def _new_client(token: str) -> GarthClient:
+    client = GarthClient()
+    client.loads(token)
+    _install_garth_proxy(client)
+    return client
 
-    class _GarminProxyAdapter(HTTPAdapter):
-        def send(self, request, **kwargs):
-            parts = urlsplit(request.url)
-            if parts.netloc == "connectapi.garmin.com":
-                request.headers["X-Garmin-Host"] = parts.netloc
-                request.headers["X-Proxy-Auth"] = secret  # non-empty; garmin_oauth asserts it
-                # Drop the stale Host so urllib3 derives it from the worker URL.
-                request.headers.pop("Host", None)
-                request.url = base + parts.path + (
-                    f"?{parts.query}" if parts.query else ""
-                )
-            return super().send(request, **kwargs)
 
-    client.sess.mount("https://", _GarminProxyAdapter(max_retries=_max_retries))
+# user_id -> (token the client holds, client). Uploads used to build a fresh
+# client each time: a new Session, a new TLS handshake, adapter setup, all on
+# the critical path of every workout. An entry lives GARMIN_CLIENT_TTL_S from
+# when it was stored (use does not extend it), and the pool holds at most
+# GARMIN_CLIENT_POOL_SIZE users, least recently stored evicted first.
+_pool: TTLCache = TTLCache(maxsize=GARMIN_CLIENT_POOL_SIZE, ttl=GARMIN_CLIENT_TTL_S)
+_pool_lock = threading.Lock()  # uploads run in worker threads
 
 
-def _client_for(token: str) -> GarthClient:
-    """Build a fresh, per-call garth client authenticated with `token`.
+def _client_for(token: str, user_id: int | None = None) -> GarthClient:
+    """An authenticated garth client for `token`.
 
     garth's module-level `garth.client` is a process-wide singleton, so loading
     a token into it races across concurrent uploads — user A's request could
-    fire with user B's token. Each upload gets its own client instead.
+    fire with user B's token. Clients are per user instead: pooled by user_id,
+    and reused only while the pooled client still holds exactly `token`. A
+    different token (a new login, an external refresh) builds a new client,
+    so one user's client can never carry anyone else's token, or their own
+    old one. bot.py runs one request per user at a time; only a multi-workout
+    batch uploads through one client from several threads at once, and
+    workout_service refreshes an expired token before such a batch, so garth
+    never refreshes (mutates the client) mid-batch. Without a user_id (the
+    CLI), the client is fresh and unpooled.
     """
-    client = GarthClient()
-    client.loads(token)
-    _install_garth_proxy(client)
+    if user_id is None:
+        return _new_client(token)
+    with _pool_lock:
+        entry = _pool.get(user_id)
+    if entry is not None and entry[0] == token:
+        return entry[1]
+    client = _new_client(token)
+    with _pool_lock:
+        _pool[user_id] = (token, client)
     return client
 
 
+def forget_client(user_id: int) -> None:
+    """Drop a user's pooled client: their token was refreshed or deleted."""
+    with _pool_lock:
+        _pool.pop(user_id, None)
+
+
 def _http_status(e: Exception) -> int | None:
     """The HTTP status behind an exception, or None if it isn't an HTTP error.
 
@@ -169,11 +376,18 @@ def _http_status(e: Exception) -> int | None:
     into dead code.
     """
     inner = e.error if isinstance(e, GarthHTTPError) else e
-    if isinstance(inner, HTTPError) and inner.response is not None:
+    if isinstance(inner, (HTTPError, CurlHTTPError)) and inner.response is not None:
         return inner.response.status_code
     return None
 
 
+def _may_have_landed(e: Exception) -> bool:
+    """Whether a failed write may still have been applied: a timeout, a dropped
+    connection or a 5xx can come after Garmin committed it. A 4xx cannot."""
+    status = _http_status(e)
+    return status is None or status >= 500
+
+
 def _raise_if_auth_expired(e: Exception) -> None:
     """Translate a Garmin 401 into a typed auth failure.
 
@@ -185,7 +399,9 @@ def _raise_if_auth_expired(e: Exception) -> None:
         raise GarminAuthExpired(str(e)) from e
 
 
-def upload_garmin_payload(token: str, garmin_json: dict) -> tuple[str, str | None]:
+def upload_garmin_payload(
+    token: str, garmin_json: dict, user_id: int | None = None
+) -> tuple[str, str | None]:
     """Upload one workout. Returns (workout_id, refreshed_token_or_None).
 
     garth refreshes OAuth2 internally when `expires_at` has passed (Client.request
@@ -199,18 +415,109 @@ def upload_garmin_payload(token: str, garmin_json: dict) -> tuple[str, str | Non
     just dumps() canonicalising the JSON field order; the caller persists it once
     and the comparison is stable from then on.
     """
-    client = _client_for(token)
+    client = _client_for(token, user_id)
     try:
         result = client.connectapi("/workout-service/workout", method="POST", json=garmin_json)
     except Exception as e:
+        if user_id is not None and _http_status(e) == 401:
+            forget_client(user_id)  # its token is dead; the caller refreshes
         _raise_if_auth_expired(e)
         raise
     refreshed = client.dumps()
-    return result["workoutId"], (refreshed if refreshed != token else None)
+    if refreshed == token:
+        return result["workoutId"], None
+    if user_id is not None:
+        # The client now holds the refreshed token the caller is about to
+        # persist; re-key it so the next upload (with that token) reuses it.
+        with _pool_lock:
+            _pool[user_id] = (refreshed, client)
+    return result["workoutId"], refreshed
+
+
+async def upload_garmin_payload_async(
+    token: str, garmin_json: dict, user_id: int | None = None
+) -> tuple[str, str | None]:
+    """Upload an already-converted payload without blocking the event loop.
+
+    On the default async transport this is upload_async; with
+    GARMIN_UPLOAD_TRANSPORT=garth the pooled garth client runs in a worker
+    thread instead.
+
+    With a user_id, at most once per payload (upload_ledger): the same payload
+    uploaded for the same user within UPLOAD_LEDGER_TTL_S returns the existing
+    workoutId without a POST, and a failure that may have landed anyway (a
+    timeout, a 5xx) is checked against the user's newest workouts before it is
+    reported. The CLI (no user_id) always uploads.
+    """
+    if user_id is None:
+        return await _upload_once(token, garmin_json, user_id)
+    known = await upload_ledger.lookup(user_id, garmin_json)
+    if known is not None:
+        print(f"[upload] user={user_id} duplicate payload, reusing workout {known}", flush=True)
+        return known, None
+    try:
+        result = await _upload_once(token, garmin_json, user_id)
+    except GarminAuthExpired:
+        raise
+    except Exception as e:
+        if not _may_have_landed(e):
+            raise
+        found = await _find_uploaded(token, garmin_json, user_id)
+        if found is None:
+            raise
+        print(f"[upload] user={user_id} ambiguous failure had landed as {found}: {e}", flush=True)
+        result = (found, None)
+    await upload_ledger.record(user_id, garmin_json, result[0])
+    return result
+
+
+async def _upload_once(
+    token: str, garmin_json: dict, user_id: int | None
+) -> tuple[str, str | None]:
+    if UPLOAD_TRANSPORT == "async":
+        return await _breaker_tracked(upload_async(token, garmin_json))
+    return await _breaker_tracked(
+        asyncio.to_thread(upload_garmin_payload, token, garmin_json, user_id)
+    )
+
 
+# How far back the ambiguous-failure check looks: the newest few workouts,
+# created within this many seconds of now. createdDate carries no zone and is
+# read as GMT; if Garmin ever reported local time instead, nothing would fall
+# inside the window and the failure would be reported as before — a possible
+# duplicate, never a wrongly reused workout.
+AMBIGUOUS_LOOKBACK = 5
+AMBIGUOUS_WINDOW_S = 120
 
-async def upload_parsed_workout(token: str, workout_json: dict) -> tuple[str, str | None]:
-    """Upload an already-parsed workout. Safe to retry — costs no LLM tokens.
+
+async def _find_uploaded(token: str, garmin_json: dict, user_id: int | None) -> str | None:
+    """The id of a workout matching `garmin_json` that Garmin created in the
+    last AMBIGUOUS_WINDOW_S, or None (also when the lookup itself fails)."""
+    path = f"/workout-service/workouts?start=0&limit={AMBIGUOUS_LOOKBACK}&myWorkoutsOnly=true"
+    try:
+        workouts = await _connectapi(token, "GET", path, None, user_id)
+    except Exception as e:
+        print(f"[upload] ambiguous-failure check failed: {e}", flush=True)
+        return None
+    now = datetime.now(timezone.utc)
+    window = timedelta(seconds=AMBIGUOUS_WINDOW_S)
+    for workout in workouts or []:
+        if workout.get("workoutName") != garmin_json.get("workoutName"):
+            continue
+        try:
+            created = datetime.fromisoformat(workout["createdDate"]).replace(tzinfo=timezone.utc)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if now - window <= created <= now + window:
+            return workout["workoutId"]
+    return None
+
+
+async def upload_parsed_workout(
+    token: str, workout_json: dict, user_id: int | None = None
+) -> tuple[str, str | None]:
+    """Upload an already-parsed workout. Safe to retry — costs no LLM tokens,
+    and with a user_id creates no duplicate (upload_garmin_payload_async).
 
     Returns (workout_id, refreshed_token_or_None); persist the second element
     when present or the next upload re-pays garth's internal refresh.
@@ -218,5 +525,95 @@ async def upload_parsed_workout(token: str, workout_json: dict) -> tuple[str, st
     Raises:
         GarminAuthExpired: the token is stale; refresh and call again.
     """
-    garmin_json = convert(workout_json)
-    return await asyncio.to_thread(upload_garmin_payload, token, garmin_json)
+    return await upload_garmin_payload_async(token, convert(workout_json), user_id)
+
+
+# --- Calendar scheduling ---
+#
+# A workout uploaded to the library is not on the watch's day view until it is
+# scheduled: POST /workout-service/schedule/{workoutId} with {"date": ...}
+# puts it on the calendar. Scheduling is not idempotent — every POST adds
+# another calendar entry — so a retry is only safe once we know the first
+# attempt did not land. A 4xx is a definite "no"; a timeout, a dropped
+# connection or a 5xx may have been applied before the response was lost, so
+# schedule_workout_async asks the calendar before trying again.
+
+
+def _schedule_path(workout_id) -> str:
+    return f"/workout-service/schedule/{workout_id}"
+
+
+def _calendar_path(on: date) -> str:
+    # Garmin's calendar months are zero-based.
+    return f"/calendar-service/year/{on.year}/month/{on.month - 1}"
+
+
+def _on_calendar(calendar: dict | None, workout_id, on: date) -> bool:
+    return any(
+        str(item.get("workoutId")) == str(workout_id) and item.get("date") == on.isoformat()
+        for item in (calendar or {}).get("calendarItems", [])
+    )
+
+
+def _connectapi_garth(
+    token: str, method: str, path: str, json_body: dict | None, user_id: int | None
+) -> dict | None:
+    """One connectapi call through the pooled garth client (the garth transport).
+    The token must be fresh: the caller has just uploaded with it."""
+    client = _client_for(token, user_id)
+    try:
+        return client.connectapi(path, method=method, json=json_body)
+    except Exception as e:
+        if user_id is not None and _http_status(e) == 401:
+            forget_client(user_id)
+        _raise_if_auth_expired(e)
+        raise
+
+
+async def _connectapi(
+    token: str, method: str, path: str, json_body: dict | None, user_id: int | None
+) -> dict | None:
+    if UPLOAD_TRANSPORT == "async":
+        body, _ = await _breaker_tracked(_connectapi_async(token, method, path, json_body))
+        return body
+    return await _breaker_tracked(
+        asyncio.to_thread(_connectapi_garth, token, method, path, json_body, user_id)
+    )
+
+
+async def schedule_workout_async(
+    token: str, workout_id, on: date, user_id: int | None = None
+) -> None:
+    """Put an uploaded workout on the calendar for `on`, at most once.
+
+    Retries once after an ambiguous failure, and only if the calendar shows the
+    first attempt did not land; with a user_id, a placement recorded in
+    upload_ledger is not repeated. Over the same transport and (on the default
+    one) the same HTTP session as the upload.
+
+    Raises:
+        GarminAuthExpired: the token was rejected.
+    """
+    if user_id is not None and await upload_ledger.was_scheduled(user_id, workout_id, on):
+        return  # a resend that reused the workout (upload_ledger)
+    await _schedule_once(token, workout_id, on, user_id)
+    if user_id is not None:
+        await upload_ledger.record_scheduled(user_id, workout_id, on)
+
+
+async def _schedule_once(token: str, workout_id, on: date, user_id: int | None) -> None:
+    body = {"date": on.isoformat()}
+    try:
+        await _connectapi(token, "POST", _schedule_path(workout_id), body, user_id)
+        return
+    except GarminAuthExpired:
+        raise
+    except Exception as e:
+        if not _may_have_landed(e):
+            raise
+        print(f"[schedule] workout={workout_id} ambiguous failure, checking calendar: {e}",
+              flush=True)
+    calendar = await _connectapi(token, "GET", _calendar_path(on), None, user_id)
+    if _on_calendar(calendar, workout_id, on):
+        return
+    await _connectapi(token, "POST", _schedule_path(workout_id), body, user_id)
@@ -0,0 +1,192 @@
+"""Circuit breaker around Garmin connectapi and the OAuth proxy Worker.
+
+When connectapi or the Worker in front of it is degraded, every workout
+request still paid for an LLM parse and then failed at upload with
+UPLOAD_FAILED — billed, for a failure that was never the user's. garmin.py now
+reports the outcome of every upload, refresh and connectapi call here, and
+GARMIN_BREAKER_THRESHOLD consecutive "Garmin is unwell" errors (5xx, 429, a
+connection error or timeout — not a 401 or a 4xx, which are about the
+request) open the breaker for GARMIN_BREAKER_OPEN_S. While it is open,
+workout_service turns requests away before the parse and refunds their quota.
+
+After the open period the breaker is half-open: one request at a time, cluster
+wide, is let through as a probe (the probe slot expires after
+GARMIN_BREAKER_PROBE_S, in case the probe never reaches Garmin). A probe that
+succeeds closes the breaker; one that fails opens it again.
+
+State lives in Redis, so every replica sees Garmin the same way and one trip
+protects them all: a consecutive-failure counter that expires
+GARMIN_BREAKER_WINDOW_S after the last failure, the open flag, and the probe
+slot. Without Redis it is kept per process. A Redis error never blocks a
+request: the breaker fails open, Garmin itself being the last word.
+"""
+
+import os
+import time
+
+import redis_conn
+
+GARMIN_BREAKER_DISABLED = os.getenv("GARMIN_BREAKER_DISABLED", "") == "1"
+GARMIN_BREAKER_THRESHOLD = int(os.getenv("GARMIN_BREAKER_THRESHOLD", "5"))
+GARMIN_BREAKER_OPEN_S = int(os.getenv("GARMIN_BREAKER_OPEN_S", "30"))
+GARMIN_BREAKER_PROBE_S = int(os.getenv("GARMIN_BREAKER_PROBE_S", "30"))
+GARMIN_BREAKER_WINDOW_S = int(os.getenv("GARMIN_BREAKER_WINDOW_S", "120"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_FAILURES_KEY = "garmin:breaker:failures"
+_OPEN_KEY = "garmin:breaker:open"
+_PROBE_KEY = "garmin:breaker:probe"
+
+
+class _Local:
+    """The same three keys, in process, for when Redis is absent."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.failures = 0
+        self.failures_until = 0.0
+        self.open_until = 0.0
+        self.probe_until = 0.0
+
+    def snapshot(self) -> tuple[bool, int]:
+        now = time.monotonic()
+        if now >= self.failures_until:
+            self.failures = 0
+        return now < self.open_until, self.failures
+
+
+_local = _Local()
+# Whether the last look at the shared state (or our own last report) saw
+# failures. A success only needs to reset the counter then, which keeps the
+# healthy path to one Redis read per request.
+_dirty = False
+
+
+def _state(is_open: bool, failures: int) -> str:
+    if is_open:
+        return OPEN
+    return HALF_OPEN if failures >= GARMIN_BREAKER_THRESHOLD else CLOSED
+
+
+async def _snapshot() -> tuple[bool, int]:
+    global _dirty
+    r = redis_conn.client
+    if r is None:
+        is_open, failures = _local.snapshot()
+    else:
+        is_open, failures = await r.mget(_OPEN_KEY, _FAILURES_KEY)
+        is_open, failures = bool(is_open), int(failures or 0)
+    _dirty = failures > 0
+    return is_open, failures
+
+
+async def state() -> str:
+    """CLOSED, OPEN or HALF_OPEN, without taking the probe slot."""
+    if GARMIN_BREAKER_DISABLED:
+        return CLOSED
+    try:
+        return _state(*await _snapshot())
+    except Exception as e:
+        print(f"⚠️  Garmin breaker read failed: {e}", flush=True)
+        return CLOSED
+
+
+async def allow() -> bool:
+    """Whether a request may go on to Garmin. Half-open, only the caller that
+    wins the probe slot may."""
+    if GARMIN_BREAKER_DISABLED:
+        return True
+    try:
+        current = _state(*await _snapshot())
+        if current != HALF_OPEN:
+            return current == CLOSED
+        r = redis_conn.client
+        if r is None:
+            now = time.monotonic()
+            if now < _local.probe_until:
+                return False
+            _local.probe_until = now + GARMIN_BREAKER_PROBE_S
+            return True
+        return bool(await r.set(_PROBE_KEY, "1", nx=True, ex=GARMIN_BREAKER_PROBE_S))
+    except Exception as e:
+        print(f"⚠️  Garmin breaker read failed: {e}", flush=True)
+        return True
+
+
+def counts(e: BaseException) -> bool:
+    """Whether a Garmin call's exception says Garmin (or the Worker) is unwell."""
+    from garmin import GarminAuthExpired, _http_status
+
+    if isinstance(e, GarminAuthExpired):
+        return False
+    status = _http_status(e) if isinstance(e, Exception) else None
+    if status is not None:
+        return status == 429 or status >= 500
+    # Connection errors and timeouts: curl_cffi's, requests', asyncio's.
+    return isinstance(e, OSError)
+
+
+async def record_failure() -> None:
+    global _dirty
+    _dirty = True
+    r = redis_conn.client
+    try:
+        if r is None:
+            _, failures = _local.snapshot()
+            _local.failures = failures + 1
+            _local.failures_until = time.monotonic() + GARMIN_BREAKER_WINDOW_S
+            if _local.failures >= GARMIN_BREAKER_THRESHOLD:
+                _local.open_until = time.monotonic() + GARMIN_BREAKER_OPEN_S
+                _local.failures_until = _local.open_until + GARMIN_BREAKER_WINDOW_S
+                _local.probe_until = 0.0
+                _announce(_local.failures)
+            return
+        pipe = r.pipeline()
+        pipe.incr(_FAILURES_KEY)
+        pipe.expire(_FAILURES_KEY, GARMIN_BREAKER_WINDOW_S)
+        failures, _ = await pipe.execute()
+        if failures >= GARMIN_BREAKER_THRESHOLD:
+            # Keep the count past the open period, so it ends half-open.
+            pipe = r.pipeline()
+            pipe.set(_OPEN_KEY, "1", ex=GARMIN_BREAKER_OPEN_S)
+            pipe.expire(_FAILURES_KEY, GARMIN_BREAKER_OPEN_S + GARMIN_BREAKER_WINDOW_S)
+            pipe.delete(_PROBE_KEY)
+            await pipe.execute()
+            _announce(failures)
+    except Exception as e:
+        print(f"⚠️  Garmin breaker write failed: {e}", flush=True)
+
+
+async def record_success() -> None:
+    global _dirty
+    if not _dirty:
+        return
+    _dirty = False
+    r = redis_conn.client
+    if r is None:
+        _local.failures = 0
+        _local.probe_until = 0.0
+        return
+    try:
+        await r.delete(_FAILURES_KEY, _PROBE_KEY)
+    except Exception as e:
+        print(f"⚠️  Garmin breaker write failed: {e}", flush=True)
+
+
+async def record(e: BaseException | None) -> None:
+    """Report a Garmin call's outcome: None for success, else its exception.
+    Exceptions that say nothing about Garmin's health are ignored."""
+    if GARMIN_BREAKER_DISABLED:
+        return
+    if e is None:
+        await record_success()
+    elif counts(e):
+        await record_failure()
+
+
+def _announce(failures: int) -> None:
+    print(f"[garmin] breaker OPEN for {GARMIN_BREAKER_OPEN_S}s after {failures} "
+          "consecutive Garmin errors", flush=True)
@@ -13,6 +13,7 @@ IP regardless of TLS, so the exchange is optionally routed through a Cloudflare
 Worker proxy — see GARMIN_OAUTH_PROXY below.
 """
 
+import asyncio
 import base64
 import json
 import os
@@ -22,6 +23,8 @@ from urllib.parse import parse_qs, urlencode, urlsplit
 
 import requests
 
+import redis_conn
+
 OAUTH_CONSUMER_URL = "https://thegarth.s3.amazonaws.com/oauth_consumer.json"
 ANDROID_UA = "com.garmin.android.apps.connectmobile"
 IMPERSONATE = "chrome131"
@@ -97,11 +100,140 @@ def _proxy_headers(url: str, headers: dict) -> dict:
     }
 
 
+# --- OAuth consumer cache ------------------------------------------------------
+# The consumer key/secret is one public pair shared by every garth user, and it
+# changes rarely, if ever. Fetching it from S3 on every login and every refresh
+# put a round trip, and a dependency on S3 being up, on the refresh path of
+# the upload flow. It is now resolved in order from:
+#   1. memory, fresh for GARMIN_OAUTH_CONSUMER_TTL_S; once stale it is still
+#      served while one background fetch revalidates it;
+#   2. Redis (shared by replicas, so a restart or a new replica doesn't refetch),
+#      kept for CONSUMER_REDIS_TTL_S, with the time it was fetched;
+#   3. S3, the source of truth; a successful fetch refills memory and Redis;
+#   4. a fallback when S3 fails: GARMIN_OAUTH_CONSUMER_KEY/_SECRET, else the
+#      JSON file at GARMIN_OAUTH_CONSUMER_FILE (same shape as the S3 object).
+#      It is remembered in memory, fresh for only CONSUMER_FALLBACK_TTL_S: with
+#      S3 unreachable, only the first call waits out the S3 timeout, and S3 is
+#      retried every few minutes (in the background, on the async path) rather
+#      than on every refresh. Never written to Redis.
+# A stale value beats reading the fallback again. The pair is public, so it is
+# fine in Redis; the tokens signed with it never go there.
+# The sync path (curl_login, refresh_token; they run in threads) has no Redis
+# client to use and skips step 2.
+CONSUMER_TTL_S = int(os.getenv("GARMIN_OAUTH_CONSUMER_TTL_S", str(24 * 3600)))
+CONSUMER_REDIS_TTL_S = 30 * 24 * 3600
+CONSUMER_FALLBACK_TTL_S = 300
+_CONSUMER_KEY = "garmin:oauth_consumer"
+
+_consumer: tuple[dict, float] | None = None  # (consumer, fetched at, epoch s)
+_revalidation: asyncio.Task | None = None
+
+
+def _valid_consumer(consumer) -> dict:
+    if not (isinstance(consumer, dict) and consumer.get("consumer_key")
+            and consumer.get("consumer_secret")):
+        raise ValueError("OAuth consumer is missing consumer_key/consumer_secret")
+    return consumer
+
+
+def _remember(consumer: dict, fetched_at: float | None = None) -> dict:
+    global _consumer
+    _consumer = (consumer, time.time() if fetched_at is None else fetched_at)
+    return consumer
+
+
+def _consumer_stale() -> bool:
+    return _consumer is None or time.time() - _consumer[1] >= CONSUMER_TTL_S
+
+
+def _fallback_consumer(error: Exception) -> dict:
+    """Stale memory, else the env/file fallback (remembered briefly), else
+    re-raise the S3 error."""
+    if _consumer is not None:
+        print(f"⚠️  OAuth consumer fetch failed, serving the stale copy: {error}", flush=True)
+        return _consumer[0]
+    key = os.getenv("GARMIN_OAUTH_CONSUMER_KEY", "")
+    secret = os.getenv("GARMIN_OAUTH_CONSUMER_SECRET", "")
+    path = os.getenv("GARMIN_OAUTH_CONSUMER_FILE", "")
+    consumer = None
+    if key and secret:
+        consumer = {"consumer_key": key, "consumer_secret": secret}
+    elif path:
+        try:
+            with open(path) as f:
+                consumer = _valid_consumer(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"⚠️  GARMIN_OAUTH_CONSUMER_FILE unusable: {e}", flush=True)
+    if consumer is None:
+        raise error
+    print(f"⚠️  OAuth consumer fetch failed, using the configured fallback: {error}", flush=True)
+    return _remember(consumer, time.time() - CONSUMER_TTL_S + CONSUMER_FALLBACK_TTL_S)
+
+
 def _get_oauth_consumer() -> dict:
-    """Fetch shared OAuth consumer key/secret from garth's S3 bucket."""
-    resp = requests.get(OAUTH_CONSUMER_URL, timeout=10)
+    """Shared OAuth consumer key/secret: memory, then S3, then the fallback."""
+    if not _consumer_stale():
+        return _consumer[0]
+    try:
+        resp = requests.get(OAUTH_CONSUMER_URL, timeout=10)
+        resp.raise_for_status()
+        return _remember(_valid_consumer(resp.json()))
+    except Exception as e:
+        return _fallback_consumer(e)
+
+
+async def _fetch_consumer_async(session) -> dict:
+    resp = await session.get(OAUTH_CONSUMER_URL, timeout=10)
     resp.raise_for_status()
-    return resp.json()
+    consumer = _remember(_valid_consumer(resp.json()))
+    r = redis_conn.client
+    if r is not None:
+        try:
+            await r.setex(_CONSUMER_KEY, CONSUMER_REDIS_TTL_S,
+                          json.dumps({"consumer": consumer, "fetched_at": _consumer[1]}))
+        except Exception as e:
+            print(f"⚠️  OAuth consumer Redis write failed: {e}", flush=True)
+    return consumer
+
+
+def _revalidate(session) -> None:
+    """Refetch a stale consumer in the background, at most one fetch at a time."""
+    global _revalidation
+    if _revalidation is not None and not _revalidation.done():
+        return
+
+    async def run():
+        try:
+            await _fetch_consumer_async(session)
+        except Exception as e:
+            print(f"⚠️  OAuth consumer revalidation failed, keeping the stale copy: {e}",
+                  flush=True)
+
+    _revalidation = asyncio.create_task(run())
+
+
+async def _get_oauth_consumer_async(session) -> dict:
+    """_get_oauth_consumer on a curl_cffi AsyncSession, with the Redis tier.
+
+    Only a cold process with an empty Redis waits on S3; every other call is
+    answered from memory or Redis, and revalidates in the background when stale.
+    """
+    if _consumer is None and redis_conn.client is not None:
+        try:
+            cached = await redis_conn.client.get(_CONSUMER_KEY)
+            if cached:
+                entry = json.loads(cached)
+                _remember(_valid_consumer(entry["consumer"]), entry["fetched_at"])
+        except Exception as e:
+            print(f"⚠️  OAuth consumer Redis read failed: {e}", flush=True)
+    if _consumer is None:
+        try:
+            return await _fetch_consumer_async(session)
+        except Exception as e:
+            return _fallback_consumer(e)
+    if _consumer_stale():
+        _revalidate(session)
+    return _consumer[0]
 
 
 def _oauth1_signed(method: str, url: str, consumer: dict, oauth1: dict | None,
@@ -156,15 +288,31 @@ def _exchange_ticket_for_oauth1_curl(
     return token
 
 
-def _exchange_oauth1_for_oauth2_curl(oauth1: dict, consumer: dict) -> dict:
-    """Exchange OAuth1 token for OAuth2 token over curl_cffi impersonation."""
-    from curl_cffi import requests as cffi_requests
+EXCHANGE_URL = "https://connectapi.garmin.com/oauth-service/oauth/exchange/user/2.0"
+
 
-    url = "https://connectapi.garmin.com/oauth-service/oauth/exchange/user/2.0"
+def _exchange_request(oauth1: dict, consumer: dict):
+    """The signed OAuth1->OAuth2 exchange POST: (uri, headers, body)."""
     data = {}
     if oauth1.get("mfa_token"):
         data["mfa_token"] = oauth1["mfa_token"]
-    uri, headers, body = _oauth1_signed("POST", url, consumer, oauth1, data)
+    return _oauth1_signed("POST", EXCHANGE_URL, consumer, oauth1, data)
+
+
+def _stamp_expiry(token: dict) -> dict:
+    """Turn the exchange's relative lifetimes into the absolute ones garth stores."""
+    token["expires_at"] = int(time.time() + token["expires_in"])
+    token["refresh_token_expires_at"] = int(
+        time.time() + token["refresh_token_expires_in"]
+    )
+    return token
+
+
+def _exchange_oauth1_for_oauth2_curl(oauth1: dict, consumer: dict) -> dict:
+    """Exchange OAuth1 token for OAuth2 token over curl_cffi impersonation."""
+    from curl_cffi import requests as cffi_requests
+
+    uri, headers, body = _exchange_request(oauth1, consumer)
     resp = cffi_requests.post(
         _proxied_url(uri),
         data=body,
@@ -173,12 +321,24 @@ def _exchange_oauth1_for_oauth2_curl(oauth1: dict, consumer: dict) -> dict:
         timeout=15,
     )
     resp.raise_for_status()
-    token = resp.json()
-    token["expires_at"] = int(time.time() + token["expires_in"])
-    token["refresh_token_expires_at"] = int(
-        time.time() + token["refresh_token_expires_in"]
+    return _stamp_expiry(resp.json())
+
+
+async def _exchange_oauth1_for_oauth2_async(session, oauth1: dict, consumer: dict) -> dict:
+    """_exchange_oauth1_for_oauth2_curl on a curl_cffi AsyncSession.
+
+    Same signature, same proxy rewrite; the request runs on the caller's event
+    loop. The session must impersonate IMPERSONATE, like the sync path.
+    """
+    uri, headers, body = _exchange_request(oauth1, consumer)
+    resp = await session.post(
+        _proxied_url(uri),
+        data=body,
+        headers=_proxy_headers(uri, headers),
+        timeout=15,
     )
-    return token
+    resp.raise_for_status()
+    return _stamp_expiry(resp.json())
 
 
 def _to_garth_token(oauth1: dict, oauth2: dict) -> str:
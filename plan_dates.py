@@ -0,0 +1,73 @@
+"""Calendar dates for parsed workouts, read from the plan's own day labels.
+
+With the schedule_dates preference on, workout_service places each uploaded
+workout on the athlete's Garmin calendar, so it shows up on the watch on the
+right morning instead of sitting in the workout library. The date comes from
+the same labels that mark a batch (workout_ai.batch): a batch workout's name
+starts with its label (SYSTEM_PROMPT_BATCH.md asks the model for exactly that),
+and a single workout uses the one label its plan text carries.
+
+Resolution is deterministic and conservative, like the batch detection itself:
+
+    2026-10-21, 21.10.2026    that date
+    21.10                     that day this year, or next year if it has passed
+    Tue, Tuesday, вторник     the next such weekday, today included
+    Day 3, anything else      no date: the workout is uploaded, not scheduled
+
+"Today" is the UTC date: the bot does not know the athlete's timezone, and a
+weekday a few hours off at midnight UTC still lands in the right week.
+"""
+
+import re
+from datetime import date, timedelta
+
+from workout_ai.batch import DATE_LABEL, DATE_SEP, DAY_LABEL, labels
+
+_LEADING_LABEL_RE = re.compile(
+    rf"\s*(?:(?P<day>{DAY_LABEL})\b|(?P<ddmm>{DATE_LABEL})\s*{DATE_SEP})", re.IGNORECASE
+)
+
+# Weekday prefixes, Monday first, matched against a lower-cased label. Every
+# spelling batch._WEEKDAYS accepts starts with one of these.
+_WEEKDAY_PREFIXES = (
+    ("mon", "понедельник", "пн"),
+    ("tue", "вторник", "вт"),
+    ("wed", "сред", "ср"),
+    ("thu", "четверг", "чт"),
+    ("fri", "пятниц", "пт"),
+    ("sat", "суббот", "сб"),
+    ("sun", "воскресенье", "вс"),
+)
+
+
+def resolve(label: str, today: date) -> date | None:
+    """The calendar date a day label names, or None if it names none."""
+    label = label.strip().lower()
+    try:
+        if m := re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", label):
+            return date(int(m[1]), int(m[2]), int(m[3]))
+        if m := re.fullmatch(r"(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?", label):
+            day, month = int(m[1]), int(m[2])
+            if m[3]:
+                return date(int(m[3]), month, day)
+            on = date(today.year, month, day)
+            return on if on >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None  # 31.02, 2026-13-01
+    for weekday, prefixes in enumerate(_WEEKDAY_PREFIXES):
+        if label.startswith(prefixes):
+            return today + timedelta(days=(weekday - today.weekday()) % 7)
+    return None
+
+
+def workout_dates(plan_text: str, workouts: list[dict], today: date) -> list[date | None]:
+    """One date per workout, in order. A batch workout is dated by the label
+    its name starts with; a single workout by the only label in the plan."""
+    if len(workouts) == 1:
+        found = set(labels(plan_text))
+        return [resolve(found.pop(), today) if len(found) == 1 else None]
+    dated = []
+    for workout in workouts:
+        m = _LEADING_LABEL_RE.match(workout.get("name", ""))
+        dated.append(resolve(m["day"] or m["ddmm"], today) if m else None)
+    return dated
@@ -1,4 +1,4 @@
-"""Per-user workout-structure preferences.
+"""Per-user workout-structure and calendar preferences.
 
 One place owns the preference catalog: the storage whitelist (user.py / the
 webapp API validate against KEYS), the defaults, and the enforcement. The
@@ -20,12 +20,14 @@ import copy
 # Defaults are product policy, not neutrality: warmup/cooldown sections that
 # end on the lap button and don't beep about pace match how these sections
 # are actually run, so they start enabled. Auto-adding sections the athlete
-# didn't ask for is more opinionated, so those start disabled.
+# didn't ask for is more opinionated, so those start disabled, and so does
+# writing to their calendar.
 DEFAULTS: dict[str, bool] = {
     "add_warmup": False,      # add a warmup even when the plan has none
     "add_cooldown": False,    # add a cooldown even when the plan has none
     "wu_cd_lap_press": True,  # drop warmup/cooldown distance; end on lap press
     "wu_cd_skip_pace": True,  # drop warmup/cooldown pace target
+    "schedule_dates": False,  # put dated workouts on the Garmin calendar (plan_dates.py)
 }
 
 KEYS = frozenset(DEFAULTS)
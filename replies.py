@@ -0,0 +1,123 @@
+"""User-facing copy for workout outcomes, shared by every process that replies.
+
+bot.py (the dispatcher, and the whole bot in local mode) and worker.py (stream
+mode) both turn a workout_service Outcome into chat messages; the words live
+here so the two can never drift apart. Pure text: nothing here talks to
+Telegram.
+"""
+
+import workout_queue
+from garmin import workout_url
+from workout_service import BatchOutcome, FailureCode, Outcome, Success
+
+# Failures the user didn't cause: whatever they send next is a retry that has
+# already waited once, so it shouldn't wait at the back of the queue again.
+RESEND_AFTER = frozenset(
+    {
+        FailureCode.LLM_BUSY, FailureCode.GARMIN_DOWN, FailureCode.PARSE_TIMEOUT,
+        FailureCode.UPLOAD_FAILED,
+    }
+)
+
+PROCESSING_TEXT = "Uploading your workout to Garmin Connect..."
+
+# Appended to the processing notice when the queue is full and we ignore a
+# message sent mid-flight.
+BUSY_SUFFIX = (
+    f"\n\n⚠️ {workout_queue.WORKOUT_QUEUE_MAX} workouts are already waiting. "
+    "I'm ignoring new messages until these finish — resend them after. "
+    "To send several workouts at once, put them in one message, one per day "
+    "(e.g. \"Mon: …, Wed: …\")."
+)
+
+EXPIRED_TEXT = (
+    "⌛ This workout waited too long in the queue, so I skipped it. Send it again if you still want it."
+)
+CRASHED_TEXT = "Something went wrong with this workout on my side. Please send it again."
+
+
+def queued_suffix(depth: int) -> str:
+    """Appended to the processing notice while plans wait behind it."""
+    if depth <= 0:
+        return ""
+    return f"\n\n📥 {depth} more queued — I'll do {'it' if depth == 1 else 'them'} next."
+
+
+# What each service failure sounds like to the user. {detail} is filled from
+# Failure.detail (only RATE_LIMITED uses it — the limiter's own message names
+# the window and the wait).
+FAILURE_REPLIES: dict[FailureCode, str] = {
+    FailureCode.RATE_LIMITED: "⚠️ {detail}",
+    FailureCode.LIMITER_DOWN: (
+        "Can't process workouts right now — usage tracking is unavailable. "
+        "Please try again in a few minutes."
+    ),
+    FailureCode.GARMIN_DOWN: (
+        "Garmin Connect isn't responding right now, so I didn't start on that "
+        "workout — it wasn't counted against your quota. Please try again in a minute."
+    ),
+    FailureCode.LLM_BUSY: "I'm handling a lot of workouts right now. Send that again in a moment.",
+    FailureCode.CONFIG_ERROR: "Something's broken on my side. Please try again later.",
+    FailureCode.PROVIDER_QUOTA: (
+        "⛔ I've run out of AI credits, so I can't parse workouts right now. "
+        "Your workout text is fine — this attempt wasn't counted against your "
+        "quota. Please try again later."
+    ),
+    FailureCode.PARSE_TIMEOUT: "Parsing timed out. Please try again.",
+    FailureCode.PARSE_FAILED: (
+        "I couldn't turn that into a workout. Try describing the intervals "
+        "with distances and paces, e.g. '2km warmup, 10x400m @ 3:45, 2km cooldown'."
+    ),
+    FailureCode.TOKEN_UNREADABLE: (
+        "Your stored Garmin session is unreadable. Use /logout then /start to log in again."
+    ),
+    FailureCode.AUTH_EXPIRED: "Session expired and refresh failed. Use /logout then /start to re-login.",
+    FailureCode.UPLOAD_FAILED: "Failed to import workout into Garmin. Please try again.",
+    FailureCode.UPLOAD_DEFERRED: (
+        "Garmin Connect is having trouble, so I've kept your workout and will "
+        "import it automatically — I'll message you when it's there. No need to resend."
+    ),
+}
+
+
+def schedule_note(result: Success) -> str:
+    if result.scheduled_for is not None:
+        return f"\n📅 On your calendar for {result.scheduled_for:%a %d %b}"
+    if result.schedule_failed:
+        return "\n⚠️ Couldn't add it to your Garmin calendar — it's in your workout library."
+    return ""
+
+
+def batch_reply(outcome: BatchOutcome) -> str:
+    lines = []
+    for name, result in zip(outcome.names, outcome.results, strict=True):
+        if isinstance(result, Success):
+            lines.append(f"✅ {name}\n{workout_url(result.workout_id)}{schedule_note(result)}")
+        else:
+            lines.append(f"❌ {name}\n{FAILURE_REPLIES[result.code].format(detail=result.detail)}")
+    done = sum(isinstance(r, Success) for r in outcome.results)
+    return (
+        f"Imported {done} of {len(outcome.results)} workouts.\n\n"
+        + "\n\n".join(lines)
+        + f"\n\n⚡ Processed in {outcome.processing_ms:.0f}ms"
+    )
+
+
+def outcome_text(outcome: Outcome) -> str:
+    """The reply for a finished workout request."""
+    if isinstance(outcome, Success):
+        return (
+            f"Workout successfully imported! 🎉\n"
+            f"{workout_url(outcome.workout_id)}{schedule_note(outcome)}\n\n"
+            f"⚡ Processed in {outcome.processing_ms:.0f}ms"
+        )
+    if isinstance(outcome, BatchOutcome):
+        return batch_reply(outcome)
+    return FAILURE_REPLIES[outcome.code].format(detail=outcome.detail)
+
+
+def resend_after(outcome: Outcome) -> bool:
+    """Whether the user's next workout is a retry of a failure that was ours."""
+    if isinstance(outcome, BatchOutcome):
+        return any(not isinstance(r, Success) and r.code in RESEND_AFTER for r in outcome.results)
+    return not isinstance(outcome, Success) and outcome.code in RESEND_AFTER
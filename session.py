@@ -9,8 +9,9 @@ This holds a *username*, never a password or token — don't let it drift into
 holding one, or it needs the token_crypto treatment.
 
 Caveat: this removes the state barrier to multi-replica, not the dispatch one.
-Two Pyrogram processes on the same bot token split updates nondeterministically;
-scaling out needs one dispatcher feeding a work queue, not N bots.
+Two Pyrogram processes on the same bot token split updates nondeterministically,
+so there is still exactly one bot process; to scale out, it hands workouts to
+worker.py processes instead (WORKOUT_DISPATCH=stream, work_stream.py).
 """
 
 from cachetools import TTLCache
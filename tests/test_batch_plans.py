@@ -0,0 +1,221 @@
+"""Multi-workout plans: detection (workout_ai/batch.py), the WorkoutPlan model,
+the batch parse through the gate, and process_workout's concurrent uploads
+with per-workout results."""
+
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+from cachetools import LRUCache
+from pydantic import ValidationError
+
+import redis_conn
+import workout_service
+from garmin import GarminAuthExpired
+from workout_ai import cache as parse_cache
+from workout_ai import gate as llm_gate
+from workout_ai import looks_like_batch
+from workout_ai.limiter import AdaptiveLimiter
+from workout_ai.models import MAX_WORKOUTS, WorkoutPlan
+from workout_ai.streaming import OutputOutOfBounds, check_partial
+from workout_service import BatchOutcome, Failure, FailureCode, Success
+
+WEEK = "Mon: 10x400m @ 3:45 / 200m jog\nWed: 8 km easy\nSat: 3x2km @ 4:10 / 2 min rest"
+
+
+def _workout(name):
+    return {"name": name, "intervals": [{"type": "run", "distance": 400, "pace": "03:45"}]}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [WEEK, "Mon: 10x400, Wed: 8 km easy", "Пн: 10х400 через 200\nСр — 8 км легко",
+     "Day 1: 10x400\nDay 2: tempo 5 km", "12.05: 10x400\n14.05: 5 km @ 4:30"],
+)
+def test_week_plans_are_batches(text):
+    assert looks_like_batch(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["2 km warmup, 10x400m @ 3:45 / 200m jog, 2 km cooldown",
+     "Wed: 10x400m @ 3:45", "4000/500/2000/500/4000\n4 km @ 4:20\n500 m @ 5:20",
+     "Mon: 10x400\nmon: same again",
+     "2.5 - 3 km warmup\n6x1km @ 4:00\n1.5 - 2 km cooldown",  # ranges, not dd.mm
+     "2.5 – 3 km warmup\n6x1km @ 4:00\n1.5 – 2 km cooldown"],
+)
+def test_single_workouts_are_not(text):
+    assert not looks_like_batch(text)
+
+
+def test_plan_size_is_bounded():
+    WorkoutPlan.model_validate({"workouts": [_workout("a")]})
+    with pytest.raises(ValidationError):
+        WorkoutPlan.model_validate({"workouts": []})
+    with pytest.raises(ValidationError):
+        WorkoutPlan.model_validate({"workouts": [_workout("a")] * (MAX_WORKOUTS + 1)})
+
+
+def test_stream_check_walks_every_workout_of_a_plan():
+    check_partial('{"workouts": [{"name": "a", "intervals": [{"type": "repeat", "repeat": 10')
+    with pytest.raises(OutputOutOfBounds):
+        check_partial(
+            '{"workouts": [{"name": "a", "intervals": []}, '
+            '{"name": "b", "intervals": [{"type": "repeat", "repeat": 500'
+        )
+
+
+@pytest.mark.asyncio
+async def test_batch_parse_is_one_call_cached_apart_from_a_single_parse(monkeypatch):
+    monkeypatch.setattr(parse_cache, "_memory", LRUCache(maxsize=8))
+    monkeypatch.setattr(redis_conn, "client", None)
+    monkeypatch.setattr(llm_gate, "_inflight", {})
+    monkeypatch.setattr(llm_gate, "_limiter", AdaptiveLimiter(1, 1, 1))
+    calls = []
+
+    async def fake_batch(text, *_):
+        calls.append("batch")
+        return [_workout("Mon"), _workout("Wed")]
+
+    async def fake_single(text, *_):
+        calls.append("single")
+        return _workout("one")
+
+    monkeypatch.setattr(llm_gate, "plan_batch_async", fake_batch)
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", fake_single)
+    assert [w["name"] for w in await llm_gate.parse_plan_batch(WEEK)] == ["Mon", "Wed"]
+    await llm_gate.parse_plan_batch(WEEK)
+    await llm_gate.parse_plan(WEEK)
+    assert calls == ["batch", "single"]
+
+
+def _token(expires_at):
+    oauth2 = {"access_token": "a", "expires_at": int(expires_at)}
+    return base64.b64encode(json.dumps([{"oauth_token": "o"}, oauth2]).encode()).decode()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """process_workout with every collaborator faked; returns the recorder."""
+    rec = {"consumed": 0, "parses": 0, "uploads": [], "refreshes": 0, "logs": [],
+           "token": _token(time.time() + 3600), "fail": {}, "in_flight": 0, "peak": 0}
+
+    async def consume(user_id):
+        rec["consumed"] += 1
+        return "receipt"
+
+    async def parse_plan_batch(text, *_):
+        rec["parses"] += 1
+        return [_workout(n) for n in ("Mon", "Wed", "Sat")]
+
+    async def get_garmin_token(user_data):
+        return rec["token"]
+
+    async def upload(token, garmin_json, user_id=None):
+        rec["in_flight"] += 1
+        rec["peak"] = max(rec["peak"], rec["in_flight"])
+        await asyncio.sleep(0.01)
+        rec["in_flight"] -= 1
+        name = garmin_json["workoutName"]
+        rec["uploads"].append((name, token))
+        error = rec["fail"].get(name)
+        if error is not None:
+            if isinstance(error, GarminAuthExpired):
+                del rec["fail"][name]  # the retry with the refreshed token goes through
+            raise error
+        return f"id-{name}", None
+
+    async def refresh(token):
+        rec["refreshes"] += 1
+        return _token(time.time() + 3600) + "-new"
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def log(**kwargs):
+        rec["logs"].append(kwargs)
+
+    for name, fn in {
+        "consume": consume, "parse_plan_batch": parse_plan_batch,
+        "get_garmin_token": get_garmin_token, "upload_garmin_payload_async": upload,
+        "refresh_token_async": refresh, "save_token": noop, "log_auth_event": noop,
+        "log_workout_request": log,
+    }.items():
+        monkeypatch.setattr(workout_service, name, fn)
+    return rec
+
+
+@pytest.mark.asyncio
+async def test_a_week_is_one_parse_one_debit_and_concurrent_uploads(service):
+    outcome = await workout_service.process_workout(1, {}, WEEK)
+    assert isinstance(outcome, BatchOutcome)
+    assert outcome.names == ["Mon", "Wed", "Sat"]
+    assert [r.workout_id for r in outcome.results] == ["id-Mon", "id-Wed", "id-Sat"]
+    assert (service["consumed"], service["parses"]) == (1, 1)
+    assert service["peak"] == 3
+    (log,) = service["logs"]
+    assert log["error"] is None
+    assert [entry["garmin_workout_id"] for entry in log["batch"]] == ["id-Mon", "id-Wed", "id-Sat"]
+
+
+@pytest.mark.asyncio
+async def test_each_upload_succeeds_or_fails_on_its_own(service):
+    service["fail"]["Wed"] = RuntimeError("garmin 500")
+    outcome = await workout_service.process_workout(1, {}, WEEK)
+    assert isinstance(outcome.results[0], Success) and isinstance(outcome.results[2], Success)
+    assert outcome.results[1] == Failure(FailureCode.UPLOAD_FAILED)
+    (log,) = service["logs"]
+    assert log["error"] == "1 of 3 uploads failed"
+    assert "garmin 500" in log["batch"][1]["error"]
+
+
+@pytest.mark.asyncio
+async def test_a_401_refreshes_once_and_retries_only_what_failed(service):
+    service["fail"]["Sat"] = GarminAuthExpired("401")
+    outcome = await workout_service.process_workout(1, {}, WEEK)
+    assert all(isinstance(r, Success) for r in outcome.results)
+    assert service["refreshes"] == 1
+    retried = [name for name, token in service["uploads"] if token.endswith("-new")]
+    assert retried == ["Sat"]
+
+
+@pytest.mark.asyncio
+async def test_an_expired_token_is_refreshed_once_before_the_fan_out(service):
+    service["token"] = _token(time.time() - 60)
+    await workout_service.process_workout(1, {}, WEEK)
+    assert service["refreshes"] == 1
+    assert all(token.endswith("-new") for _, token in service["uploads"])
+
+
+@pytest.mark.asyncio
+async def test_an_unreadable_expiry_is_not_refreshed_up_front(service):
+    service["token"] = "not-a-garth-token"
+    await workout_service.process_workout(1, {}, WEEK)
+    assert service["refreshes"] == 0
+    assert len(service["uploads"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_a_failed_token_save_does_not_undo_uploads_that_landed(service, monkeypatch):
+    async def save_token(*args):
+        raise ConnectionError("mongo down")
+
+    monkeypatch.setattr(workout_service, "save_token", save_token)
+    service["token"] = _token(time.time() - 60)  # refreshed, then saved, before the fan-out
+    outcome = await workout_service.process_workout(1, {}, WEEK)
+    assert isinstance(outcome, BatchOutcome)
+    assert all(isinstance(r, Success) for r in outcome.results)
+
+
+@pytest.mark.asyncio
+async def test_an_unexpected_upload_error_is_logged_and_reported(service, monkeypatch):
+    def convert(workout):
+        raise KeyError("intervals")
+
+    monkeypatch.setattr(workout_service, "convert", convert)
+    outcome = await workout_service.process_workout(1, {}, WEEK)
+    assert outcome == Failure(FailureCode.UPLOAD_FAILED)
+    (log,) = service["logs"]
+    assert log["error"] == "KeyError: 'intervals'"
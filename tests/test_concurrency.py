@@ -1,7 +1,7 @@
 """Tests for parse_plan's concurrency gate (workout_ai/gate.py).
 
 Plan item A's _ConcurrencyGate refactor became obsolete when the per-user
-semaphore was replaced by bot.py's single-flight `_active_notice` gate — there
+semaphore was replaced by the per-user single-flight gate (now user_lock.py) — there
 is one global semaphore left and one budget, so the shared-deadline attribution
 bug can no longer occur. What remained missing was any test at all for the
 machinery: LLMBusy semantics, the timeout, and slot release on every exit path.
@@ -10,25 +10,36 @@ machinery: LLMBusy semantics, the timeout, and slot release on every exit path.
 import asyncio
 
 import pytest
+from cachetools import LRUCache
 
+import redis_conn
+from workout_ai import cache as parse_cache
 from workout_ai import gate as llm_gate
+from workout_ai.limiter import AdaptiveLimiter
 
 
 @pytest.fixture
 def gate(monkeypatch):
-    """A 1-slot gate with fast timeouts so contention is cheap to arrange."""
-    sem = asyncio.Semaphore(1)
-    monkeypatch.setattr(llm_gate, "_llm_sem", sem)
+    """A 1-slot gate with fast timeouts so contention is cheap to arrange.
+
+    The parse cache is emptied and Redis detached: every test here is about
+    what happens on the way to the provider, which a cached answer skips.
+    """
+    monkeypatch.setattr(parse_cache, "_memory", LRUCache(maxsize=16))
+    monkeypatch.setattr(redis_conn, "client", None)
+    monkeypatch.setattr(llm_gate, "_inflight", {})
+    slots = AdaptiveLimiter(initial=1, floor=1, ceiling=1)
+    monkeypatch.setattr(llm_gate, "_limiter", slots)
     monkeypatch.setattr(llm_gate, "LLM_QUEUE_WAIT_S", 0.05)
     monkeypatch.setattr(llm_gate, "LLM_TIMEOUT_S", 0.2)
-    return sem
+    return slots
 
 
 @pytest.mark.asyncio
 async def test_provider_called_once_when_free(gate, monkeypatch):
     calls = []
 
-    async def fake_plan(text):
+    async def fake_plan(text, *_):
         calls.append(text)
         return {"name": "w"}
 
@@ -42,7 +53,7 @@ async def test_llmbusy_when_slots_exhausted_and_nothing_billed(gate, monkeypatch
     release = asyncio.Event()
     calls = []
 
-    async def slow_plan(text):
+    async def slow_plan(text, *_):
         calls.append(text)
         await release.wait()
         return {"name": "w"}
@@ -68,7 +79,7 @@ async def test_llmbusy_is_not_a_timeout(gate, monkeypatch):
 
 @pytest.mark.asyncio
 async def test_provider_timeout_raises_and_releases_the_slot(gate, monkeypatch):
-    async def hang(text):
+    async def hang(text, *_):
         await asyncio.sleep(30)
 
     monkeypatch.setattr(llm_gate, "plan_to_json_async", hang)
@@ -76,7 +87,7 @@ async def test_provider_timeout_raises_and_releases_the_slot(gate, monkeypatch):
         await llm_gate.parse_plan("hangs")
 
     # The slot must be free again: a healthy call now succeeds instead of LLMBusy.
-    async def fast(text):
+    async def fast(text, *_):
         return {"name": "w"}
 
     monkeypatch.setattr(llm_gate, "plan_to_json_async", fast)
@@ -87,7 +98,7 @@ async def test_provider_timeout_raises_and_releases_the_slot(gate, monkeypatch):
 async def test_shed_request_does_not_leak_a_slot(gate, monkeypatch):
     release = asyncio.Event()
 
-    async def slow_plan(text):
+    async def slow_plan(text, *_):
         await release.wait()
         return {"name": "w"}
 
@@ -99,4 +110,63 @@ async def test_shed_request_does_not_leak_a_slot(gate, monkeypatch):
     release.set()
     await first
 
-    assert not gate.locked()  # every exit path released what it acquired
+    assert gate.in_flight == 0  # every exit path released what it acquired
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_plans_share_one_call_and_one_slot(gate, monkeypatch):
+    release = asyncio.Event()
+    calls = []
+
+    async def slow_plan(text, *_):
+        calls.append(text)
+        await release.wait()
+        return {"name": "w"}
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", slow_plan)
+    traces = [llm_gate.ParseTrace() for _ in range(5)]
+    tasks = [asyncio.create_task(llm_gate.parse_plan("coach plan", t)) for t in traces]
+    await asyncio.sleep(0.1)  # past LLM_QUEUE_WAIT_S: unshared, four would be LLMBusy
+
+    release.set()
+    assert await asyncio.gather(*tasks) == [{"name": "w"}] * 5
+    assert calls == ["coach plan"]
+    assert sorted(t.cache for t in traces) == ["coalesced"] * 4 + ["miss"]
+    assert gate.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_one_waiter_giving_up_does_not_cancel_the_shared_call(gate, monkeypatch):
+    release = asyncio.Event()
+
+    async def slow_plan(text, *_):
+        await release.wait()
+        return {"name": "w"}
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", slow_plan)
+    leader = asyncio.create_task(llm_gate.parse_plan("coach plan"))
+    follower = asyncio.create_task(llm_gate.parse_plan("coach plan"))
+    await asyncio.sleep(0.01)
+
+    leader.cancel()  # the user who started the parse goes away
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    release.set()
+    assert await follower == {"name": "w"}
+
+
+@pytest.mark.asyncio
+async def test_shared_failure_reaches_every_waiter(gate, monkeypatch):
+    release = asyncio.Event()
+
+    async def failing_plan(text, *_):
+        await release.wait()
+        raise ValueError("refusal")
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", failing_plan)
+    tasks = [asyncio.create_task(llm_gate.parse_plan("coach plan")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert llm_gate._inflight == {}  # a later identical plan gets a fresh attempt
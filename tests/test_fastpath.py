@@ -0,0 +1,82 @@
+"""Deterministic fast path in front of the LLM (workout_ai/fastpath.py).
+
+The contract is asymmetric: abstaining costs an LLM call, answering wrongly
+costs the athlete a wrong workout on the watch. So the eval cases are the bar
+for every answer it gives, and anything ambiguous must come back as None.
+"""
+
+import pytest
+
+from evals.cases import CASES
+from workout_ai import ParseTrace, fastpath
+from workout_ai import gate as llm_gate
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda c: c.name)
+def test_every_eval_case_it_answers_passes_every_check(case):
+    result = fastpath.parse(case.prompt)
+    if result is None:
+        pytest.skip("abstained — goes to the LLM")
+    failed = [label for label, check in case.checks if not check(result)]
+    assert not failed
+
+
+def test_the_mechanical_skeleton_cases_are_answered():
+    answered = {c.name for c in CASES if fastpath.parse(c.prompt) is not None}
+    assert {"layered-slashes", "unitless-km-skeleton"} <= answered
+
+
+def test_one_line_plan_with_jog_recovery():
+    assert fastpath.parse("2km warmup, 10x400m @ 3:45 / 200m jog, 2km cooldown") == {
+        "name": "10×400/200 @ 3:45",
+        "warmup": {"distance": 2000},
+        "intervals": [{"type": "repeat", "repeat": 10, "steps": [
+            {"type": "run", "distance": 400, "pace": "03:45"},
+            {"type": "recovery", "distance": 200},
+        ]}],
+        "cooldown": {"distance": 2000},
+    }
+
+
+def test_russian_repeat_with_rest_after_a_comma():
+    result = fastpath.parse("разминка 3 км\n6х1 км по 4:00, отдых 2 мин\nзаминка 2 км")
+    assert result["intervals"] == [{"type": "repeat", "repeat": 6, "steps": [
+        {"type": "run", "distance": 1000, "pace": "04:00"},
+        {"type": "rest", "rest": 120},
+    ]}]
+    assert (result["warmup"], result["cooldown"]) == ({"distance": 3000}, {"distance": 2000})
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "10x400/200",                               # bare pair: rep count or budget?
+        "2 km warmup\n3 km easy\n2 km cooldown",    # easy-run placement is judgement
+        "25 раз по 400м в темпе чуть из 4 мин",     # pace ceiling
+        "10x400m @ 3:45\nrest 40-45 sec",           # range, on its own line
+        "4000/500/2000\n4 km @ 4:20\n2 km @ 4:00",  # skeleton distance left unannotated
+        "6/2/6\n6000m @ 4:50\n2000m @ 4:00",        # unitless skeleton read as metres
+        "10x400m @ 3:45\n2 km cooldown\nthen strides",
+        "10x400m @ 0:45",                           # parses, but fails the model bounds
+        "200x400m @ 3:45",
+        "5x3m @ 4:00",                              # 3m: minutes, not metres
+        "20x1m @ 4:00",
+        "800m 2:50",                                # a split for the 800, or /km?
+        "8x800m 2:50 / 400m jog",
+        "",
+    ],
+)
+def test_anything_outside_the_grammar_goes_to_the_llm(text):
+    assert fastpath.parse(text) is None
+
+
+@pytest.mark.asyncio
+async def test_parse_plan_answers_without_the_provider(monkeypatch):
+    async def provider(_):
+        raise AssertionError("fast-path plan reached the provider")
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", provider)
+    trace = ParseTrace()
+    result = await llm_gate.parse_plan("3 km @ 4:00", trace)
+    assert result["intervals"] == [{"type": "run", "distance": 3000, "pace": "04:00"}]
+    assert trace.cache == "rules"
@@ -0,0 +1,120 @@
+"""The event-loop Garmin path (garmin.upload_async / refresh_token_async).
+
+It replaces garth in a worker thread, so it must keep garth's contract: the
+bearer from the stored token, a refresh through the signed OAuth1 exchange when
+the OAuth2 half has expired, the refreshed token surfaced to the caller, and a
+401 as GarminAuthExpired.
+"""
+
+import base64
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import garmin
+import garmin_oauth
+
+OAUTH1 = {"oauth_token": "ot", "oauth_token_secret": "ots", "domain": "garmin.com"}
+CONSUMER = {"consumer_key": "ck", "consumer_secret": "cs"}
+
+
+def _token(expires_at: float) -> str:
+    oauth2 = {"token_type": "bearer", "access_token": "old", "expires_at": int(expires_at)}
+    return base64.b64encode(json.dumps([OAUTH1, oauth2]).encode()).decode()
+
+
+class FakeSession:
+    """Records requests; answers the consumer, exchange and upload endpoints."""
+
+    def __init__(self, upload_status=200):
+        self.upload_status = upload_status
+        self.calls = []
+
+    async def get(self, url, **kwargs):
+        self.calls.append(("GET", url, kwargs))
+        return self._resp(200, CONSUMER)
+
+    async def post(self, url, **kwargs):
+        self.calls.append(("POST", url, kwargs))
+        if url.endswith("/exchange/user/2.0"):
+            return self._resp(200, {
+                "token_type": "bearer", "access_token": "new",
+                "expires_in": 3600, "refresh_token_expires_in": 7200,
+            })
+        return self._resp(self.upload_status, {"workoutId": 42})
+
+    async def request(self, method, url, **kwargs):
+        return await (self.get if method == "GET" else self.post)(url, **kwargs)
+
+    @staticmethod
+    def _resp(status, body):
+        def raise_for_status():
+            if status >= 400:
+                raise RuntimeError(f"HTTP {status}")
+
+        return SimpleNamespace(
+            status_code=status, text=json.dumps(body), content=json.dumps(body).encode(),
+            json=lambda: body, raise_for_status=raise_for_status,
+        )
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(garmin, "_async_session", lambda: fake)
+    monkeypatch.setattr(garmin_oauth, "_consumer", None)
+    return fake
+
+
+def _posts(session, suffix):
+    return [c for c in session.calls if c[0] == "POST" and c[1].endswith(suffix)]
+
+
+@pytest.mark.asyncio
+async def test_fresh_token_uploads_with_its_bearer_and_reports_no_refresh(session):
+    workout_id, refreshed = await garmin.upload_async(_token(time.time() + 600), {"n": 1})
+    assert (workout_id, refreshed) == (42, None)
+    (_, url, kwargs), = session.calls
+    assert url == "https://connectapi.garmin.com/workout-service/workout"
+    assert kwargs["headers"]["Authorization"] == "Bearer old"
+    assert kwargs["json"] == {"n": 1}
+
+
+@pytest.mark.asyncio
+async def test_expired_oauth2_is_exchanged_first_and_surfaced(session):
+    _, refreshed = await garmin.upload_async(_token(time.time() - 1), {"n": 1})
+    exchange, = _posts(session, "/exchange/user/2.0")
+    assert exchange[2]["headers"]["Authorization"].startswith("OAuth ")  # OAuth1-signed
+    upload, = _posts(session, "/workout-service/workout")
+    assert upload[2]["headers"]["Authorization"] == "Bearer new"
+
+    oauth1, oauth2 = json.loads(base64.b64decode(refreshed))
+    assert oauth1["oauth_token"] == "ot"
+    assert oauth2["access_token"] == "new" and oauth2["expires_at"] > time.time()
+
+
+@pytest.mark.asyncio
+async def test_a_401_is_an_expired_session(session):
+    session.upload_status = 401
+    with pytest.raises(garmin.GarminAuthExpired):
+        await garmin.upload_async(_token(time.time() + 600), {})
+
+
+@pytest.mark.asyncio
+async def test_the_consumer_is_fetched_once_per_process(session):
+    await garmin.refresh_token_async(_token(0))
+    await garmin.refresh_token_async(_token(0))
+    assert [c[0] for c in session.calls] == ["GET", "POST", "POST"]
+
+
+@pytest.mark.asyncio
+async def test_the_default_transport_never_leaves_the_event_loop(session, monkeypatch):
+    def no_threads(*_):
+        raise AssertionError("upload hopped to a thread")
+
+    monkeypatch.setattr(garmin.asyncio, "to_thread", no_threads)
+    monkeypatch.setattr(garmin, "UPLOAD_TRANSPORT", "async")
+    workout_id, _ = await garmin.upload_garmin_payload_async(_token(time.time() + 600), {}, 1)
+    assert workout_id == 42
@@ -0,0 +1,133 @@
+"""The Garmin circuit breaker (garmin_breaker.py) and its use in
+process_workout: trips on consecutive Garmin errors only, turns requests away
+before the parse with the quota refunded, and half-opens to a single probe."""
+
+import fakeredis.aioredis
+import pytest
+from curl_cffi.requests.exceptions import HTTPError as CurlHTTPError
+
+import garmin
+import garmin_breaker as breaker
+import redis_conn
+import workout_service
+from garmin import GarminAuthExpired
+from workout_service import Failure, FailureCode
+
+
+def _http_error(status):
+    class _Resp:
+        status_code = status
+
+    return CurlHTTPError(f"HTTP {status}", 0, _Resp())
+
+
+@pytest.fixture(params=["redis", "local"])
+def clock(request, monkeypatch):
+    """A fresh breaker (threshold 3) on fakeredis or in process; returns the
+    monotonic clock the in-process backend reads."""
+    now = [1000.0]
+    monkeypatch.setattr(breaker.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(breaker, "GARMIN_BREAKER_DISABLED", False)
+    monkeypatch.setattr(breaker, "GARMIN_BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(breaker, "_local", breaker._Local())
+    monkeypatch.setattr(breaker, "_dirty", False)
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True) if request.param == "redis" else None
+    monkeypatch.setattr(redis_conn, "client", client)
+    return now
+
+
+async def _expire_open(clock):
+    # The open period ending: the flag's TTL in Redis, the clock in process.
+    clock[0] += breaker.GARMIN_BREAKER_OPEN_S
+    if redis_conn.client is not None:
+        await redis_conn.client.delete(breaker._OPEN_KEY)
+
+
+@pytest.mark.parametrize(
+    ("error", "counted"),
+    [(_http_error(503), True), (_http_error(429), True), (TimeoutError(), True),
+     (ConnectionError(), True), (_http_error(400), False), (GarminAuthExpired("401"), False),
+     (KeyError("workoutId"), False)],
+)
+def test_only_garmin_health_errors_count(error, counted):
+    assert breaker.counts(error) is counted
+
+
+@pytest.mark.asyncio
+async def test_consecutive_failures_open_then_a_probe_closes(clock):
+    for _ in range(3):
+        assert await breaker.allow()
+        await breaker.record(TimeoutError())
+    assert await breaker.state() == breaker.OPEN
+    assert not await breaker.allow()
+
+    await _expire_open(clock)
+    assert await breaker.state() == breaker.HALF_OPEN
+    assert await breaker.allow()      # the probe
+    assert not await breaker.allow()  # everyone else waits for it
+    await breaker.record(None)
+    assert await breaker.state() == breaker.CLOSED
+    assert await breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_a_failed_probe_opens_it_again(clock):
+    for _ in range(3):
+        await breaker.record(_http_error(502))
+    await _expire_open(clock)
+    assert await breaker.allow()
+    await breaker.record(_http_error(502))
+    assert await breaker.state() == breaker.OPEN
+
+
+@pytest.mark.asyncio
+async def test_a_success_resets_the_count(clock):
+    for _ in range(2):
+        await breaker.record(TimeoutError())
+    await breaker.allow()  # reads the shared count
+    await breaker.record(None)
+    await breaker.record(TimeoutError())
+    assert await breaker.state() == breaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_garmin_calls_report_their_outcome(clock, monkeypatch):
+    async def failing(*_):
+        raise _http_error(503)
+
+    monkeypatch.setattr(garmin, "upload_async", failing)
+    monkeypatch.setattr(garmin, "UPLOAD_TRANSPORT", "async")
+    for _ in range(3):
+        with pytest.raises(CurlHTTPError):
+            await garmin.upload_garmin_payload_async("t", {"workoutName": "x"})
+    assert await breaker.state() == breaker.OPEN
+
+
+@pytest.mark.asyncio
+async def test_an_open_breaker_refunds_before_the_parse(clock, monkeypatch):
+    rec = {"refunded": [], "parsed": 0, "accepted": 0}
+
+    async def consume(user_id):
+        return "receipt"
+
+    async def refund(user_id, receipt):
+        rec["refunded"].append(receipt)
+
+    async def parse_plan(*_):
+        rec["parsed"] += 1
+
+    async def accepted():
+        rec["accepted"] += 1
+
+    async def log(**kwargs):
+        return None
+
+    for name, fn in {"consume": consume, "refund": refund, "parse_plan": parse_plan,
+                     "log_workout_request": log}.items():
+        monkeypatch.setattr(workout_service, name, fn)
+    for _ in range(3):
+        await breaker.record(TimeoutError())
+
+    outcome = await workout_service.process_workout(1, {}, "10x400", on_accepted=accepted)
+    assert outcome == Failure(FailureCode.GARMIN_DOWN)
+    assert rec == {"refunded": ["receipt"], "parsed": 0, "accepted": 0}
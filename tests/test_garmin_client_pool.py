@@ -0,0 +1,96 @@
+"""Per-user pool of authenticated garth clients (garmin._client_for).
+
+Reuse must never cross users or outlive a token: the pool exists for speed, the
+per-user isolation it replaced existed for correctness.
+"""
+
+import pytest
+from cachetools import TTLCache
+from garth.exc import GarthHTTPError
+from garth.http import Client as GarthClient
+from requests import HTTPError, Response
+
+import garmin
+
+
+class FakeGarthClient:
+    dumps_value = None
+    fail_with = None
+
+    def __init__(self):
+        self.loaded = None
+
+    def loads(self, token):
+        self.loaded = token
+
+    def connectapi(self, path, method, json):
+        if self.fail_with is not None:
+            raise self.fail_with
+        return {"workoutId": "wk-1"}
+
+    def dumps(self):
+        return self.dumps_value or self.loaded
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(garmin, "_pool", TTLCache(maxsize=8, ttl=60))
+    monkeypatch.setattr(garmin, "GarthClient", FakeGarthClient)
+    monkeypatch.setattr(garmin, "_install_garth_proxy", lambda client: None)
+    FakeGarthClient.dumps_value = FakeGarthClient.fail_with = None
+    return garmin._pool
+
+
+def _http_error(status: int) -> GarthHTTPError:
+    response = Response()
+    response.status_code = status
+    return GarthHTTPError(msg="x", error=HTTPError(response=response))
+
+
+def test_a_user_reuses_their_client_and_nobody_else_gets_it(pool):
+    a = garmin._client_for("tok-a", user_id=1)
+    assert garmin._client_for("tok-a", user_id=1) is a
+    b = garmin._client_for("tok-a", user_id=2)  # same token string, other user
+    assert b is not a
+
+
+def test_a_new_token_builds_a_new_client(pool):
+    a = garmin._client_for("tok-a", user_id=1)
+    fresh = garmin._client_for("tok-b", user_id=1)
+    assert fresh is not a and fresh.loaded == "tok-b"
+
+
+def test_without_a_user_the_client_is_not_pooled(pool):
+    garmin._client_for("tok-a")
+    assert len(pool) == 0
+
+
+def test_garth_refresh_rekeys_the_pooled_client(pool):
+    FakeGarthClient.dumps_value = "tok-b"
+    _, refreshed = garmin.upload_garmin_payload("tok-a", {}, user_id=1)
+    assert refreshed == "tok-b"
+    client = pool[1][1]
+    FakeGarthClient.dumps_value = None
+    assert garmin._client_for("tok-b", user_id=1) is client  # the persisted token hits
+
+
+def test_a_401_or_a_deletion_drops_the_client(pool):
+    FakeGarthClient.fail_with = _http_error(401)
+    with pytest.raises(garmin.GarminAuthExpired):
+        garmin.upload_garmin_payload("tok-a", {}, user_id=1)
+    assert 1 not in pool
+
+    FakeGarthClient.fail_with = None
+    garmin.upload_garmin_payload("tok-a", {}, user_id=2)
+    garmin.forget_client(2)
+    assert 2 not in pool
+
+
+def test_every_client_shares_one_connection_pool(monkeypatch):
+    monkeypatch.setattr(garmin, "_shared_adapter", None)
+    a, b = GarthClient(), GarthClient()
+    garmin._install_garth_proxy(a)
+    garmin._install_garth_proxy(b)
+    assert a.sess is not b.sess
+    assert a.sess.adapters["https://"] is b.sess.adapters["https://"]
+    assert a.sess.adapters["https://"].max_retries.total == 3  # garth's retry policy kept
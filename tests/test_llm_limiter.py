@@ -0,0 +1,191 @@
+"""The adaptive concurrency limit behind the LLM gate (workout_ai/limiter.py).
+
+Time is driven through monkeypatched time.monotonic so the backoff cooldown is
+deterministic; latencies are handed to release() directly, as the gate does.
+"""
+
+import asyncio
+
+import pytest
+
+from workout_ai import LLMBusy
+from workout_ai import limiter as limiter_mod
+from workout_ai.limiter import NEUTRAL, OK, OVERLOAD, AdaptiveLimiter, Priority
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(limiter_mod.time, "monotonic", lambda: now[0])
+    return now
+
+
+async def _saturate(lim: AdaptiveLimiter) -> None:
+    while lim.in_flight < lim.limit:
+        await lim.acquire()
+
+
+@pytest.mark.asyncio
+async def test_healthy_saturated_load_raises_the_limit(clock):
+    lim = AdaptiveLimiter(initial=2, floor=1, ceiling=4)
+    for _ in range(20):
+        await _saturate(lim)
+        lim.release(1.0, OK)
+    assert lim.limit == 4  # capped at the ceiling
+
+
+@pytest.mark.asyncio
+async def test_idle_capacity_is_not_evidence(clock):
+    lim = AdaptiveLimiter(initial=2, floor=1, ceiling=8)
+    for _ in range(20):
+        await lim.acquire()  # one at a time: never near the limit
+        lim.release(1.0, OK)
+    assert lim.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_overload_backs_off_once_per_cooldown_and_respects_the_floor(clock):
+    lim = AdaptiveLimiter(initial=8, floor=3, ceiling=8)
+    for _ in range(4):  # a burst of 429s from calls that were in flight together
+        await lim.acquire()
+    for _ in range(4):
+        lim.release(None, OVERLOAD)
+    assert lim.limit == 6  # 8 * 0.75, once
+
+    for _ in range(10):
+        clock[0] += 5
+        await lim.acquire()
+        lim.release(None, OVERLOAD)
+    assert lim.limit == 3
+
+
+@pytest.mark.asyncio
+async def test_rising_latency_backs_off(clock):
+    lim = AdaptiveLimiter(initial=8, floor=1, ceiling=8)
+    for _ in range(5):
+        await lim.acquire()
+        lim.release(1.0, OK)
+    for _ in range(5):
+        clock[0] += 10
+        await lim.acquire()
+        lim.release(6.0, OK)  # healthy replies, just slow
+    assert lim.limit < 8
+
+
+@pytest.mark.asyncio
+async def test_neutral_errors_leave_the_limit_alone(clock):
+    lim = AdaptiveLimiter(initial=4, floor=1, ceiling=8)
+    for _ in range(10):
+        await lim.acquire()
+        lim.release(0.5, NEUTRAL)
+    assert lim.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_order_and_reported_as_queue_depth():
+    lim = AdaptiveLimiter(initial=1, floor=1, ceiling=1)
+    await lim.acquire()
+    order = []
+
+    async def waiter(tag):
+        await lim.acquire()
+        order.append(tag)
+
+    tasks = [asyncio.create_task(waiter(i)) for i in range(3)]
+    await asyncio.sleep(0)
+    stats = lim.stats()
+    assert (stats["in_flight"], stats["queue_depth"]) == (1, 3)
+    assert stats["queued"]["interactive"] == 3
+    for _ in range(3):
+        lim.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_a_waiter_that_times_out_leaks_nothing():
+    lim = AdaptiveLimiter(initial=1, floor=1, ceiling=1)
+    await lim.acquire()
+    with pytest.raises(TimeoutError):
+        async with asyncio.timeout(0.01):
+            await lim.acquire()
+    assert lim.queue_depth == 0
+    lim.release()
+    assert lim.in_flight == 0
+    await lim.acquire()  # the slot is genuinely free again
+
+
+async def _queue(lim, priority, n, served):
+    async def waiter():
+        await lim.acquire(priority)
+        served.append(priority)
+
+    return [asyncio.create_task(waiter()) for _ in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_a_batch_flood_does_not_starve_interactive_users():
+    lim = AdaptiveLimiter(initial=1, floor=1, ceiling=1)
+    await lim.acquire()
+    served = []
+    tasks = await _queue(lim, Priority.BATCH, 20, served)  # the eval run got in first
+    tasks += await _queue(lim, Priority.INTERACTIVE, 4, served)
+    await asyncio.sleep(0)
+
+    for _ in range(8):
+        lim.release()
+        await asyncio.sleep(0)
+    # Weighted 4:1 — the interactive users are through well before the batch is.
+    assert served.count(Priority.INTERACTIVE) == 4
+    assert served.count(Priority.BATCH) >= 1  # ...and the batch still progressed
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_the_lowest_class_first():
+    lim = AdaptiveLimiter(initial=1, floor=1, ceiling=1, max_queue=2)
+    await lim.acquire()
+    served = []
+    batch = await _queue(lim, Priority.BATCH, 1, served)
+    interactive = await _queue(lim, Priority.INTERACTIVE, 1, served)
+    await asyncio.sleep(0)
+
+    first_time = await _queue(lim, Priority.FIRST_TIME, 1, served)
+    await asyncio.sleep(0)
+    with pytest.raises(LLMBusy):
+        await batch[0]
+    assert lim.queue_depth == 2
+
+    # Nothing left below INTERACTIVE: a newcomer of that class is refused.
+    with pytest.raises(LLMBusy):
+        await lim.acquire(Priority.INTERACTIVE)
+
+    lim.release()
+    await asyncio.sleep(0)
+    assert served == [Priority.FIRST_TIME]
+    for t in interactive + first_time:
+        t.cancel()
+    await asyncio.gather(*interactive, *first_time, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_a_waiter_shed_and_cancelled_in_one_tick_frees_no_slot():
+    lim = AdaptiveLimiter(initial=1, floor=1, ceiling=1, max_queue=1)
+    await lim.acquire()
+    batch = await _queue(lim, Priority.BATCH, 1, [])
+    await asyncio.sleep(0)
+
+    first_time = asyncio.create_task(lim.acquire(Priority.FIRST_TIME))
+    await asyncio.sleep(0)  # sheds the batch waiter, whose wake-up is pending...
+    batch[0].cancel()       # ...when its caller gives up
+    with pytest.raises(asyncio.CancelledError):
+        await batch[0]
+    assert lim.in_flight == 1
+    assert not first_time.done()  # still waiting for the one real slot
+    lim.release()
+    await first_time
+    assert lim.in_flight == 1
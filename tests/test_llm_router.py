@@ -0,0 +1,129 @@
+"""Hedged requests and failover across providers (workout_ai/router.py).
+
+Routes are fakes with scripted latency and errors; nothing reaches an SDK.
+"""
+
+import asyncio
+
+import pytest
+
+from workout_ai import config as workout_ai_config
+from workout_ai import planner, router
+from workout_ai.errors import WorkoutAIConfigError
+from workout_ai.models import Workout
+from workout_ai.trace import Usage
+
+WORKOUT = Workout(name="w", intervals=[{"type": "run", "distance": 400}])
+
+
+class _Overloaded(Exception):
+    status_code = 529
+
+
+@pytest.fixture(autouse=True)
+def fresh_router(monkeypatch):
+    monkeypatch.setattr(router, "_health", {})
+    monkeypatch.setattr(router, "_budget", router._HedgeBudget(1.0, router.HEDGE_BURST))
+    monkeypatch.setattr(router, "_stats", router.Counter())
+
+
+def _route(name, calls, delay=0.0, error=None, cancelled=None):
+    async def call():
+        calls.append(name)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(name)
+            raise
+        if error is not None:
+            raise error
+        return WORKOUT.model_copy(update={"name": name}), Usage(name, "m")
+
+    return router.Route(name, call)
+
+
+def _warm(name, latency=0.01):
+    for _ in range(router.MIN_SAMPLES):
+        router._state(name).ok(latency)
+
+
+@pytest.mark.asyncio
+async def test_without_a_fallback_the_primary_is_called_directly():
+    calls = []
+    workout, usage = await router.run(_route("openai", calls))
+    assert workout.name == usage.provider == "openai"
+    assert calls == ["openai"]
+
+
+@pytest.mark.asyncio
+async def test_a_slow_primary_is_hedged_and_the_loser_cancelled():
+    _warm("openai")
+    calls, cancelled = [], []
+    workout, usage = await router.run(
+        _route("openai", calls, delay=5, cancelled=cancelled), _route("claude", calls)
+    )
+    assert usage.provider == "claude"
+    assert cancelled == ["openai"]
+    assert router.stats()["hedged"] == 1 and router.stats()["won_by_fallback"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_budget_or_latency_history(monkeypatch):
+    calls = []
+    # No history yet: no percentile to hedge at.
+    await router.run(_route("openai", calls, delay=0.05), _route("claude", calls))
+    assert calls == ["openai"]
+
+    _warm("openai")
+    monkeypatch.setattr(router, "_budget", router._HedgeBudget(0.0, router.HEDGE_BURST))
+    calls.clear()
+    await router.run(_route("openai", calls, delay=0.05), _route("claude", calls))
+    assert calls == ["openai"]  # the cost cap holds: waited on the primary instead
+
+
+@pytest.mark.asyncio
+async def test_overload_fails_over_without_spending_hedge_budget(monkeypatch):
+    monkeypatch.setattr(router, "_budget", router._HedgeBudget(0.0, router.HEDGE_BURST))
+    calls = []
+    workout, usage = await router.run(
+        _route("openai", calls, error=_Overloaded()), _route("claude", calls)
+    )
+    assert usage.provider == "claude"
+    assert router.stats()["failed_over"] == 1
+
+
+@pytest.mark.asyncio
+async def test_a_bad_output_is_not_failed_over():
+    calls = []
+    with pytest.raises(ValueError):
+        await router.run(
+            _route("openai", calls, error=ValueError("refusal")), _route("claude", calls)
+        )
+    assert calls == ["openai"]
+
+
+@pytest.mark.asyncio
+async def test_an_overload_burst_takes_the_provider_out_for_the_cooldown(monkeypatch):
+    monkeypatch.setattr(router, "LLM_FAILOVER_ERRORS", 3)
+    calls = []
+    for _ in range(3):
+        await router.run(_route("openai", calls, error=_Overloaded()), _route("claude", calls))
+    assert router.stats()["down"] == ["openai"]
+
+    calls.clear()
+    await router.run(_route("openai", calls), _route("claude", calls))
+    assert calls == ["claude"]  # not even tried while down
+
+    router._state("openai").down_until = 0  # cooldown over
+    calls.clear()
+    await router.run(_route("openai", calls), _route("claude", calls))
+    assert calls == ["openai"]
+
+
+@pytest.mark.asyncio
+async def test_fallback_equal_to_primary_is_a_config_error(monkeypatch):
+    monkeypatch.setattr(workout_ai_config, "PROVIDER", "openai")
+    monkeypatch.setattr(workout_ai_config, "FALLBACK_PROVIDER", "openai")
+    with pytest.raises(WorkoutAIConfigError, match="WORKOUT_AI_FALLBACK_PROVIDER"):
+        await planner.plan_to_json_async("easy 5k")
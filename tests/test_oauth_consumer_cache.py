@@ -0,0 +1,129 @@
+"""The OAuth consumer cache (garmin_oauth._get_oauth_consumer[_async]).
+
+S3 is consulted only when memory and Redis are both empty or stale, and a
+failing S3 falls back to the stale copy, then to the env/file fallback.
+"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import garmin_oauth
+import redis_conn
+
+CONSUMER = {"consumer_key": "ck", "consumer_secret": "cs"}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+class FakeSession:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.gets = 0
+
+    async def get(self, url, **kwargs):
+        self.gets += 1
+        if self.fail:
+            raise ConnectionError("s3 unreachable")
+        return SimpleNamespace(json=lambda: dict(CONSUMER), raise_for_status=lambda: None)
+
+
+@pytest.fixture(autouse=True)
+def clean(monkeypatch):
+    monkeypatch.setattr(garmin_oauth, "_consumer", None)
+    monkeypatch.setattr(garmin_oauth, "_revalidation", None)
+    monkeypatch.setattr(redis_conn, "client", None)
+    for var in ("GARMIN_OAUTH_CONSUMER_KEY", "GARMIN_OAUTH_CONSUMER_SECRET",
+                "GARMIN_OAUTH_CONSUMER_FILE"):
+        monkeypatch.delenv(var, raising=False)
+
+
+@pytest.mark.asyncio
+async def test_s3_is_fetched_once_and_shared_through_redis(monkeypatch):
+    monkeypatch.setattr(redis_conn, "client", FakeRedis())
+    session = FakeSession()
+    assert await garmin_oauth._get_oauth_consumer_async(session) == CONSUMER
+    assert await garmin_oauth._get_oauth_consumer_async(session) == CONSUMER
+    assert session.gets == 1
+
+    garmin_oauth._consumer = None  # a new replica: Redis answers, not S3
+    assert await garmin_oauth._get_oauth_consumer_async(session) == CONSUMER
+    assert session.gets == 1
+
+
+@pytest.mark.asyncio
+async def test_a_stale_copy_is_served_while_it_revalidates():
+    garmin_oauth._remember({"consumer_key": "old", "consumer_secret": "s"}, time.time() - 10**6)
+    session = FakeSession()
+    consumer = await garmin_oauth._get_oauth_consumer_async(session)
+    assert consumer["consumer_key"] == "old"  # no wait on S3
+    await garmin_oauth._revalidation
+    assert session.gets == 1
+    assert await garmin_oauth._get_oauth_consumer_async(session) == CONSUMER
+
+
+@pytest.mark.asyncio
+async def test_a_failed_revalidation_keeps_the_stale_copy():
+    garmin_oauth._remember({"consumer_key": "old", "consumer_secret": "s"}, time.time() - 10**6)
+    await garmin_oauth._get_oauth_consumer_async(FakeSession(fail=True))
+    await asyncio.gather(garmin_oauth._revalidation)
+    assert garmin_oauth._consumer[0]["consumer_key"] == "old"
+
+
+@pytest.mark.asyncio
+async def test_cold_start_with_s3_down_uses_the_env_fallback(monkeypatch):
+    monkeypatch.setenv("GARMIN_OAUTH_CONSUMER_KEY", "env-key")
+    monkeypatch.setenv("GARMIN_OAUTH_CONSUMER_SECRET", "env-secret")
+    session = FakeSession(fail=True)
+    consumer = await garmin_oauth._get_oauth_consumer_async(session)
+    assert consumer == {"consumer_key": "env-key", "consumer_secret": "env-secret"}
+    # Cached: the next refresh doesn't wait on S3 again.
+    assert await garmin_oauth._get_oauth_consumer_async(session) == consumer
+    assert session.gets == 1
+
+
+@pytest.mark.asyncio
+async def test_a_cached_fallback_goes_stale_soon_and_s3_is_retried_behind_it(monkeypatch):
+    monkeypatch.setenv("GARMIN_OAUTH_CONSUMER_KEY", "env-key")
+    monkeypatch.setenv("GARMIN_OAUTH_CONSUMER_SECRET", "env-secret")
+    await garmin_oauth._get_oauth_consumer_async(FakeSession(fail=True))
+    later = time.time() + garmin_oauth.CONSUMER_FALLBACK_TTL_S + 1
+    monkeypatch.setattr(garmin_oauth.time, "time", lambda: later)
+    session = FakeSession()
+    consumer = await garmin_oauth._get_oauth_consumer_async(session)
+    assert consumer["consumer_key"] == "env-key"  # served while S3 is retried
+    await garmin_oauth._revalidation
+    assert await garmin_oauth._get_oauth_consumer_async(session) == CONSUMER
+
+
+def test_sync_path_falls_back_to_the_file(monkeypatch, tmp_path):
+    path = tmp_path / "consumer.json"
+    path.write_text(json.dumps(CONSUMER))
+    monkeypatch.setenv("GARMIN_OAUTH_CONSUMER_FILE", str(path))
+
+    def s3_down(*args, **kwargs):
+        raise ConnectionError("s3 unreachable")
+
+    monkeypatch.setattr(garmin_oauth.requests, "get", s3_down)
+    assert garmin_oauth._get_oauth_consumer() == CONSUMER
+
+
+def test_with_nothing_to_fall_back_on_the_error_surfaces(monkeypatch):
+    def s3_down(*args, **kwargs):
+        raise ConnectionError("s3 unreachable")
+
+    monkeypatch.setattr(garmin_oauth.requests, "get", s3_down)
+    with pytest.raises(ConnectionError):
+        garmin_oauth._get_oauth_consumer()
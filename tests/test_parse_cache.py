@@ -0,0 +1,150 @@
+"""The parse cache in front of parse_plan (workout_ai/cache.py).
+
+A hit must skip both the gate slot and the provider; the key must separate
+provider, model, and prompt so a config change can never serve a stale parse.
+"""
+
+import fakeredis.aioredis
+import pytest
+from cachetools import LRUCache
+
+import redis_conn
+from workout_ai import ParseTrace
+from workout_ai import cache as parse_cache
+from workout_ai import config as ai_config
+from workout_ai import gate as llm_gate
+from workout_ai.limiter import AdaptiveLimiter
+from workout_ai.planner import resolve, resolve_fallback
+from workout_ai.trace import Usage
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_conn, "client", client)
+    return client
+
+
+@pytest.fixture
+def provider(monkeypatch, redis):
+    monkeypatch.setattr(parse_cache, "_memory", LRUCache(maxsize=16))
+    monkeypatch.setattr(llm_gate, "_limiter", AdaptiveLimiter(initial=1, floor=1, ceiling=1))
+    monkeypatch.setattr(llm_gate, "_inflight", {})
+    monkeypatch.setattr(llm_gate, "LLM_QUEUE_WAIT_S", 0.05)
+    calls = []
+
+    async def fake_plan(text, *_):
+        calls.append(text)
+        return {"name": "w", "intervals": [{"type": "run", "distance": 400}]}
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", fake_plan)
+    return calls
+
+
+def test_normalize_collapses_forwarding_whitespace():
+    a = "2km warmup\n\n10x400m  @ 5k pace\t\n2km cooldown  "
+    b = "  2km warmup\n10x400m @ 5k pace\n2km cooldown"
+    assert parse_cache.normalize(a) == parse_cache.normalize(b)
+
+
+def test_key_separates_provider_model_and_prompt():
+    base = parse_cache.key("easy 5k", "openai", "m1", "sha1")
+    assert base == parse_cache.key("easy  5k", "openai", "m1", "sha1")
+    assert base != parse_cache.key("easy 5k", "claude", "m1", "sha1")
+    assert base != parse_cache.key("easy 5k", "openai", "m2", "sha1")
+    assert base != parse_cache.key("easy 5k", "openai", "m1", "sha2")
+
+
+@pytest.mark.asyncio
+async def test_second_identical_plan_is_a_hit(provider):
+    first, second = ParseTrace(), ParseTrace()
+    out1 = await llm_gate.parse_plan("10x400m @ 5k pace", first)
+    out2 = await llm_gate.parse_plan("10x400m  @ 5k pace\n", second)
+    assert out1 == out2
+    assert provider == ["10x400m @ 5k pace"]
+    assert (first.cache, second.cache) == ("miss", "hit")
+
+
+@pytest.mark.asyncio
+async def test_hit_skips_the_gate(provider):
+    await llm_gate.parse_plan("10x400m @ 5k pace")
+    await llm_gate._limiter.acquire()  # every slot busy: a miss would be LLMBusy
+    try:
+        assert await llm_gate.parse_plan("10x400m @ 5k pace")
+    finally:
+        llm_gate._limiter.release()
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_survives_a_cold_process(provider, monkeypatch):
+    await llm_gate.parse_plan("10x400m @ 5k pace")
+    monkeypatch.setattr(parse_cache, "_memory", LRUCache(maxsize=16))  # "restart"
+    trace = ParseTrace()
+    await llm_gate.parse_plan("10x400m @ 5k pace", trace)
+    assert trace.cache == "hit"
+    assert len(provider) == 1
+
+
+@pytest.mark.asyncio
+async def test_callers_cannot_mutate_the_cached_entry(provider):
+    out = await llm_gate.parse_plan("10x400m @ 5k pace")
+    out["intervals"].clear()
+    assert (await llm_gate.parse_plan("10x400m @ 5k pace"))["intervals"]
+
+
+@pytest.mark.asyncio
+async def test_failed_parse_is_not_cached(provider, monkeypatch):
+    async def boom(text, *_):
+        raise ValueError("refusal")
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", boom)
+    with pytest.raises(ValueError):
+        await llm_gate.parse_plan("gibberish")
+    trace = ParseTrace()
+    with pytest.raises(ValueError):
+        await llm_gate.parse_plan("gibberish", trace)
+    assert trace.cache == "miss"
+
+
+@pytest.mark.asyncio
+async def test_redis_down_is_a_miss_not_a_failure(provider, monkeypatch):
+    class Broken:
+        async def get(self, *a, **k):
+            raise ConnectionError("redis down")
+
+        async def set(self, *a, **k):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(redis_conn, "client", Broken())
+    assert await llm_gate.parse_plan("10x400m @ 5k pace")
+    assert provider == ["10x400m @ 5k pace"]
+
+
+@pytest.mark.asyncio
+async def test_a_corrupt_redis_entry_is_a_miss_and_is_dropped(provider, redis):
+    key = parse_cache._redis_key("k")
+    await redis.set(key, '{"name": "w", "interv')
+    assert await parse_cache.get("k") is None
+    assert await redis.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_a_parse_won_by_the_fallback_is_not_cached_as_the_primarys(provider, monkeypatch):
+    monkeypatch.setattr(ai_config, "PROVIDER", "openai")
+    monkeypatch.setattr(ai_config, "FALLBACK_PROVIDER", "claude")
+    monkeypatch.setattr(ai_config, "FALLBACK_MODEL", "fallback-model")
+
+    async def won_by_fallback(text, trace):
+        provider.append(text)
+        trace.usage = Usage("claude", "fallback-model")
+        return {"name": "w", "intervals": [{"type": "run", "distance": 400}]}
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", won_by_fallback)
+    await llm_gate.parse_plan("10x400m @ 5k pace")
+    assert await parse_cache.get(llm_gate._cache_key("10x400m @ 5k pace", *resolve(), False)) is None
+    fallback_key = llm_gate._cache_key("10x400m @ 5k pace", *resolve_fallback(), False)
+    assert await parse_cache.get(fallback_key) is not None
+
+    trace = ParseTrace()
+    await llm_gate.parse_plan("10x400m @ 5k pace", trace)
+    assert trace.cache == "miss"  # the primary's key is still empty
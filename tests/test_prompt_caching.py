@@ -0,0 +1,122 @@
+"""Prompt caching: the system prompt is loaded once, sent as a stable cacheable
+prefix, and the provider's cached-token counts reach the workout log."""
+
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from workout_ai import ParseTrace, Usage, planner
+from workout_ai import clients as llm_clients
+from workout_ai.models import Workout
+from workout_ai.providers import claude as claude_provider
+from workout_ai.providers import openai as openai_provider
+
+WORKOUT = Workout(name="w", intervals=[{"type": "run", "distance": 400}])
+
+
+class _Stream:
+    """A stream with no events whose final result is `final`; records the
+    request kwargs on `sent`."""
+
+    def __init__(self, final, sent: dict, **kwargs):
+        self.final = final
+        sent.update(kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+    async def get_final_completion(self):
+        return self.final
+
+    get_final_message = get_final_completion
+
+
+@pytest.fixture(autouse=True)
+def _fresh_client_pool(monkeypatch):
+    monkeypatch.setattr(llm_clients, "_clients", {})
+
+
+def test_prompts_are_read_once_at_import(monkeypatch):
+    def no_disk(*_a, **_k):
+        raise AssertionError("prompt re-read from disk")
+
+    monkeypatch.setattr(Path, "read_text", no_disk)
+    prompt = planner.load_system_prompt(openai_provider, "gpt-4.1-mini")
+    expected = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    assert planner.prompt_sha(openai_provider, "gpt-4.1-mini") == expected
+
+
+@pytest.mark.asyncio
+async def test_claude_marks_the_system_prompt_cacheable_and_reports_cache_reads(monkeypatch):
+    sent = {}
+    usage = SimpleNamespace(
+        input_tokens=40, output_tokens=120,
+        cache_read_input_tokens=2500, cache_creation_input_tokens=0,
+    )
+    final = SimpleNamespace(parsed_output=WORKOUT, stop_reason="end_turn", usage=usage)
+
+    class _Client:
+        def __init__(self, **_):
+            self.messages = SimpleNamespace(stream=lambda **kw: _Stream(final, sent, **kw))
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-test")
+    monkeypatch.setattr(claude_provider, "AsyncAnthropic", _Client)
+    _, reported = await claude_provider.plan("SYSTEM", "10x400", claude_provider.DEFAULT_MODEL)
+
+    assert sent["system"] == [
+        {"type": "text", "text": "SYSTEM", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert (reported.input_tokens, reported.cached_tokens) == (2540, 2500)
+
+
+@pytest.mark.asyncio
+async def test_openai_sends_a_stable_cache_key_and_reports_cached_tokens(monkeypatch):
+    sent = {}
+    usage = SimpleNamespace(
+        prompt_tokens=2600, completion_tokens=90,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=2432),
+        completion_tokens_details=SimpleNamespace(reasoning_tokens=64),
+    )
+    message = SimpleNamespace(parsed=WORKOUT, refusal=None)
+    final = SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    class _Client:
+        def __init__(self, **_):
+            stream = lambda **kw: _Stream(final, sent, **kw)  # noqa: E731
+            self.chat = SimpleNamespace(completions=SimpleNamespace(stream=stream))
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(openai_provider, "AsyncOpenAI", _Client)
+    _, reported = await openai_provider.plan("SYSTEM", "10x400", "gpt-4.1-mini")
+    first_key = sent["prompt_cache_key"]
+    await openai_provider.plan("SYSTEM", "5x1000", "gpt-4.1-mini")
+
+    assert sent["prompt_cache_key"] == first_key  # same prompt, same cache line
+    assert (reported.input_tokens, reported.cached_tokens) == (2600, 2432)
+    assert reported.reasoning_tokens == 64
+
+
+@pytest.mark.asyncio
+async def test_usage_lands_on_the_trace_and_in_the_log_fields(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(planner.config, "PROVIDER", "openai")
+    monkeypatch.setattr(planner.config, "FALLBACK_PROVIDER", None)
+
+    async def fake_plan(system_prompt, description, model):
+        return WORKOUT, Usage("openai", model, 2600, 90, 2432)
+
+    monkeypatch.setattr(openai_provider, "plan", fake_plan)
+    trace = ParseTrace()
+    await planner.plan_to_json_async("10x400", trace)
+    assert trace.log_fields()["usage"]["cached_tokens"] == 2432
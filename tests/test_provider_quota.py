@@ -12,6 +12,7 @@ from openai import RateLimitError
 
 import workout_service
 from workout_ai import LLMQuotaExhausted
+from workout_ai import clients as llm_clients
 from workout_ai.providers import claude as claude_provider
 from workout_ai.providers import openai as openai_provider
 from workout_service import Failure, FailureCode
@@ -33,24 +34,45 @@ def _anthropic_400(message: str) -> BadRequestError:
     )
 
 
+@pytest.fixture(autouse=True)
+def _fresh_client_pool(monkeypatch):
+    # The fakes below are swapped in per test; a pooled instance from an
+    # earlier test must not answer for this one.
+    monkeypatch.setattr(llm_clients, "_clients", {})
+
+
+class _FailingStream:
+    """What client.*.stream(...) returns when the request itself is rejected:
+    the SDK raises on entering the stream context, before any event."""
+
+    def __init__(self, exc: Exception):
+        self.exc = exc
+
+    async def __aenter__(self):
+        raise self.exc
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
 class _FakeOpenAI:
     exc: Exception  # set per-test on the class; instantiated inside the provider
 
     def __init__(self, **kwargs):
-        async def parse(**_):
-            raise type(self).exc
+        def stream(**_):
+            return _FailingStream(type(self).exc)
 
-        self.chat = SimpleNamespace(completions=SimpleNamespace(parse=parse))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(stream=stream))
 
 
 class _FakeAnthropic:
     exc: Exception
 
     def __init__(self, **kwargs):
-        async def parse(**_):
-            raise type(self).exc
+        def stream(**_):
+            return _FailingStream(type(self).exc)
 
-        self.messages = SimpleNamespace(parse=parse)
+        self.messages = SimpleNamespace(stream=stream)
 
 
 @pytest.mark.asyncio
@@ -73,6 +95,35 @@ async def test_openai_transient_429_stays_a_rate_limit(monkeypatch):
         await openai_provider.plan("sys", "easy 5k", openai_provider.DEFAULT_MODEL)
 
 
+@pytest.mark.asyncio
+async def test_openai_client_is_built_once_and_closed_on_shutdown(monkeypatch):
+    built, closed = [], []
+
+    class _Pooled(_FakeOpenAI):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            built.append(self)
+
+        async def close(self):
+            closed.append(self)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(openai_provider, "AsyncOpenAI", _Pooled)
+    _Pooled.exc = _openai_429({"code": "rate_limit_exceeded", "type": "requests"})
+    for _ in range(3):
+        with pytest.raises(RateLimitError):
+            await openai_provider.plan("sys", "easy 5k", openai_provider.DEFAULT_MODEL)
+    assert len(built) == 1
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-rotated")  # a new key gets a new client
+    with pytest.raises(RateLimitError):
+        await openai_provider.plan("sys", "easy 5k", openai_provider.DEFAULT_MODEL)
+    assert len(built) == 2
+
+    assert await llm_clients.close_all() == 2
+    assert closed == built
+
+
 @pytest.mark.asyncio
 async def test_anthropic_low_balance_is_typed(monkeypatch):
     monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-test")
@@ -103,7 +154,7 @@ async def test_process_workout_refunds_and_reports_provider_quota(monkeypatch):
     async def fake_refund(user_id, receipt):
         refunds.append((user_id, receipt))
 
-    async def fake_parse_plan(text):
+    async def fake_parse_plan(text, *_):
         raise LLMQuotaExhausted("OpenAI account out of credits")
 
     async def fake_log(**kwargs):
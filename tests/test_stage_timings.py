@@ -0,0 +1,74 @@
+"""Per-stage timings and provider usage in the workout log (workout_service.py,
+workout_ai/gate.py): the log must say where a slow request spent its time."""
+
+import pytest
+from cachetools import LRUCache
+
+import redis_conn
+import workout_service
+from workout_ai import Usage
+from workout_ai import cache as parse_cache
+from workout_ai import gate as llm_gate
+from workout_ai.limiter import AdaptiveLimiter
+from workout_service import Success
+
+WORKOUT = {"name": "w", "intervals": [{"type": "run", "distance": 400, "pace": "03:45"}]}
+
+
+@pytest.mark.asyncio
+async def test_every_stage_reached_is_logged_with_the_usage(monkeypatch):
+    logged = {}
+
+    async def fake_consume(user_id):
+        return "receipt"
+
+    async def fake_parse_plan(text, trace, *_):
+        trace.cache = "miss"
+        trace.usage = Usage("openai", "gpt-4.1-mini", 2600, 90, 2432)
+        trace.timings.update(queue_wait_ms=3.0, provider_ms=1800.0)
+        return dict(WORKOUT)
+
+    async def fake_token(user_data):
+        return "tok"
+
+    async def fake_upload(token, garmin_json, user_id=None):
+        return "w-1", None
+
+    async def fake_log(**kwargs):
+        logged.update(kwargs)
+
+    monkeypatch.setattr(workout_service, "consume", fake_consume)
+    monkeypatch.setattr(workout_service, "parse_plan", fake_parse_plan)
+    monkeypatch.setattr(workout_service, "get_garmin_token", fake_token)
+    monkeypatch.setattr(workout_service, "upload_garmin_payload_async", fake_upload)
+    monkeypatch.setattr(workout_service, "log_workout_request", fake_log)
+
+    outcome = await workout_service.process_workout(1, {}, "10x400m @ 5k pace")
+
+    assert isinstance(outcome, Success)
+    assert set(logged["timings"]) == {
+        "queue_wait_ms", "provider_ms", "parse_ms", "prefs_ms",
+        "token_decrypt_ms", "convert_ms", "upload_ms",
+    }
+    assert logged["timings"]["provider_ms"] == 1800.0
+    assert logged["usage"]["cached_tokens"] == 2432
+
+
+@pytest.mark.asyncio
+async def test_gate_times_the_slot_wait_and_the_provider_call(monkeypatch):
+    monkeypatch.setattr(parse_cache, "_memory", LRUCache(maxsize=4))
+    monkeypatch.setattr(redis_conn, "client", None)
+    monkeypatch.setattr(llm_gate, "_inflight", {})
+    monkeypatch.setattr(llm_gate, "_limiter", AdaptiveLimiter(1, 1, 1))
+
+    async def fake_plan(text, trace):
+        return dict(WORKOUT)
+
+    monkeypatch.setattr(llm_gate, "plan_to_json_async", fake_plan)
+    trace = llm_gate.ParseTrace()
+    await llm_gate.parse_plan("10x400m @ 5k pace", trace)
+    assert set(trace.timings) == {"queue_wait_ms", "provider_ms"}
+
+    cached = llm_gate.ParseTrace()
+    await llm_gate.parse_plan("10x400m @ 5k pace", cached)
+    assert cached.cache == "hit" and cached.timings == {}
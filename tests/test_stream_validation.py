@@ -0,0 +1,120 @@
+"""Early abort of streamed structured output (workout_ai/streaming.py).
+
+check_partial must reject a prefix that already breaks a bound and must never
+reject a prefix of an output that would have validated — including the
+incomplete number or string still being typed at the end of the snapshot.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from workout_ai import clients as llm_clients
+from workout_ai.models import Workout
+from workout_ai.providers import claude as claude_provider
+from workout_ai.providers import openai as openai_provider
+from workout_ai.streaming import OutputOutOfBounds, check_partial
+
+VALID = (
+    '{"name": "10x400", "warmup": {"distance": 2000}, "intervals": '
+    '[{"type": "repeat", "repeat": 10, "steps": [{"type": "run", "distance": 400, '
+    '"pace": "03:45"}, {"type": "rest", "rest": 90}]}], "cooldown": {"distance": 2000}}'
+)
+
+
+def test_no_prefix_of_a_valid_output_is_rejected():
+    Workout.model_validate_json(VALID)  # the fixture itself is valid
+    for end in range(len(VALID) + 1):
+        check_partial(VALID[:end])
+
+
+@pytest.mark.parametrize(
+    "prefix",
+    [
+        '{"name": "x", "intervals": [{"type": "repeat", "repeat": 500',
+        '{"name": "x", "intervals": [{"type": "repeat", "repeat": 5, "steps": '
+        '[{"type": "run", "distance": 150000',
+        '{"name": "x", "intervals": [{"type": "rest", "rest": 9000',
+        '{"name": "x", "warmup": {"distance": 2000, "pace": "00:30"',
+        '{"name": "x", "cooldown": {"distance": 100001',
+    ],
+)
+def test_clearly_broken_bounds_abort(prefix):
+    with pytest.raises(OutputOutOfBounds):
+        check_partial(prefix)
+
+
+def test_incomplete_values_are_not_judged():
+    check_partial('{"name": "x", "intervals": [{"type": "repeat", "repeat": 1')  # may become 10
+    check_partial('{"name": "x", "warmup": {"pace": "00:3')  # unterminated string
+
+
+class _EventStream:
+    """Stands in for an SDK stream: yields snapshot events, counts how far the
+    consumer read, and fails the test if the final result is requested."""
+
+    def __init__(self, event_type, chunks):
+        self.event_type = event_type
+        self.chunks = chunks
+        self.consumed = 0
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+        return False
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        snapshot = ""
+        for chunk in self.chunks:
+            snapshot += chunk
+            self.consumed += 1
+            yield SimpleNamespace(type=self.event_type, snapshot=snapshot)
+
+    async def get_final_completion(self):
+        raise AssertionError("stream should have been abandoned")
+
+    get_final_message = get_final_completion
+
+
+# The third chunk breaks MAX_REPEAT; everything after it is tokens we don't pay for.
+BAD_CHUNKS = ['{"name": "x", ', '"intervals": [{"type": "repeat", ', '"repeat": 500'] + [", ..."] * 50
+
+
+@pytest.mark.asyncio
+async def test_openai_stream_is_dropped_at_the_first_broken_bound(monkeypatch):
+    stream = _EventStream("content.delta", BAD_CHUNKS)
+
+    class _Client:
+        def __init__(self, **kwargs):
+            self.chat = SimpleNamespace(completions=SimpleNamespace(stream=lambda **_: stream))
+
+    monkeypatch.setattr(llm_clients, "_clients", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(openai_provider, "AsyncOpenAI", _Client)
+    with pytest.raises(OutputOutOfBounds):
+        await openai_provider.plan("sys", "10x400", openai_provider.DEFAULT_MODEL)
+    assert stream.consumed == 3
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_claude_stream_is_dropped_at_the_first_broken_bound(monkeypatch):
+    stream = _EventStream("text", BAD_CHUNKS)
+
+    class _Client:
+        def __init__(self, **kwargs):
+            self.messages = SimpleNamespace(stream=lambda **_: stream)
+
+    monkeypatch.setattr(llm_clients, "_clients", {})
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-test")
+    monkeypatch.setattr(claude_provider, "AsyncAnthropic", _Client)
+    with pytest.raises(OutputOutOfBounds):
+        await claude_provider.plan("sys", "10x400", claude_provider.DEFAULT_MODEL)
+    assert stream.consumed == 3
+    assert stream.closed
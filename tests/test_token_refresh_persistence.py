@@ -32,6 +32,7 @@ class FakeGarthClient:
 def fake_garth(monkeypatch):
     monkeypatch.setattr(garmin, "GarthClient", FakeGarthClient)
     monkeypatch.setattr(garmin, "_install_garth_proxy", lambda client: None)
+    monkeypatch.setattr(garmin, "UPLOAD_TRANSPORT", "garth")
     FakeGarthClient.dumps_value = None
     return FakeGarthClient
 
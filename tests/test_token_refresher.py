@@ -0,0 +1,213 @@
+"""The proactive refresh sweep (token_refresher.py).
+
+Mongo, the exchange and the audit trail are faked at the module seams; the
+jitter is zeroed so a sweep runs to completion in one await.
+"""
+
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+
+import token_refresher
+import user
+
+
+def _token(tag: str, expires_at: float) -> str:
+    oauth2 = {"access_token": tag, "expires_at": int(expires_at)}
+    return base64.b64encode(json.dumps([{"oauth_token": "o"}, oauth2]).encode()).decode()
+
+
+class FakeUsers:
+    def __init__(self):
+        self.docs: dict[int, dict] = {}
+        self.saves: list[tuple[int, str]] = []
+
+    def add(self, uid, token, stored_expiry="from-token", active_at=None):
+        expiry = token_refresher.token_expires_at(token) if stored_expiry == "from-token" else None
+        self.docs[uid] = {"telegram_id": uid, "garmin_auth": token, "garmin_expires_at": expiry,
+                          "last_active_at": int(time.time()) if active_at is None else active_at}
+
+    async def get_user(self, uid):
+        doc = self.docs.get(uid)
+        return dict(doc) if doc else None
+
+    async def save_token(self, uid, token):
+        self.saves.append((uid, token))
+        self.docs[uid] = {**self.docs[uid], "garmin_auth": token,
+                          "garmin_expires_at": token_refresher.token_expires_at(token)}
+
+    async def replace_token(self, uid, token, expected_expiry):
+        if self.docs[uid]["garmin_expires_at"] != expected_expiry:
+            return False
+        await self.save_token(uid, token)
+        return True
+
+    async def defer_refresh(self, uid, until):
+        self.docs[uid]["garmin_refresh_retry_at"] = until
+
+    async def get_garmin_token(self, data):
+        return data.get("garmin_auth")
+
+    def users_due_for_refresh(self, before, active_since, limit):
+        now = time.time()
+        due = [
+            dict(doc) for doc in self.docs.values()
+            if (doc["garmin_expires_at"] is None or doc["garmin_expires_at"] < before)
+            and doc["last_active_at"] >= active_since
+            and doc.get("garmin_refresh_retry_at", 0) <= now
+        ]
+        due.sort(key=lambda doc: doc["garmin_expires_at"] or 0)
+
+        async def docs():
+            for doc in due[:limit]:
+                yield doc
+
+        return docs()
+
+
+@pytest.fixture
+def users(monkeypatch):
+    fake = FakeUsers()
+    for name in ("get_user", "replace_token", "defer_refresh", "get_garmin_token",
+                 "users_due_for_refresh"):
+        monkeypatch.setattr(token_refresher, name, getattr(fake, name))
+    monkeypatch.setattr(token_refresher, "TOKEN_REFRESH_JITTER_S", 0)
+    events = []
+
+    async def log_auth_event(uid, event, outcome="ok", detail=None):
+        events.append((uid, outcome, detail))
+
+    monkeypatch.setattr(token_refresher, "log_auth_event", log_auth_event)
+    fake.events = events
+    return fake
+
+
+def _refresher(monkeypatch, fn):
+    monkeypatch.setattr(token_refresher, "refresh_token_async", fn)
+
+
+@pytest.mark.asyncio
+async def test_only_tokens_inside_the_lead_time_are_refreshed(users, monkeypatch):
+    async def refresh(token):
+        return _token("new", time.time() + 3600)
+
+    _refresher(monkeypatch, refresh)
+    users.add(1, _token("soon", time.time() + 60))
+    users.add(2, _token("later", time.time() + 3000))
+    assert await token_refresher.sweep() == 1
+    assert [uid for uid, _ in users.saves] == [1]
+    assert users.events == [(1, "ok", "proactive")]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped(users, monkeypatch):
+    in_flight = peak = 0
+
+    async def refresh(token):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return _token("new", time.time() + 3600)
+
+    _refresher(monkeypatch, refresh)
+    monkeypatch.setattr(token_refresher, "TOKEN_REFRESH_CONCURRENCY", 2)
+    for uid in range(6):
+        users.add(uid, _token("soon", time.time() + 60))
+    await token_refresher.sweep()
+    assert peak == 2
+    assert len(users.saves) == 6
+
+
+@pytest.mark.asyncio
+async def test_a_token_replaced_during_the_exchange_is_not_overwritten(users, monkeypatch):
+    async def refresh(token):
+        await users.save_token(1, _token("login", time.time() + 3600))
+        return _token("stale-refresh", time.time() + 3600)
+
+    _refresher(monkeypatch, refresh)
+    users.add(1, _token("soon", time.time() + 60))
+    await token_refresher.sweep()
+    _, oauth2 = json.loads(base64.b64decode(users.docs[1]["garmin_auth"]))
+    assert oauth2["access_token"] == "login"
+
+
+@pytest.mark.asyncio
+async def test_a_failed_refresh_is_audited_and_backed_off(users, monkeypatch):
+    calls = 0
+
+    async def refresh(token):
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("oauth1 revoked")
+
+    _refresher(monkeypatch, refresh)
+    users.add(1, _token("soon", time.time() + 60))
+    await token_refresher.sweep()
+    await token_refresher.sweep()
+    assert calls == 1
+    assert users.events == [(1, "fail", "RuntimeError")]
+    assert users.saves == []
+
+
+@pytest.mark.asyncio
+async def test_legacy_docs_get_their_expiry_backfilled_without_a_refresh(users, monkeypatch):
+    async def refresh(token):
+        raise AssertionError("a fresh token was refreshed")
+
+    _refresher(monkeypatch, refresh)
+    users.add(1, _token("fresh", time.time() + 3000), stored_expiry=None)
+    await token_refresher.sweep()
+    assert users.docs[1]["garmin_expires_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_users_idle_past_the_active_window_are_left_alone(users, monkeypatch):
+    async def refresh(token):
+        return _token("new", time.time() + 3600)
+
+    _refresher(monkeypatch, refresh)
+    idle_since = time.time() - token_refresher.TOKEN_REFRESH_ACTIVE_S - 60
+    users.add(1, _token("soon", time.time() + 60), active_at=int(idle_since))
+    users.add(2, _token("soon", time.time() + 60))
+    assert await token_refresher.sweep() == 1
+    assert [uid for uid, _ in users.saves] == [2]
+
+
+@pytest.mark.asyncio
+async def test_backed_off_users_do_not_use_up_the_sweep_limit(users, monkeypatch):
+    async def refresh(token):
+        if "dead" in json.loads(base64.b64decode(token))[1]["access_token"]:
+            raise RuntimeError("oauth1 revoked")
+        return _token("new", time.time() + 3600)
+
+    _refresher(monkeypatch, refresh)
+    monkeypatch.setattr(token_refresher, "SWEEP_LIMIT", 2)
+    users.add(1, _token("dead", time.time() - 7200))  # expired longest: sorts first
+    users.add(2, _token("dead", time.time() - 3600))
+    users.add(3, _token("live", time.time() + 60))
+    await token_refresher.sweep()
+    assert users.saves == []
+    await token_refresher.sweep()
+    assert [uid for uid, _ in users.saves] == [3]
+
+
+@pytest.mark.asyncio
+async def test_the_refreshed_token_is_written_only_over_the_one_it_replaces(monkeypatch):
+    class Users:
+        def __init__(self):
+            self.updates = []
+
+        async def update_one(self, query, update):
+            self.updates.append(query)
+            return type("Result", (), {"matched_count": 0})()
+
+    users_col = Users()
+    monkeypatch.setattr(user, "users_col", users_col)
+    monkeypatch.setattr(user.token_crypto, "enabled", lambda: False)
+    assert not await user.replace_token(1, _token("new", time.time() + 3600), 1700000000)
+    assert users_col.updates == [{"telegram_id": 1, "garmin_expires_at": 1700000000}]
@@ -0,0 +1,115 @@
+"""At-most-once uploads (upload_ledger.py, garmin.upload_garmin_payload_async):
+a payload just uploaded for a user is not POSTed again, and an ambiguous
+failure is checked against the user's newest workouts before it is reported."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cachetools import TTLCache
+from curl_cffi.requests.exceptions import HTTPError as CurlHTTPError
+
+import garmin
+import redis_conn
+import upload_ledger
+
+PAYLOAD = {"workoutName": "10×400", "workoutSegments": []}
+
+
+@pytest.fixture
+def garmin_api(monkeypatch):
+    """Fakes the upload and the workout list; returns the recorder."""
+    rec = {"posts": [], "lists": 0, "errors": [], "workouts": []}
+    monkeypatch.setattr(redis_conn, "client", None)
+    monkeypatch.setattr(upload_ledger, "_fallback", TTLCache(maxsize=64, ttl=60))
+
+    async def upload(token, garmin_json, user_id):
+        rec["posts"].append((user_id, garmin_json))
+        if rec["errors"]:
+            raise rec["errors"].pop(0)
+        return f"id-{len(rec['posts'])}", None
+
+    async def connectapi(token, method, path, json_body, user_id):
+        rec["lists"] += 1
+        return rec["workouts"]
+
+    monkeypatch.setattr(garmin, "_upload_once", upload)
+    monkeypatch.setattr(garmin, "_connectapi", connectapi)
+    return rec
+
+
+def _listed(name, age_s):
+    created = datetime.now(timezone.utc) - timedelta(seconds=age_s)
+    return {"workoutId": 7, "workoutName": name, "createdDate": created.strftime("%Y-%m-%dT%H:%M:%S.0")}
+
+
+@pytest.mark.asyncio
+async def test_a_resent_payload_reuses_the_workout(garmin_api):
+    first = await garmin.upload_garmin_payload_async("t", PAYLOAD, user_id=1)
+    again = await garmin.upload_garmin_payload_async("t", dict(PAYLOAD), user_id=1)
+    assert first == ("id-1", None) and again == ("id-1", None)
+    assert len(garmin_api["posts"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_other_users_and_other_payloads_upload(garmin_api):
+    await garmin.upload_garmin_payload_async("t", PAYLOAD, user_id=1)
+    await garmin.upload_garmin_payload_async("t", PAYLOAD, user_id=2)
+    await garmin.upload_garmin_payload_async("t", {**PAYLOAD, "workoutName": "8×400"}, user_id=1)
+    await garmin.upload_garmin_payload_async("t", PAYLOAD)  # the CLI: no ledger
+    assert len(garmin_api["posts"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_a_timeout_that_landed_returns_the_created_workout(garmin_api):
+    garmin_api["errors"] = [TimeoutError("read timed out")]
+    garmin_api["workouts"] = [_listed("other", 5), _listed("10×400", 5)]
+    assert await garmin.upload_garmin_payload_async("t", PAYLOAD, user_id=1) == (7, None)
+    assert await upload_ledger.lookup(1, PAYLOAD) == "7"
+
+
+@pytest.mark.asyncio
+async def test_a_timeout_that_did_not_land_is_reported(garmin_api):
+    garmin_api["errors"] = [TimeoutError("read timed out")]
+    garmin_api["workouts"] = [_listed("10×400", 3600)]  # last hour's copy, not this one
+    with pytest.raises(TimeoutError):
+        await garmin.upload_garmin_payload_async("t", PAYLOAD, user_id=1)
+    assert await upload_ledger.lookup(1, PAYLOAD) is None
+
+
+@pytest.mark.asyncio
+async def test_a_definite_rejection_skips_the_check(garmin_api):
+    class _Resp:
+        status_code = 400
+
+    garmin_api["errors"] = [CurlHTTPError("HTTP 400", 0, _Resp())]
+    with pytest.raises(CurlHTTPError):
+        await garmin.upload_garmin_payload_async("t", PAYLOAD, user_id=1)
+    assert garmin_api["lists"] == 0
+
+
+@pytest.mark.asyncio
+async def test_an_unreachable_ledger_costs_nothing_but_dedupe(garmin_api, monkeypatch):
+    class _DownRedis:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def set(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(redis_conn, "client", _DownRedis())
+    assert await garmin.upload_garmin_payload_async("t", PAYLOAD, user_id=1) == ("id-1", None)
+
+
+@pytest.mark.asyncio
+async def test_a_reused_workout_is_not_scheduled_twice(garmin_api, monkeypatch):
+    posts = []
+
+    async def connectapi(token, method, path, json_body, user_id):
+        posts.append(path)
+
+    monkeypatch.setattr(garmin, "_connectapi", connectapi)
+    on = datetime(2026, 10, 21).date()
+    await garmin.schedule_workout_async("t", 7, on, user_id=1)
+    await garmin.schedule_workout_async("t", 7, on, user_id=1)
+    await garmin.schedule_workout_async("t", 7, on + timedelta(days=7), user_id=1)
+    assert posts == ["/workout-service/schedule/7"] * 2
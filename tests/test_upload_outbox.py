@@ -0,0 +1,190 @@
+"""The deferred-upload outbox (upload_outbox.py) and process_workout's use of
+it: a transient upload failure is kept rather than re-parsed, retried with
+backoff, and reported to the user when it lands or is given up on."""
+
+import base64
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import garmin_breaker
+import redis_conn
+import upload_outbox
+import workout_service
+from workout_service import Failure, FailureCode
+
+
+class FakeOutbox:
+    """Just enough of a motor collection for the outbox's queries."""
+
+    def __init__(self):
+        self.docs: list[dict] = []
+
+    async def insert_one(self, doc):
+        self.docs.append({**doc, "_id": len(self.docs) + 1})
+
+    async def find_one_and_update(self, query, update, sort, return_document):
+        due = [d for d in self.docs if d["next_attempt_at"] <= query["next_attempt_at"]["$lte"]]
+        if not due:
+            return None
+        doc = min(due, key=lambda d: d["next_attempt_at"])
+        doc.update(update["$set"])
+        doc["attempts"] += update["$inc"]["attempts"]
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if doc["_id"] == query["_id"]:
+                doc.update(update["$set"])
+
+    async def delete_one(self, query):
+        self.docs = [d for d in self.docs if d["_id"] != query["_id"]]
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if d["user_id"] != query["user_id"]]
+
+
+def _token():
+    oauth2 = {"access_token": "a", "expires_at": int(time.time() + 3600)}
+    return base64.b64encode(json.dumps([{}, oauth2]).encode()).decode()
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """A fake collection, user store and Garmin; returns the recorder."""
+    rec = {"col": FakeOutbox(), "errors": [], "uploads": 0, "notified": [],
+           "users": {1: {"telegram_id": 1}}}
+    monkeypatch.setattr(upload_outbox, "outbox_col", rec["col"])
+    monkeypatch.setattr(redis_conn, "client", None)
+    monkeypatch.setattr(garmin_breaker, "_local", garmin_breaker._Local())
+
+    async def get_user(uid):
+        return rec["users"].get(uid)
+
+    async def get_garmin_token(user_data):
+        return _token()
+
+    async def upload(token, payload, user_id=None):
+        rec["uploads"] += 1
+        if rec["errors"]:
+            raise rec["errors"].pop(0)
+        return "w-1", None
+
+    for name, fn in {"get_user": get_user, "get_garmin_token": get_garmin_token,
+                     "upload_garmin_payload_async": upload}.items():
+        monkeypatch.setattr(upload_outbox, name, fn)
+    return rec
+
+
+async def _notify(rec):
+    async def notify(uid, name, workout_id):
+        rec["notified"].append((uid, name, workout_id))
+
+    return notify
+
+
+def _make_due(rec):
+    for doc in rec["col"].docs:
+        doc["next_attempt_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+
+@pytest.mark.asyncio
+async def test_a_deferred_upload_lands_and_the_user_hears_of_it(outbox):
+    assert await upload_outbox.defer(1, "10×400", {"workoutName": "10×400"})
+    notify = await _notify(outbox)
+    assert await upload_outbox.sweep(notify) == 0  # not due yet: backoff first
+    _make_due(outbox)
+    assert await upload_outbox.sweep(notify) == 1
+    assert outbox["notified"] == [(1, "10×400", "w-1")]
+    assert outbox["col"].docs == []
+
+
+@pytest.mark.asyncio
+async def test_a_transient_failure_backs_off_and_stays(outbox):
+    await upload_outbox.defer(1, "10×400", {})
+    _make_due(outbox)
+    outbox["errors"] = [TimeoutError()]
+    await upload_outbox.sweep(await _notify(outbox))
+    (doc,) = outbox["col"].docs
+    assert doc["attempts"] == 1
+    assert doc["next_attempt_at"] > datetime.now(timezone.utc)
+    assert outbox["notified"] == []
+
+
+@pytest.mark.asyncio
+async def test_a_permanent_failure_is_given_up_and_reported(outbox):
+    await upload_outbox.defer(1, "10×400", {})
+    _make_due(outbox)
+    outbox["errors"] = [ValueError("400 bad workout")]
+    await upload_outbox.sweep(await _notify(outbox))
+    assert outbox["col"].docs == []
+    assert outbox["notified"] == [(1, "10×400", None)]
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_tried_while_the_breaker_is_open(outbox, monkeypatch):
+    await upload_outbox.defer(1, "10×400", {})
+    _make_due(outbox)
+
+    async def closed():
+        return False
+
+    monkeypatch.setattr(garmin_breaker, "allow", closed)
+    assert await upload_outbox.sweep(await _notify(outbox)) == 0
+    assert outbox["uploads"] == 0
+
+
+@pytest.mark.asyncio
+async def test_a_half_open_breaker_gets_one_entry_as_its_probe(outbox, monkeypatch):
+    for i in range(5):
+        await upload_outbox.defer(1, f"w{i}", {})
+    _make_due(outbox)
+    for _ in range(garmin_breaker.GARMIN_BREAKER_THRESHOLD):
+        await garmin_breaker.record_failure()
+    garmin_breaker._local.open_until = 0  # open period over: half-open
+    assert await garmin_breaker.state() == garmin_breaker.HALF_OPEN
+    outbox["errors"] = [TimeoutError()]
+    assert await upload_outbox.sweep(await _notify(outbox)) == 1
+    assert outbox["uploads"] == 1
+
+
+def test_backoff_grows_exponentially_with_jitter_up_to_the_cap():
+    for attempts in range(12):
+        delay = min(upload_outbox.OUTBOX_MAX_DELAY_S, upload_outbox.OUTBOX_BASE_DELAY_S * 2**attempts)
+        assert delay / 2 <= upload_outbox._backoff(attempts) <= delay
+
+
+@pytest.mark.asyncio
+async def test_process_workout_defers_instead_of_failing(outbox, monkeypatch):
+    parses = []
+
+    async def consume(user_id):
+        return "receipt"
+
+    async def parse_plan(text, *_):
+        parses.append(text)
+        return {"name": "10×400", "intervals": [{"type": "run", "distance": 400, "pace": "03:45"}]}
+
+    async def token(user_data):
+        return _token()
+
+    async def upload(token, payload, user_id=None):
+        raise ConnectionError("connectapi reset")
+
+    logs = []
+
+    async def log(**kwargs):
+        logs.append(kwargs)
+
+    for name, fn in {"consume": consume, "parse_plan": parse_plan, "get_garmin_token": token,
+                     "upload_garmin_payload_async": upload, "log_workout_request": log}.items():
+        monkeypatch.setattr(workout_service, name, fn)
+
+    outcome = await workout_service.process_workout(1, {}, "10x400 @ 3:45")
+    assert outcome == Failure(FailureCode.UPLOAD_DEFERRED)
+    (doc,) = outbox["col"].docs
+    assert (doc["user_id"], doc["name"], doc["payload"]["workoutName"]) == (1, "10×400", "10×400")
+    assert logs[0]["error"].endswith("(deferred)")
+    assert parses == ["10x400 @ 3:45"]
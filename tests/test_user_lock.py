@@ -0,0 +1,80 @@
+"""The per-user workout lease (user_lock.py): fenced, kept alive by its
+heartbeat, and never outliving a holder that stops renewing it."""
+
+import asyncio
+
+import fakeredis.aioredis
+import pytest
+
+import redis_conn
+import user_lock
+
+
+@pytest.fixture(params=["redis", "local"], autouse=True)
+def backend(request, monkeypatch):
+    """A short lease (0.3s, renewed every 0.1s) on fakeredis or in process."""
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True) if request.param == "redis" else None
+    monkeypatch.setattr(redis_conn, "client", client)
+    monkeypatch.setattr(user_lock, "_fallback", {})
+    monkeypatch.setattr(user_lock, "WORK_LOCK_TTL_S", 0.3)
+
+
+def _crash(lease):
+    # The holder's process dies: no release, and the heartbeat goes with it.
+    lease._heartbeat.cancel()
+
+
+@pytest.mark.asyncio
+async def test_one_holder_at_a_time_with_growing_fences():
+    first = await user_lock.acquire(1)
+    assert await user_lock.acquire(1) is None
+    assert await user_lock.acquire(2) is not None  # per user
+    await user_lock.release(first)
+    second = await user_lock.acquire(1)
+    assert second.fence > first.fence
+    await user_lock.release(second)
+
+
+@pytest.mark.asyncio
+async def test_the_heartbeat_keeps_a_long_workout_locked():
+    lease = await user_lock.acquire(1)
+    await asyncio.sleep(0.7)  # over twice the TTL
+    assert await user_lock.held(1) and not lease.lost
+    await user_lock.release(lease)
+    assert not await user_lock.held(1)
+
+
+@pytest.mark.asyncio
+async def test_a_crashed_holder_frees_the_user_within_the_ttl():
+    lease = await user_lock.acquire(1)
+    await user_lock.set_notice(lease, (7, 42))
+    _crash(lease)
+    await asyncio.sleep(0.4)
+    assert not await user_lock.held(1)
+    assert await user_lock.notice(1) is None
+    assert await user_lock.acquire(1) is not None
+
+
+@pytest.mark.asyncio
+async def test_a_lapsed_holder_cannot_touch_the_new_lease():
+    stale = await user_lock.acquire(1)
+    _crash(stale)
+    await asyncio.sleep(0.4)
+    current = await user_lock.acquire(1)
+    await user_lock.set_notice(current, (7, 42))
+
+    assert not await user_lock.renew(stale)
+    await user_lock.set_notice(stale, (7, 1))
+    await user_lock.release(stale)
+    assert await user_lock.held(1)
+    assert await user_lock.notice(1) == (7, 42)
+    await user_lock.release(current)
+
+
+@pytest.mark.asyncio
+async def test_a_wedged_holder_stops_renewing(monkeypatch):
+    monkeypatch.setattr(user_lock, "WORK_LOCK_MAX_HOLD_S", 0.15)
+    lease = await user_lock.acquire(1)
+    await asyncio.sleep(0.7)
+    assert lease.lost
+    assert not await user_lock.held(1)
@@ -91,7 +91,10 @@ async def test_get_prefs_merges_stored_over_defaults(client, users):
 
 @pytest.mark.asyncio
 async def test_put_then_get_round_trip(client, users):
-    new = {"add_warmup": True, "add_cooldown": True, "wu_cd_lap_press": False, "wu_cd_skip_pace": True}
+    new = {
+        "add_warmup": True, "add_cooldown": True, "wu_cd_lap_press": False,
+        "wu_cd_skip_pace": True, "schedule_dates": True,
+    }
     resp = await client.put("/api/prefs", headers=AUTH, json=new)
     assert resp.status == 200
     assert users[42]["prefs"] == new
@@ -132,3 +135,11 @@ async def test_prefs_are_keyed_to_the_initdata_user(client, users):
 async def test_healthz_is_public(client):
     resp = await client.get("/healthz")
     assert resp.status == 200
+
+
+@pytest.mark.asyncio
+async def test_llm_health_reports_limit_and_queue_depth(client):
+    resp = await client.get("/healthz/llm")
+    assert resp.status == 200
+    body = await resp.json()
+    assert {"limit", "in_flight", "queue_depth"} <= set(body)
@@ -0,0 +1,124 @@
+"""Webhook ingestion (webhook.py): authenticated, acknowledged at once, queued
+with a bound, deduplicated by update_id, and routed to the polling handlers."""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient, TestServer
+
+import bot
+import webhook
+from webapp_server import create_app
+
+SECRET = "s3cret"
+HEADERS = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+
+def _update(update_id, text="10x400", chat_type="private"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": 100 + update_id,
+            "from": {"id": 42},
+            "chat": {"id": 42, "type": chat_type},
+            "text": text,
+        },
+    }
+
+
+@pytest_asyncio.fixture
+async def handled(monkeypatch):
+    """Start the webhook workers with a recording handler; returns the record."""
+    monkeypatch.setattr(webhook, "_seen", {})
+    seen: list[dict] = []
+    gate = asyncio.Event()
+    gate.set()
+
+    async def handle(update):
+        await gate.wait()
+        seen.append(update)
+
+    webhook.start(handle)
+    yield seen, gate
+    gate.set()
+    await webhook.stop()
+
+
+@pytest_asyncio.fixture
+async def client():
+    async with TestClient(TestServer(create_app(bot_token="t", webhook_secret=SECRET))) as c:
+        yield c
+
+
+@pytest.mark.asyncio
+async def test_without_the_secret_nothing_is_queued(client, handled):
+    resp = await client.post(webhook.WEBHOOK_PATH, json=_update(1))
+    assert resp.status == 401
+    resp = await client.post(webhook.WEBHOOK_PATH, json=_update(1), headers={
+        "X-Telegram-Bot-Api-Secret-Token": "guess"})
+    assert resp.status == 401
+    await webhook.stop()
+    assert handled[0] == []
+
+
+@pytest.mark.asyncio
+async def test_updates_are_acknowledged_and_handled_once(client, handled):
+    for update_id in (1, 2, 1):  # the second 1 is Telegram retrying
+        resp = await client.post(webhook.WEBHOOK_PATH, json=_update(update_id), headers=HEADERS)
+        assert resp.status == 200
+    await webhook.stop()
+    assert sorted(u["update_id"] for u in handled[0]) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_a_full_queue_asks_telegram_to_retry(client, monkeypatch):
+    monkeypatch.setattr(webhook, "_seen", {})
+    monkeypatch.setattr(webhook, "WEBHOOK_QUEUE_MAX", 1)
+    monkeypatch.setattr(webhook, "WEBHOOK_WORKERS", 1)
+    gate = asyncio.Event()
+
+    async def handle(update):
+        await gate.wait()
+
+    webhook.start(handle)
+    statuses = []
+    for update_id in (1, 2, 3):  # 1 in the worker, 2 queued, 3 refused
+        resp = await client.post(webhook.WEBHOOK_PATH, json=_update(update_id), headers=HEADERS)
+        statuses.append(resp.status)
+        await asyncio.sleep(0)
+    assert statuses == [200, 200, 503]
+    gate.set()
+    await webhook.stop()
+    # Refused, so not remembered: Telegram's retry is taken.
+    assert 3 not in webhook._seen
+
+
+@pytest.mark.asyncio
+async def test_an_oversized_body_is_refused(client, handled):
+    resp = await client.post(
+        webhook.WEBHOOK_PATH, json=_update(1, text="x" * 70_000), headers=HEADERS
+    )
+    assert resp.status == 413
+
+
+@pytest.mark.asyncio
+async def test_updates_reach_the_polling_handlers(monkeypatch):
+    calls = []
+
+    def recorder(name):
+        async def handler(client, message):
+            calls.append((name, message.text, message.from_user.id, message.chat.id))
+
+        return handler
+
+    monkeypatch.setattr(bot, "_COMMAND_HANDLERS", {"start": recorder("start")})
+    monkeypatch.setattr(bot, "text_handler", recorder("text"))
+    await bot.handle_update(_update(1, "/start"))
+    await bot.handle_update(_update(2, "/Start@HeyGarminBot"))
+    await bot.handle_update(_update(3, "/unknown"))
+    await bot.handle_update(_update(4, "10x400"))
+    await bot.handle_update(_update(5, "10x400", chat_type="group"))
+    await bot.handle_update({"update_id": 6, "edited_message": {}})
+    assert [c[0] for c in calls] == ["start", "start", "text", "text"]
+    assert calls[-1] == ("text", "10x400", 42, 42)
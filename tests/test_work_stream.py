@@ -0,0 +1,132 @@
+"""Stream dispatch: bot.py queues and signals (work_stream.py), worker.py drains
+each user's plans in order under a shared per-user lock (user_lock.py)."""
+
+from types import SimpleNamespace
+
+import fakeredis.aioredis
+import pytest
+
+import bot
+import redis_conn
+import replies
+import user_lock
+import work_stream
+import worker
+import workout_queue
+from workout_service import Success
+
+
+async def _no_stamp(uid, user_data):
+    pass  # the last_active_at write would wait on a real Mongo
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Fakeredis, a fake Bot API and a fake process_workout; returns the recorder."""
+    rec = {"sent": [], "processed": []}
+    monkeypatch.setattr(redis_conn, "client", fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+    async def send_message(chat_id, text, reply_to_message_id=None):
+        rec["sent"].append((reply_to_message_id, text))
+        return len(rec["sent"])
+
+    async def get_user(uid):
+        return {"telegram_id": uid, "state": worker.AUTHORIZED}
+
+    async def process_workout(user_id, user_data, text, notify, on_accepted, priority):
+        await on_accepted()
+        rec["processed"].append((text, priority))
+        return Success(workout_id=text, processing_ms=1.0)
+
+    monkeypatch.setattr(worker.bot_api, "send_message", send_message)
+    monkeypatch.setattr(worker, "get_user", get_user)
+    monkeypatch.setattr(worker, "process_workout", process_workout)
+    monkeypatch.setattr(worker, "_priority_hint", {})
+    monkeypatch.setattr(bot, "mark_active", _no_stamp)
+    return rec
+
+
+async def _work(consumer="w1"):
+    handled = 0
+    while await work_stream.poll(worker.drain, consumer, block_ms=None):
+        handled += 1
+    return handled
+
+
+class FakeMessage:
+    def __init__(self, message_id, text, sent):
+        self.id, self.text, self.sent = message_id, text, sent
+        self.chat = SimpleNamespace(id=7)
+
+    async def reply(self, text):
+        self.sent.append((self.id, text))
+
+
+@pytest.mark.asyncio
+async def test_dispatched_plans_are_run_in_order_by_a_worker(stream, monkeypatch):
+    monkeypatch.setattr(bot, "WORKOUT_DISPATCH", "stream")
+    monkeypatch.setattr(bot, "_priority_hint", {1: bot.Priority.FIRST_TIME})
+    await work_stream.init_group()
+    await work_stream.init_group()  # idempotent
+    for i, text in enumerate(["a", "b"], start=1):
+        await bot.handle_workout(FakeMessage(i, text, stream["sent"]), 1, {})
+
+    assert (2, "📥 Queued — #2 in line, right after the current workout.") in stream["sent"]
+    await _work()
+    assert stream["processed"] == [("a", bot.Priority.FIRST_TIME), ("b", bot.Priority.INTERACTIVE)]
+    assert (1, replies.PROCESSING_TEXT + replies.queued_suffix(1)) in stream["sent"]
+    assert stream["sent"][-1][1].startswith("Workout successfully imported!")
+    assert not await user_lock.held(1)
+    assert await redis_conn.client.xpending(work_stream.STREAM, work_stream.GROUP) == {
+        "pending": 0, "min": None, "max": None, "consumers": []
+    }
+
+
+@pytest.mark.asyncio
+async def test_a_signal_for_a_busy_user_is_left_to_the_holder(stream):
+    await work_stream.init_group()
+    lease = await user_lock.acquire(1)
+    await workout_queue.push(1, 7, 10, "a")
+    await work_stream.signal(1)
+    assert await _work() == 1
+    assert stream["processed"] == []
+
+    # The holder lets go and finds the plan: it signals again for it.
+    await user_lock.release(lease)
+    if await workout_queue.depth(1):
+        await work_stream.signal(1)
+    await _work()
+    assert [t for t, _ in stream["processed"]] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_a_plan_queued_during_the_drain_is_resignalled(stream, monkeypatch):
+    await work_stream.init_group()
+    await workout_queue.push(1, 7, 10, "a")
+    real_pop = workout_queue.pop
+
+    async def pop(uid):
+        entry = await real_pop(uid)
+        if entry is None and not stream.get("late"):
+            # Arrives after the last pop, its signal lost to the held lock.
+            stream["late"] = True
+            await workout_queue.push(1, 7, 11, "b")
+        return entry
+
+    monkeypatch.setattr(workout_queue, "pop", pop)
+    await work_stream.signal(1)
+    await _work()
+    assert [t for t, _ in stream["processed"]] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_a_dead_workers_signal_is_claimed_by_another(stream, monkeypatch):
+    await work_stream.init_group()
+    await workout_queue.push(1, 7, 10, "a")
+    await work_stream.signal(1)
+    await redis_conn.client.xreadgroup(
+        work_stream.GROUP, "dead", {work_stream.STREAM: ">"}, count=1
+    )  # read, never acknowledged
+    monkeypatch.setattr(work_stream, "WORK_CLAIM_IDLE_MS", 0)
+    assert await _work("w2") == 1
+    assert [t for t, _ in stream["processed"]] == ["a"]
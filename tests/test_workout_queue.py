@@ -0,0 +1,171 @@
+"""Per-user workout queue (workout_queue.py) and the bot draining it in order
+while keeping one workout in flight per user."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import fakeredis.aioredis
+import pytest
+
+import bot
+import redis_conn
+import replies
+import user_lock
+import workout_queue
+from workout_service import Success
+
+
+async def _no_stamp(uid, user_data):
+    pass  # the last_active_at write would wait on a real Mongo
+
+
+@pytest.fixture(params=["memory", "redis"])
+def queue(request, monkeypatch):
+    monkeypatch.setattr(workout_queue, "_fallback", {})
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True) if request.param == "redis" else None
+    monkeypatch.setattr(redis_conn, "client", client)
+    monkeypatch.setattr(user_lock, "_fallback", {})
+    monkeypatch.setattr(workout_queue, "WORKOUT_QUEUE_MAX", 2)
+    monkeypatch.setattr(bot, "mark_active", _no_stamp)
+    return workout_queue
+
+
+@pytest.mark.asyncio
+async def test_fifo_with_a_length_cap(queue):
+    assert await queue.push(1, 10, 100, "a") == 1
+    assert await queue.push(1, 10, 101, "b") == 2
+    assert await queue.push(1, 10, 102, "c") is None  # full
+    assert await queue.depth(1) == 2
+    assert [(await queue.pop(1))["text"] for _ in range(2)] == ["a", "b"]
+    assert await queue.pop(1) is None
+
+
+class _Interleaving:
+    """A Redis client that yields after every command, so concurrent callers
+    interleave between their round trips as they do over a real network."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        command = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            result = await command(*args, **kwargs)
+            await asyncio.sleep(0)
+            return result
+
+        return call
+
+
+@pytest.mark.asyncio
+async def test_a_refused_push_never_takes_another_plan_with_it(queue, monkeypatch):
+    if redis_conn.client is not None:
+        monkeypatch.setattr(redis_conn, "client", _Interleaving(redis_conn.client))
+    await queue.push(1, 10, 100, "a")
+    await queue.push(1, 10, 101, "b")
+    # Full: one push is refused while a worker pops and another push lands.
+    refused, popped, accepted = await asyncio.gather(
+        queue.push(1, 10, 102, "c"), queue.pop(1), queue.push(1, 10, 103, "d")
+    )
+    assert popped["text"] == "a"
+    assert (refused, accepted) == (None, 2)
+    assert [(await queue.pop(1))["text"] for _ in range(2)] == ["b", "d"]
+
+
+@pytest.mark.asyncio
+async def test_queues_are_per_user_and_cleared_on_logout(queue):
+    await queue.push(1, 10, 100, "a")
+    await queue.push(2, 20, 200, "b")
+    await queue.clear(1)
+    assert await queue.pop(1) is None
+    assert (await queue.pop(2))["text"] == "b"
+
+
+def test_age_cap(monkeypatch):
+    monkeypatch.setattr(workout_queue, "WORKOUT_QUEUE_MAX_AGE_S", 60)
+    assert not workout_queue.expired({"ts": time.time() - 30})
+    assert workout_queue.expired({"ts": time.time() - 90})
+
+
+class FakeMessage:
+    _ids = iter(range(1, 10_000))
+
+    def __init__(self, text, sent):
+        self.text = text
+        self.id = next(self._ids)
+        self.chat = SimpleNamespace(id=7)
+        self.sent = sent
+
+    async def reply(self, text):
+        self.sent.append((self.id, text))
+        return SimpleNamespace(chat=self.chat, id=1000 + self.id)
+
+
+@pytest.mark.asyncio
+async def test_plans_sent_mid_flight_are_drained_in_order(queue, monkeypatch):
+    sent, processed, in_flight = [], [], []
+    release = asyncio.Event()
+
+    async def process_workout(user_id, user_data, text, notify, on_accepted, priority):
+        in_flight.append(text)
+        assert len(in_flight) == 1  # never two at once for one user
+        await on_accepted()
+        if text == "first":
+            await release.wait()
+        processed.append(text)
+        in_flight.pop()
+        return Success(workout_id=text, processing_ms=1.0)
+
+    async def get_user(uid):
+        return {"telegram_id": uid, "state": bot.AUTHORIZED}
+
+    async def send_message(chat_id, text, reply_to_message_id):
+        sent.append((reply_to_message_id, text))
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), id=2000 + reply_to_message_id)
+
+    async def edit_message_text(chat_id, message_id, text):
+        sent.append(("notice", message_id, text))
+
+    monkeypatch.setattr(bot, "process_workout", process_workout)
+    monkeypatch.setattr(bot, "get_user", get_user)
+    monkeypatch.setattr(bot.app, "send_message", send_message)
+    monkeypatch.setattr(bot.app, "edit_message_text", edit_message_text)
+
+    first = asyncio.create_task(bot.handle_workout(FakeMessage("first", sent), 1, {}))
+    await asyncio.sleep(0)
+    second, third = FakeMessage("second", sent), FakeMessage("third", sent)
+    await bot.handle_workout(second, 1, {})
+    await bot.handle_workout(third, 1, {})
+    await bot.handle_workout(FakeMessage("fourth", sent), 1, {})  # over the cap of 2
+
+    assert (second.id, "📥 Queued — #1 in line, right after the current workout.") in sent
+    # The busy path edits the live notice of the workout in flight.
+    first_notice = 1000 + second.id - 1
+    assert any(e[:2] == ("notice", first_notice) and "already waiting" in e[2] for e in sent)
+    release.set()
+    await first
+    assert processed == ["first", "second", "third"]
+    assert not await user_lock.held(1)
+
+
+@pytest.mark.asyncio
+async def test_a_stale_queued_plan_is_skipped_with_a_note(queue, monkeypatch):
+    sent, processed = [], []
+
+    async def process_workout(user_id, user_data, text, **_):
+        processed.append(text)
+        return Success(workout_id=text, processing_ms=1.0)
+
+    async def send_message(chat_id, text, reply_to_message_id):
+        sent.append((reply_to_message_id, text))
+
+    monkeypatch.setattr(bot, "process_workout", process_workout)
+    monkeypatch.setattr(bot.app, "send_message", send_message)
+    await workout_queue.push(1, 7, 55, "left over from before a restart")
+    monkeypatch.setattr(workout_queue, "WORKOUT_QUEUE_MAX_AGE_S", -1)
+
+    await bot.handle_workout(FakeMessage("now", sent), 1, {})
+    assert processed == ["now"]
+    assert (55, replies.EXPIRED_TEXT) in sent
@@ -0,0 +1,189 @@
+"""Calendar scheduling: day labels to dates (plan_dates.py), the at-most-once
+schedule call (garmin.schedule_workout_async), and process_workout's optional
+schedule stage, which never fails an upload."""
+
+import base64
+import json
+import time
+from datetime import date
+
+import pytest
+from curl_cffi.requests.exceptions import HTTPError as CurlHTTPError
+
+import garmin
+import workout_service
+from plan_dates import resolve, workout_dates
+from workout_service import BatchOutcome, Success
+
+SATURDAY = date(2026, 10, 17)
+
+
+@pytest.mark.parametrize(
+    ("label", "expected"),
+    [
+        ("Tue", date(2026, 10, 20)),
+        ("tuesday", date(2026, 10, 20)),
+        ("вторник", date(2026, 10, 20)),
+        ("сб", SATURDAY),  # today counts
+        ("2026-10-21", date(2026, 10, 21)),
+        ("21.10", date(2026, 10, 21)),
+        ("01.01", date(2027, 1, 1)),  # already passed this year
+        ("05.11.2026", date(2026, 11, 5)),
+        ("31.02", None),
+        ("day 3", None),
+    ],
+)
+def test_labels_resolve_to_dates(label, expected):
+    assert resolve(label, SATURDAY) == expected
+
+
+def test_batch_workouts_are_dated_by_their_name_single_ones_by_the_plan():
+    batch = [{"name": "Wed: 10×400"}, {"name": "2026-10-25 — long run"}, {"name": "Day 3: x"}]
+    assert workout_dates("", batch, SATURDAY) == [date(2026, 10, 21), date(2026, 10, 25), None]
+    assert workout_dates("Tue: 10x400", [{"name": "10×400"}], SATURDAY) == [date(2026, 10, 20)]
+    assert workout_dates("10x400", [{"name": "10×400"}], SATURDAY) == [None]
+    ranges = "Tue: 2.5 - 3 km warmup\n6x1km @ 4:00\n1.5 - 2 km cooldown"
+    assert workout_dates(ranges, [{"name": "6×1000 @ 4:00"}], SATURDAY) == [date(2026, 10, 20)]
+    batch = [{"name": "12.05: 10×400"}, {"name": "1.5 - 2 km cooldown"}]
+    assert workout_dates("", batch, SATURDAY) == [date(2027, 5, 12), None]
+
+
+class _Resp:
+    def __init__(self, status):
+        self.status_code = status
+
+
+def _http_error(status):
+    return CurlHTTPError(f"HTTP {status}", 0, _Resp(status))
+
+
+@pytest.fixture
+def connectapi(monkeypatch):
+    """Fakes garmin._connectapi: POSTs fail with the queued errors in order,
+    the calendar GET returns `calendar`."""
+    rec = {"calls": [], "errors": [], "calendar": {"calendarItems": []}}
+
+    async def fake(token, method, path, json_body, user_id):
+        rec["calls"].append((method, path, json_body))
+        if method == "GET":
+            return rec["calendar"]
+        if rec["errors"]:
+            raise rec["errors"].pop(0)
+        return None
+
+    monkeypatch.setattr(garmin, "_connectapi", fake)
+    return rec
+
+
+def _posts(rec):
+    return [c for c in rec["calls"] if c[0] == "POST"]
+
+
+@pytest.mark.asyncio
+async def test_a_clean_schedule_is_one_post(connectapi):
+    await garmin.schedule_workout_async("t", 42, date(2026, 10, 21))
+    assert connectapi["calls"] == [
+        ("POST", "/workout-service/schedule/42", {"date": "2026-10-21"})
+    ]
+
+
+@pytest.mark.asyncio
+async def test_an_ambiguous_failure_that_landed_is_not_posted_again(connectapi):
+    connectapi["errors"] = [TimeoutError("read timed out")]
+    connectapi["calendar"] = {
+        "calendarItems": [{"itemType": "workout", "workoutId": 42, "date": "2026-10-21"}]
+    }
+    await garmin.schedule_workout_async("t", 42, date(2026, 10, 21))
+    assert len(_posts(connectapi)) == 1
+    assert ("GET", "/calendar-service/year/2026/month/9", None) in connectapi["calls"]
+
+
+@pytest.mark.asyncio
+async def test_an_ambiguous_failure_that_did_not_land_is_retried_once(connectapi):
+    connectapi["errors"] = [_http_error(503)]
+    await garmin.schedule_workout_async("t", 42, date(2026, 10, 21))
+    assert len(_posts(connectapi)) == 2
+
+
+@pytest.mark.asyncio
+async def test_a_definite_refusal_is_not_retried(connectapi):
+    connectapi["errors"] = [_http_error(400)]
+    with pytest.raises(CurlHTTPError):
+        await garmin.schedule_workout_async("t", 42, date(2026, 10, 21))
+    assert connectapi["calls"] == _posts(connectapi)[:1]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """process_workout with every collaborator faked; returns the recorder."""
+    rec = {"prefs": {"schedule_dates": True}, "scheduled": [], "fail": set(), "logs": []}
+
+    async def consume(user_id):
+        return "receipt"
+
+    async def parse_plan(text, *_):
+        return {"name": "10×400", "intervals": [{"type": "run", "distance": 400, "pace": "03:45"}]}
+
+    async def parse_plan_batch(text, *_):
+        return [{**await parse_plan(text), "name": name} for name in ("2026-10-20: a", "Day 2: b")]
+
+    async def token(user_data):
+        oauth2 = {"access_token": "a", "expires_at": int(time.time() + 3600)}
+        return base64.b64encode(json.dumps([{}, oauth2]).encode()).decode()
+
+    async def upload(token, garmin_json, user_id=None):
+        return f"id-{garmin_json['workoutName'][:4]}", None
+
+    async def schedule(token, workout_id, on, user_id=None):
+        if workout_id in rec["fail"]:
+            raise RuntimeError("garmin 500")
+        rec["scheduled"].append((workout_id, on))
+
+    async def log(**kwargs):
+        rec["logs"].append(kwargs)
+
+    for name, fn in {
+        "consume": consume, "parse_plan": parse_plan, "parse_plan_batch": parse_plan_batch,
+        "get_garmin_token": token, "upload_garmin_payload_async": upload,
+        "schedule_workout_async": schedule, "log_workout_request": log,
+    }.items():
+        monkeypatch.setattr(workout_service, name, fn)
+    return rec
+
+
+@pytest.mark.asyncio
+async def test_a_dated_plan_is_uploaded_and_scheduled(service):
+    outcome = await workout_service.process_workout(
+        1, {"prefs": service["prefs"]}, "2026-10-21: 10x400 @ 3:45"
+    )
+    assert outcome.scheduled_for == date(2026, 10, 21)
+    assert service["scheduled"] == [("id-10×4", date(2026, 10, 21))]
+    (log,) = service["logs"]
+    assert log["scheduled"] == ["2026-10-21"]
+    assert "schedule_ms" in log["timings"]
+
+
+@pytest.mark.asyncio
+async def test_scheduling_is_off_by_default(service):
+    outcome = await workout_service.process_workout(1, {}, "2026-10-21: 10x400 @ 3:45")
+    assert outcome.scheduled_for is None and service["scheduled"] == []
+    assert service["logs"][0]["scheduled"] is None
+
+
+@pytest.mark.asyncio
+async def test_a_failed_schedule_leaves_the_upload_standing(service):
+    service["fail"].add("id-10×4")
+    outcome = await workout_service.process_workout(
+        1, {"prefs": service["prefs"]}, "2026-10-21: 10x400 @ 3:45"
+    )
+    assert outcome == Success("id-10×4", outcome.processing_ms, schedule_failed=True)
+
+
+@pytest.mark.asyncio
+async def test_a_batch_schedules_only_its_dated_workouts(service):
+    outcome = await workout_service.process_workout(
+        1, {"prefs": service["prefs"]}, "2026-10-20: 10x400\nDay 2: 8 km easy"
+    )
+    assert isinstance(outcome, BatchOutcome)
+    assert [r.scheduled_for for r in outcome.results] == [date(2026, 10, 20), None]
+    assert service["scheduled"] == [("id-2026", date(2026, 10, 20))]
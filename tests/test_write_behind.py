@@ -0,0 +1,148 @@
+"""Writes off the reply path: log lines and audit events are buffered and
+inserted in batches (write_behind.py), and a refreshed token is persisted with
+a targeted $set (user.save_token)."""
+
+import asyncio
+import base64
+import json
+import os
+import time
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import audit
+import token_crypto
+import user
+import workout_log
+import write_behind
+
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.batches: list[list[dict]] = []
+        self.fail = fail
+        self.updates: list[tuple[dict, dict]] = []
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail:
+            raise ConnectionError("mongo down")
+        self.batches.append(docs)
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    monkeypatch.setattr(write_behind, "_buffers", [])
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_BATCH", 3)
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_FLUSH_S", 0.05)
+    return write_behind.Buffer(FakeCollection(), "test")
+
+
+@pytest.mark.asyncio
+async def test_a_full_batch_is_written_in_one_insert(buffer):
+    for i in range(4):
+        buffer.add({"i": i})
+    await asyncio.sleep(0)
+    assert [[d["i"] for d in b] for b in buffer.collection.batches] == [[0, 1, 2]]
+
+
+@pytest.mark.asyncio
+async def test_a_partial_batch_is_written_after_the_interval(buffer):
+    buffer.add({"i": 0})
+    assert buffer.collection.batches == []
+    await asyncio.sleep(0.1)
+    assert buffer.collection.batches == [[{"i": 0}]]
+
+
+@pytest.mark.asyncio
+async def test_shutdown_flushes_whatever_is_left(buffer):
+    buffer.add({"i": 0})
+    assert await write_behind.flush_all() == 1
+    assert buffer.collection.batches == [[{"i": 0}]]
+
+
+@pytest.mark.asyncio
+async def test_a_failed_write_is_swallowed(buffer):
+    buffer.collection.fail = True
+    buffer.add({"i": 0})
+    assert await buffer.flush() == 0
+    assert await write_behind.flush_all() == 0
+
+
+@pytest.mark.asyncio
+async def test_logging_a_workout_or_an_auth_event_does_not_wait_on_mongo(buffer, monkeypatch):
+    monkeypatch.setattr(workout_log, "_buffer", buffer)
+    monkeypatch.setattr(audit, "_buffer", buffer)
+    log_id = await workout_log.log_workout_request(user_id=1, prompt="10x400", garmin_workout_id="7")
+    await audit.log_auth_event(1, "token_decrypt")
+    assert buffer.collection.batches == []
+    await write_behind.flush_all()
+    (batch,) = buffer.collection.batches
+    assert str(batch[0]["_id"]) == log_id
+    assert batch[1]["event"] == "token_decrypt"
+
+
+@pytest.mark.asyncio
+async def test_a_refreshed_token_is_set_not_replaced(monkeypatch):
+    monkeypatch.setattr(token_crypto, "DISABLED", False)
+    monkeypatch.setattr(token_crypto, "_dek", None)
+    monkeypatch.setenv("TOKEN_ENC_KEY", base64.b64encode(os.urandom(32)).decode())
+    token_crypto.init()
+    users = FakeCollection()
+    monkeypatch.setattr(user, "users_col", users)
+    oauth2 = {"access_token": "a", "expires_at": int(time.time() + 3600)}
+    token = base64.b64encode(json.dumps([{}, oauth2]).encode()).decode()
+
+    await user.save_token(1, token)
+    ((query, update),) = users.updates
+    assert query == {"telegram_id": 1}
+    assert set(update["$set"]) == {"garmin_auth_enc", "garmin_expires_at"}
+    assert update["$unset"] == {"garmin_auth": ""}
+    assert token_crypto.decrypt_token(1, update["$set"]["garmin_auth_enc"]) == token
+
+
+@pytest.mark.asyncio
+async def test_a_full_buffer_drops_and_counts_instead_of_growing(buffer, monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_MAX_PENDING", 2)
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_BATCH", 10)
+    for i in range(5):
+        buffer.add({"i": i})
+    assert write_behind.stats() == {"test": {"pending": 2, "dropped": 3}}
+    await write_behind.flush_all()
+    assert buffer.collection.batches == [[{"i": 0}, {"i": 1}]]
+    buffer.add({"i": 5})  # room again once written
+    assert write_behind.stats()["test"]["pending"] == 1
+
+
+@pytest.mark.asyncio
+async def test_one_bad_document_costs_only_itself(buffer, monkeypatch):
+    calls = []
+
+    async def insert_many(docs, ordered=True):
+        calls.append(ordered)
+        raise BulkWriteError({"nInserted": len(docs) - 1, "writeErrors": [{"errmsg": "E11000"}]})
+
+    monkeypatch.setattr(buffer.collection, "insert_many", insert_many)
+    buffer.add({"i": 0})
+    buffer.add({"i": 1})
+    assert await buffer.flush() == 1
+    assert calls == [False]
+
+
+def test_an_event_logged_without_a_loop_waits_for_the_flush(buffer, monkeypatch):
+    monkeypatch.setattr(audit, "_buffer", buffer)
+    asyncio.run(audit.log_auth_event(1, "logout"))  # loop ends before any timer fires
+    buffer.add({"i": 1})                            # no running loop at all
+    assert asyncio.run(write_behind.flush_all()) == 2
+
+
+@pytest.mark.asyncio
+async def test_audit_never_raises_when_mongo_is_down(monkeypatch):
+    monkeypatch.setattr(write_behind, "_buffers", [])
+    down = write_behind.Buffer(FakeCollection(fail=True), "auth events")
+    monkeypatch.setattr(audit, "_buffer", down)
+    await audit.log_auth_event(1, "token_decrypt")
+    assert await write_behind.flush_all() == 0
@@ -0,0 +1,144 @@
+"""Proactive OAuth2 refresh, in the background, before tokens expire.
+
+Refresh used to happen only on the upload path: the async upload re-runs the
+exchange when the OAuth2 half has expired, and a 401 sends workout_service
+through refresh_token_async and a second upload. Either way the user whose
+workout happened to land after expiry waited out a full exchange round trip.
+Garmin's OAuth2 tokens live about an hour, so for a regular user that was most
+uploads.
+
+This module moves that round trip off the request path. Every
+TOKEN_REFRESH_INTERVAL_S the bot asks Mongo for users whose token expires
+within TOKEN_REFRESH_LEAD_S (user.users_due_for_refresh, an indexed query on
+the plaintext garmin_expires_at; no decryption needed to find them) and
+refreshes each one:
+
+  * only the active: users who logged in or sent a workout within
+    TOKEN_REFRESH_ACTIVE_S (user.mark_active). Anyone else would get a fresh
+    token every hour for nothing, against the exchange Garmin rate-limits;
+    when they come back, the upload path refreshes for them;
+  * spread out: each refresh starts after a random delay of up to
+    TOKEN_REFRESH_JITTER_S, so a cohort that logged in together (a deploy, a
+    channel post) doesn't hit Garmin's exchange in one burst;
+  * capped: at most TOKEN_REFRESH_CONCURRENCY exchanges in flight, so the
+    sweep never competes seriously with interactive uploads for Garmin's
+    patience or for the HTTP session;
+  * persisted through user.replace_token, a conditional update on the expiry
+    the sweep read: if the token changed meanwhile (a new login, a reactive
+    refresh), the result is dropped rather than written over a newer token.
+
+Keep LEAD > INTERVAL + JITTER, or a token can expire between two sweeps. A
+failed refresh is audited and the user is left alone for FAILURE_BACKOFF_S
+(user.defer_refresh, in Mongo, so every replica honours it and the query skips
+them before its SWEEP_LIMIT); the reactive path still covers them, so a
+revoked OAuth1 token costs one log line an hour, not one a minute.
+
+While the Garmin breaker (garmin_breaker) is not closed, due refreshes are
+skipped rather than failed: hammering a degraded Garmin with background
+exchanges would only keep it down, and would park every due user in the
+failure backoff. They are due again next sweep.
+
+Every replica runs its own sweep. Two replicas refreshing the same user both
+get valid tokens and only the first write lands; the jitter makes it rare.
+TOKEN_REFRESH_DISABLED=1 turns the sweep off.
+"""
+
+import asyncio
+import os
+import random
+import time
+
+import garmin_breaker
+from audit import log_auth_event
+from garmin import refresh_token_async, token_expires_at
+from user import defer_refresh, get_garmin_token, get_user, replace_token, users_due_for_refresh
+
+DISABLED = os.getenv("TOKEN_REFRESH_DISABLED", "") == "1"
+TOKEN_REFRESH_LEAD_S = int(os.getenv("TOKEN_REFRESH_LEAD_S", "900"))
+TOKEN_REFRESH_INTERVAL_S = int(os.getenv("TOKEN_REFRESH_INTERVAL_S", "60"))
+TOKEN_REFRESH_JITTER_S = int(os.getenv("TOKEN_REFRESH_JITTER_S", "300"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "4"))
+TOKEN_REFRESH_ACTIVE_S = int(os.getenv("TOKEN_REFRESH_ACTIVE_S", str(14 * 86400)))
+SWEEP_LIMIT = 500           # users per sweep; the rest are due next sweep
+FAILURE_BACKOFF_S = 3600
+
+_task: asyncio.Task | None = None
+
+
+async def _refresh_one(uid: int, expected_expiry: int | None, sem: asyncio.Semaphore) -> None:
+    await asyncio.sleep(random.uniform(0, TOKEN_REFRESH_JITTER_S))
+    async with sem:
+        if await garmin_breaker.state() != garmin_breaker.CLOSED:
+            return  # Garmin is failing; due again next sweep
+        user_data = await get_user(uid)
+        if user_data is None or user_data.get("garmin_expires_at") != expected_expiry:
+            return  # logged out, or the token changed since the sweep read it
+        token = await get_garmin_token(user_data)
+        if token is None:
+            return
+        expires_at = token_expires_at(token)
+        if expires_at is not None and expires_at >= time.time() + TOKEN_REFRESH_LEAD_S:
+            # Saved before garmin_expires_at existed: backfill it, nothing to refresh.
+            await replace_token(uid, token, expected_expiry)
+            return
+        try:
+            new_token = await refresh_token_async(token)
+        except Exception as e:
+            await defer_refresh(uid, int(time.time()) + FAILURE_BACKOFF_S)
+            await log_auth_event(uid, "token_refresh", outcome="fail", detail=type(e).__name__)
+            return
+        # The exchange took a while: a login or a reactive refresh in that
+        # window holds the newer token, and the conditional write leaves it be.
+        if await replace_token(uid, new_token, expected_expiry):
+            await log_auth_event(uid, "token_refresh", detail="proactive")
+
+
+async def sweep() -> int:
+    """Refresh every token expiring within the lead time. Returns how many were due."""
+    now = int(time.time())
+    sem = asyncio.Semaphore(TOKEN_REFRESH_CONCURRENCY)
+    due = [
+        (doc["telegram_id"], doc.get("garmin_expires_at"))
+        async for doc in users_due_for_refresh(
+            now + TOKEN_REFRESH_LEAD_S, now - TOKEN_REFRESH_ACTIVE_S, SWEEP_LIMIT
+        )
+    ]
+    results = await asyncio.gather(
+        *(_refresh_one(uid, expiry, sem) for uid, expiry in due), return_exceptions=True
+    )
+    for (uid, _), result in zip(due, results, strict=True):
+        if isinstance(result, Exception):
+            print(f"⚠️  token refresh for user={uid} failed: {result}", flush=True)
+    return len(due)
+
+
+async def _run() -> None:
+    while True:
+        try:
+            await sweep()
+        except Exception as e:
+            print(f"⚠️  token refresh sweep failed: {e}", flush=True)
+        await asyncio.sleep(TOKEN_REFRESH_INTERVAL_S)
+
+
+def start() -> bool:
+    """Start the background sweep on the running loop. False when disabled."""
+    global _task
+    if DISABLED or _task is not None:
+        return False
+    _task = asyncio.create_task(_run(), name="token-refresher")
+    return True
+
+
+async def stop() -> bool:
+    """Cancel the sweep (and any refresh it is waiting on). False if not running."""
+    global _task
+    if _task is None:
+        return False
+    task, _task = _task, None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return True
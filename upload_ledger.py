@@ -0,0 +1,98 @@
+"""Short-lived record of which workout payloads each user just uploaded.
+
+Two ways to create the same workout twice in someone's Garmin library: the
+POST times out after Garmin has already created it, and the retry creates it
+again; or the reply said "Failed to import" (or never arrived) and the user
+resends the plan. Both re-send a payload we have just uploaded. garmin.py
+consults this ledger before every upload and records every success, so the
+same converted payload for the same user within UPLOAD_LEDGER_TTL_S returns
+the workout that already exists instead of a second POST.
+
+A reused workout must not be scheduled twice either, so calendar placements
+(garmin.schedule_workout_async) are recorded the same way, keyed by workout
+and date.
+
+The upload key is the user plus a hash of the converted payload (garmin_convert's
+output, which the LLM parse and the prefs both feed into), so a plan that
+parses identically is a duplicate and one that differs by a single step is
+not. The TTL is short on purpose: past it, sending the same plan again is a
+deliberate second copy (next week's session), not a retry.
+
+Backed by Redis when it is configured, like workout_queue.py, so a resend to
+another replica or after a restart is still caught; an in-process TTL cache
+otherwise. Best-effort throughout: a ledger that cannot be read or written
+costs a possible duplicate, never an upload.
+"""
+
+import hashlib
+import json
+import os
+
+from cachetools import TTLCache
+
+import redis_conn
+
+UPLOAD_LEDGER_TTL_S = int(os.getenv("UPLOAD_LEDGER_TTL_S", "900"))
+
+_fallback: TTLCache = TTLCache(maxsize=4096, ttl=UPLOAD_LEDGER_TTL_S)
+
+
+def _key(uid: int, payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return f"upload:{uid}:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+
+async def lookup(uid: int, payload: dict) -> str | None:
+    """The workoutId this user got for this exact payload recently, or None."""
+    key = _key(uid, payload)
+    r = redis_conn.client
+    if r is None:
+        return _fallback.get(key)
+    try:
+        found = await r.get(key)
+    except Exception as e:
+        print(f"⚠️  upload ledger read failed (user={uid}): {e}", flush=True)
+        return None
+    return found.decode() if isinstance(found, bytes) else found
+
+
+async def record(uid: int, payload: dict, workout_id) -> None:
+    """Remember a successful upload for UPLOAD_LEDGER_TTL_S."""
+    key = _key(uid, payload)
+    r = redis_conn.client
+    if r is None:
+        _fallback[key] = str(workout_id)
+        return
+    try:
+        await r.set(key, str(workout_id), ex=UPLOAD_LEDGER_TTL_S)
+    except Exception as e:
+        print(f"⚠️  upload ledger write failed (user={uid}): {e}", flush=True)
+
+
+def _schedule_key(uid: int, workout_id, on) -> str:
+    return f"upload:{uid}:scheduled:{workout_id}:{on.isoformat()}"
+
+
+async def was_scheduled(uid: int, workout_id, on) -> bool:
+    """Whether this workout was recently put on the calendar for `on`."""
+    key = _schedule_key(uid, workout_id, on)
+    r = redis_conn.client
+    if r is None:
+        return key in _fallback
+    try:
+        return bool(await r.exists(key))
+    except Exception as e:
+        print(f"⚠️  upload ledger read failed (user={uid}): {e}", flush=True)
+        return False
+
+
+async def record_scheduled(uid: int, workout_id, on) -> None:
+    key = _schedule_key(uid, workout_id, on)
+    r = redis_conn.client
+    if r is None:
+        _fallback[key] = "1"
+        return
+    try:
+        await r.set(key, "1", ex=UPLOAD_LEDGER_TTL_S)
+    except Exception as e:
+        print(f"⚠️  upload ledger write failed (user={uid}): {e}", flush=True)
@@ -0,0 +1,201 @@
+"""Durable outbox for uploads that failed while Garmin was unwell.
+
+An upload that fails on a 5xx, a 429 or a dropped connection used to end with
+"Failed to import, please try again": the parsed workout, already paid for,
+was logged and thrown away, and the retry paid for the LLM again. Those
+workouts now go into the upload_outbox collection instead — the converted
+Garmin payload, never a token — and a background worker uploads them once
+Garmin recovers. The user is told it is queued, and messaged through the
+notify hook when it lands (or, after OUTBOX_MAX_AGE_S, that it never did).
+
+The worker, like token_refresher, runs on every replica:
+
+  * every OUTBOX_POLL_S it claims due entries with find_one_and_update, which
+    pushes next_attempt_at forward by OUTBOX_LEASE_S, so two replicas never
+    work the same entry at once and a replica that dies mid-upload only
+    delays it;
+  * it asks garmin_breaker first (garmin_breaker.allow), so a sweep while
+    Garmin is down costs nothing, and a half-open breaker gets a probe that
+    costs no LLM call — a single entry, the rest waiting for the verdict;
+  * a transient failure (garmin_breaker.counts) reschedules the entry with
+    exponential backoff from OUTBOX_BASE_DELAY_S up to OUTBOX_MAX_DELAY_S,
+    with jitter so a recovered Garmin isn't met by every entry at once;
+    anything else — a 4xx, a dead session, a logged-out user — drops it.
+
+Uploads go through upload_garmin_payload_async, so the upload ledger makes a
+retry whose first attempt did land return that workout rather than a copy.
+"""
+
+import asyncio
+import os
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from pymongo import ReturnDocument
+
+import garmin_breaker
+from db import db
+from garmin import schedule_workout_async, upload_garmin_payload_async
+from user import get_garmin_token, get_user, save_token
+
+outbox_col = db["upload_outbox"]
+
+DISABLED = os.getenv("OUTBOX_DISABLED", "") == "1"
+OUTBOX_POLL_S = int(os.getenv("OUTBOX_POLL_S", "30"))
+OUTBOX_BASE_DELAY_S = int(os.getenv("OUTBOX_BASE_DELAY_S", "30"))
+OUTBOX_MAX_DELAY_S = int(os.getenv("OUTBOX_MAX_DELAY_S", "1800"))
+OUTBOX_MAX_AGE_S = int(os.getenv("OUTBOX_MAX_AGE_S", "86400"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+OUTBOX_LEASE_S = 120   # how long a claimed entry is hidden from other sweeps
+SWEEP_LIMIT = 100      # entries claimed per sweep; the rest wait for the next
+
+# (user_id, workout name, workout_id) once an entry lands; workout_id is None
+# when the outbox gave up on it. The bot turns this into a chat message.
+Delivered = Callable[[int, str, str | None], Awaitable[None]]
+
+_task: asyncio.Task | None = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def defer(user_id: int, name: str, payload: dict, schedule_on: date | None = None) -> bool:
+    """Queue a failed upload for the worker. False if it couldn't be stored, in
+    which case the caller reports the failure as before."""
+    now = _now()
+    entry = {
+        "user_id": user_id,
+        "name": name,
+        "payload": payload,
+        "schedule_on": schedule_on.isoformat() if schedule_on else None,
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now + timedelta(seconds=_backoff(0)),
+    }
+    try:
+        await outbox_col.insert_one(entry)
+    except Exception as e:
+        print(f"⚠️  outbox write failed (user={user_id}): {e}", flush=True)
+        return False
+    return True
+
+
+async def clear(user_id: int) -> None:
+    """Forget a user's pending uploads (they logged out)."""
+    await outbox_col.delete_many({"user_id": user_id})
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(OUTBOX_MAX_DELAY_S, OUTBOX_BASE_DELAY_S * 2**attempts)
+    return random.uniform(delay / 2, delay)
+
+
+async def _claim() -> dict | None:
+    now = _now()
+    return await outbox_col.find_one_and_update(
+        {"next_attempt_at": {"$lte": now}},
+        {"$set": {"next_attempt_at": now + timedelta(seconds=OUTBOX_LEASE_S)},
+         "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _deliver(entry: dict, notify: Delivered, sem: asyncio.Semaphore) -> None:
+    uid, name = entry["user_id"], entry["name"]
+    async with sem:
+        user_data = await get_user(uid)
+        token = await get_garmin_token(user_data) if user_data else None
+        if token is None:
+            await outbox_col.delete_one({"_id": entry["_id"]})  # logged out meanwhile
+            return
+        try:
+            workout_id, refreshed = await upload_garmin_payload_async(token, entry["payload"], uid)
+        except Exception as e:
+            age = (_now() - entry["created_at"].replace(tzinfo=timezone.utc)).total_seconds()
+            if garmin_breaker.counts(e) and age < OUTBOX_MAX_AGE_S:
+                retry_at = _now() + timedelta(seconds=_backoff(entry["attempts"]))
+                await outbox_col.update_one(
+                    {"_id": entry["_id"]}, {"$set": {"next_attempt_at": retry_at}}
+                )
+                return
+            print(f"[outbox] user={uid} giving up after {entry['attempts']} attempt(s): "
+                  f"{type(e).__name__}: {e}", flush=True)
+            await outbox_col.delete_one({"_id": entry["_id"]})
+            await notify(uid, name, None)
+            return
+        if refreshed:
+            await save_token(uid, refreshed)
+        if entry.get("schedule_on"):
+            try:
+                on = date.fromisoformat(entry["schedule_on"])
+                await schedule_workout_async(refreshed or token, workout_id, on, uid)
+            except Exception as e:
+                print(f"[outbox] user={uid} workout={workout_id} schedule failed: {e}", flush=True)
+        await outbox_col.delete_one({"_id": entry["_id"]})
+        print(f"[outbox] user={uid} delivered after {entry['attempts']} attempt(s)", flush=True)
+        await notify(uid, name, workout_id)
+
+
+async def sweep(notify: Delivered) -> int:
+    """Retry every due entry. Returns how many were claimed."""
+    if not await garmin_breaker.allow():
+        return 0
+    # Read after allow(): still half-open means we hold the one probe slot,
+    # and a probe is one upload — not a batch that fails together.
+    current = await garmin_breaker.state()
+    if current == garmin_breaker.OPEN:
+        return 0
+    limit = SWEEP_LIMIT if current == garmin_breaker.CLOSED else 1
+    claimed = []
+    while len(claimed) < limit and (entry := await _claim()) is not None:
+        claimed.append(entry)
+    sem = asyncio.Semaphore(OUTBOX_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_deliver(entry, notify, sem) for entry in claimed), return_exceptions=True
+    )
+    for entry, result in zip(claimed, results, strict=True):
+        if isinstance(result, Exception):
+            print(f"⚠️  outbox delivery for user={entry['user_id']} failed: {result}", flush=True)
+    return len(claimed)
+
+
+async def _run(notify: Delivered) -> None:
+    while True:
+        # Sleep first: at startup the bot isn't connected yet to send the news.
+        await asyncio.sleep(OUTBOX_POLL_S)
+        try:
+            await sweep(notify)
+        except Exception as e:
+            print(f"⚠️  outbox sweep failed: {e}", flush=True)
+
+
+def start(notify: Delivered) -> bool:
+    """Start the worker on the running loop. False when disabled."""
+    global _task
+    if DISABLED or _task is not None:
+        return False
+    _task = asyncio.create_task(_run(notify), name="upload-outbox")
+    return True
+
+
+async def stop() -> bool:
+    """Cancel the worker. False if it wasn't running. An entry it was working
+    on is retried by the next sweep anywhere once its lease runs out."""
+    global _task
+    if _task is None:
+        return False
+    task, _task = _task, None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return True
+
+
+async def create_indexes() -> None:
+    await outbox_col.create_index("next_attempt_at")
+    await outbox_col.create_index("user_id")
@@ -1,11 +1,17 @@
+import time
+
 from pymongo.errors import DuplicateKeyError
 
 import token_crypto
 from audit import log_auth_event
 from db import db
+from garmin import forget_client, token_expires_at
 
 users_col = db["users"]
 
+# last_active_at is rewritten at most this often per user (see mark_active).
+ACTIVE_STAMP_S = 3600
+
 async def get_user(uid: int):
     return await users_col.find_one({"telegram_id": uid})
 
@@ -16,18 +22,82 @@ async def save_user(uid: int, data: dict):
     it is stored as "garmin_auth_enc" instead. replace_one drops any field the
     new document doesn't carry, so the plaintext field disappears from the
     stored doc in the same write — no separate $unset needed.
+
+    The token's OAuth2 expiry is stored beside it in plaintext as
+    "garmin_expires_at" (a timestamp, not a credential), so token_refresher can
+    find the tokens about to expire with one indexed query instead of
+    decrypting every user's. Saving a token (a login) also counts as activity
+    for that sweep: "last_active_at".
     """
     data = dict(data)
     data["telegram_id"] = uid
     token = data.pop("garmin_auth", None)
+    data.pop("garmin_expires_at", None)
+    if token is not None:
+        data["garmin_expires_at"] = token_expires_at(token)
+        data["last_active_at"] = int(time.time())
     if token is not None and token_crypto.enabled():
         data["garmin_auth_enc"] = token_crypto.encrypt_token(uid, token)
     elif token is not None:
         data["garmin_auth"] = token
     await users_col.replace_one({"telegram_id": uid}, data, upsert=True)
 
+def _token_update(uid: int, token: str) -> dict:
+    fields: dict = {"garmin_expires_at": token_expires_at(token)}
+    update: dict = {"$set": fields}
+    if token_crypto.enabled():
+        fields["garmin_auth_enc"] = token_crypto.encrypt_token(uid, token)
+        update["$unset"] = {"garmin_auth": ""}
+    else:
+        fields["garmin_auth"] = token
+    return update
+
+async def save_token(uid: int, token: str) -> None:
+    """Persist a refreshed Garmin token, and nothing else.
+
+    A $set of the token fields instead of save_user's replace_one: a refresh
+    has no business rewriting the rest of the document (prefs saved from the
+    Mini App in the meantime, the login state), and the write is smaller. No
+    upsert: a user who logged out while the refresh ran stays logged out.
+    """
+    await users_col.update_one({"telegram_id": uid}, _token_update(uid, token))
+
+async def replace_token(uid: int, token: str, expected_expiry: int | None) -> bool:
+    """save_token, but only over the token that expires at `expected_expiry`
+    (None: a legacy doc without the field). False if it changed meanwhile — a
+    login or an upload's refresh wrote a newer token, which must stand.
+
+    One conditional update_one, so there is no window between the check and
+    the write for that newer token to land in.
+    """
+    result = await users_col.update_one(
+        {"telegram_id": uid, "garmin_expires_at": expected_expiry}, _token_update(uid, token)
+    )
+    return result.matched_count == 1
+
+async def defer_refresh(uid: int, until: int) -> None:
+    """Keep the user out of users_due_for_refresh until `until` (epoch seconds)."""
+    await users_col.update_one(
+        {"telegram_id": uid}, {"$set": {"garmin_refresh_retry_at": until}}
+    )
+
+async def mark_active(uid: int, user_data: dict) -> None:
+    """Stamp last_active_at, which users_due_for_refresh filters on. Written
+    at most once per ACTIVE_STAMP_S per user, and never raises: a missed stamp
+    only means the next upload may refresh on the request path."""
+    now = int(time.time())
+    if user_data.get("last_active_at", 0) > now - ACTIVE_STAMP_S:
+        return
+    try:
+        await users_col.update_one({"telegram_id": uid}, {"$set": {"last_active_at": now}})
+    except Exception as e:
+        print(f"⚠️  last_active_at write failed (user={uid}): {e}", flush=True)
+        return
+    user_data["last_active_at"] = now
+
 async def delete_user(uid: int):
     await users_col.delete_one({"telegram_id": uid})
+    forget_client(uid)  # the pooled upload client still holds their token
 
 
 async def set_prefs(uid: int, prefs: dict) -> None:
@@ -63,6 +133,26 @@ async def get_garmin_token(user_data: dict) -> str | None:
     return user_data.get("garmin_auth")
 
 
+def users_due_for_refresh(before: int, active_since: int, limit: int):
+    """Logged-in users whose OAuth2 expires before `before`, soonest first.
+
+    Only users active since `active_since` (last_active_at): refreshing
+    everyone who ever logged in would grow the background exchanges with the
+    user base rather than with its use. Users in a refresh backoff
+    (defer_refresh) are left out here, not after the limit, so a batch of
+    tokens that keep failing can't crowd out the ones that would refresh.
+
+    Users saved before garmin_expires_at existed have no such field; they are
+    returned too (sorted first, as null) so the refresher can backfill it.
+    """
+    return users_col.find({
+        "$or": [{"garmin_auth_enc": {"$exists": True}}, {"garmin_auth": {"$exists": True}}],
+        "garmin_expires_at": {"$not": {"$gte": before}},
+        "last_active_at": {"$gte": active_since},
+        "garmin_refresh_retry_at": {"$not": {"$gt": int(time.time())}},
+    }).sort("garmin_expires_at", 1).limit(limit)
+
+
 async def _dedupe_users() -> None:
     """Collapse duplicate documents per telegram_id before the unique index lands.
 
@@ -92,3 +182,7 @@ async def create_indexes() -> None:
     except DuplicateKeyError:
         await _dedupe_users()
         await users_col.create_index("telegram_id", unique=True)
+    # For users_due_for_refresh: active users first, so the scan stays the
+    # size of the active set. Not sparse: it also matches docs missing
+    # garmin_expires_at.
+    await users_col.create_index([("last_active_at", 1), ("garmin_expires_at", 1)])
@@ -0,0 +1,234 @@
+"""Per-user single-flight lease shared by every process that runs workouts.
+
+One workout in flight per user used to mean bot._active_notice, a dict in the
+bot process. That held only while exactly one process ran workouts: during a
+rolling deploy the old and new bot overlap, and with stream dispatch any
+worker may pick a user up — either way two workouts for one user could run at
+once and both debit the quota. The lease lives in Redis instead:
+
+  * acquire takes `workout:lock:{uid}` with SET NX PX semantics, its value a
+    fencing token from an ever-growing counter, so every acquisition is
+    distinguishable from the ones before it;
+  * renewing, releasing and recording the live notice are compare-and-set on
+    that token (Lua), so a holder whose lease lapsed can't extend, free or
+    write over a lease someone else has since taken;
+  * a heartbeat renews the lease every WORK_LOCK_TTL_S / 3 while the holder
+    works. A holder that dies stops renewing, and its user is free again
+    within WORK_LOCK_TTL_S. One that is alive but wedged stops renewing after
+    WORK_LOCK_MAX_HOLD_S, and the same applies;
+  * a holder that finds its lease lost (Lease.lost) finishes the workout in
+    hand and drains nothing more — the new holder owns the queue.
+
+The lease also carries the live "Uploading..." notice (chat and message id),
+so a message that arrives mid-flight on any process can edit it.
+
+Falls back to in-process state when Redis is absent, which is only correct
+with a single process — local dev, and the reason stream dispatch refuses to
+start without Redis.
+"""
+
+import asyncio
+import itertools
+import os
+import time
+
+import redis_conn
+
+WORK_LOCK_TTL_S = int(os.getenv("WORK_LOCK_TTL_S", "30"))
+WORK_LOCK_MAX_HOLD_S = int(os.getenv("WORK_LOCK_MAX_HOLD_S", "900"))
+
+_FENCE_KEY = "workout:lock:fence"
+
+# KEYS: lock, fence counter. ARGV: ttl ms. The new fence, or 0 if held.
+_ACQUIRE_LUA = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return 0
+end
+local fence = redis.call('incr', KEYS[2])
+redis.call('set', KEYS[1], fence, 'PX', ARGV[1])
+return fence
+"""
+
+# KEYS: lock, notice. ARGV: fence, ttl ms. 1 if renewed, 0 if not ours.
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('pexpire', KEYS[1], ARGV[2])
+redis.call('pexpire', KEYS[2], ARGV[2])
+return 1
+"""
+
+# KEYS: lock, notice. ARGV: fence.
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('del', KEYS[1], KEYS[2])
+"""
+
+# KEYS: lock, notice. ARGV: fence, "chat_id:message_id" or "" to clear.
+_NOTICE_LUA = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == '' then
+    redis.call('del', KEYS[2])
+else
+    redis.call('set', KEYS[2], ARGV[2], 'PX', redis.call('pttl', KEYS[1]))
+end
+return 1
+"""
+
+
+class Lease:
+    """A held user lock. `lost` turns True once it is known to be gone."""
+
+    def __init__(self, uid: int, fence: int):
+        self.uid = uid
+        self.fence = fence
+        self.lost = False
+        self.acquired_at = time.monotonic()
+        self._heartbeat: asyncio.Task | None = None
+
+
+class _Held:
+    def __init__(self, fence: int):
+        self.fence = fence
+        self.deadline = time.monotonic() + WORK_LOCK_TTL_S
+        self.notice: tuple[int, int] | None = None
+
+
+_fallback: dict[int, _Held] = {}
+_fences = itertools.count(1)
+
+
+def _key(uid: int) -> str:
+    return f"workout:lock:{uid}"
+
+
+def _ttl_ms() -> int:
+    return int(WORK_LOCK_TTL_S * 1000)
+
+
+def _notice_key(uid: int) -> str:
+    return f"workout:lock:{uid}:notice"
+
+
+def _live(uid: int) -> _Held | None:
+    held = _fallback.get(uid)
+    if held is not None and held.deadline <= time.monotonic():
+        del _fallback[uid]
+        return None
+    return held
+
+
+async def acquire(uid: int) -> Lease | None:
+    """Take the user's lease and start renewing it. None if someone holds it."""
+    r = redis_conn.client
+    if r is not None:
+        fence = await r.eval(_ACQUIRE_LUA, 2, _key(uid), _FENCE_KEY, _ttl_ms())
+        if not fence:
+            return None
+        lease = Lease(uid, int(fence))
+    else:
+        if _live(uid) is not None:
+            return None
+        lease = Lease(uid, next(_fences))
+        _fallback[uid] = _Held(lease.fence)
+    lease._heartbeat = asyncio.create_task(_beat(lease), name=f"user-lock-{uid}")
+    return lease
+
+
+async def renew(lease: Lease) -> bool:
+    """Push the lease's expiry out by WORK_LOCK_TTL_S. False if it's no longer ours."""
+    r = redis_conn.client
+    if r is not None:
+        return bool(await r.eval(
+            _RENEW_LUA, 2, _key(lease.uid), _notice_key(lease.uid),
+            lease.fence, _ttl_ms(),
+        ))
+    held = _live(lease.uid)
+    if held is None or held.fence != lease.fence:
+        return False
+    held.deadline = time.monotonic() + WORK_LOCK_TTL_S
+    return True
+
+
+async def _beat(lease: Lease) -> None:
+    while True:
+        await asyncio.sleep(WORK_LOCK_TTL_S / 3)
+        if time.monotonic() - lease.acquired_at > WORK_LOCK_MAX_HOLD_S:
+            print(f"⚠️  user={lease.uid} held the workout lock for over "
+                  f"{WORK_LOCK_MAX_HOLD_S}s — letting it lapse", flush=True)
+            lease.lost = True
+            return
+        try:
+            renewed = await renew(lease)
+        except Exception as e:
+            # The TTL leaves room for two more tries before the lease lapses.
+            print(f"⚠️  workout lock renewal failed (user={lease.uid}): {e}", flush=True)
+            continue
+        if not renewed:
+            print(f"⚠️  user={lease.uid} lost the workout lock (fence {lease.fence})", flush=True)
+            lease.lost = True
+            return
+
+
+async def release(lease: Lease) -> None:
+    """Stop renewing and free the lease, if it is still ours. Never raises: the
+    TTL frees it anyway."""
+    if lease._heartbeat is not None:
+        lease._heartbeat.cancel()
+        lease._heartbeat = None
+    r = redis_conn.client
+    try:
+        if r is not None:
+            await r.eval(_RELEASE_LUA, 2, _key(lease.uid), _notice_key(lease.uid), lease.fence)
+            return
+    except Exception as e:
+        print(f"⚠️  workout lock release failed (user={lease.uid}): {e}", flush=True)
+        return
+    held = _live(lease.uid)
+    if held is not None and held.fence == lease.fence:
+        del _fallback[lease.uid]
+
+
+async def held(uid: int) -> bool:
+    r = redis_conn.client
+    if r is not None:
+        return bool(await r.exists(_key(uid)))
+    return _live(uid) is not None
+
+
+async def set_notice(lease: Lease, notice: tuple[int, int] | None) -> None:
+    """Record the holder's live notice as (chat_id, message_id), or clear it.
+    Best effort: without it, a plan sent mid-flight just can't update it."""
+    r = redis_conn.client
+    if r is not None:
+        value = f"{notice[0]}:{notice[1]}" if notice else ""
+        try:
+            await r.eval(_NOTICE_LUA, 2, _key(lease.uid), _notice_key(lease.uid), lease.fence, value)
+        except Exception as e:
+            print(f"⚠️  workout notice write failed (user={lease.uid}): {e}", flush=True)
+        return
+    held = _live(lease.uid)
+    if held is not None and held.fence == lease.fence:
+        held.notice = notice
+
+
+async def notice(uid: int) -> tuple[int, int] | None:
+    """The live notice of whoever holds the user's lease, if one is showing."""
+    r = redis_conn.client
+    if r is not None:
+        try:
+            value = await r.get(_notice_key(uid))
+        except Exception as e:
+            print(f"⚠️  workout notice read failed (user={uid}): {e}", flush=True)
+            return None
+        if not value:
+            return None
+        chat_id, message_id = value.split(":")
+        return int(chat_id), int(message_id)
+    held = _live(uid)
+    return held.notice if held is not None else None
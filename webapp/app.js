@@ -4,7 +4,9 @@
 // key is always sent.
 "use strict";
 
-const KEYS = ["add_warmup", "add_cooldown", "wu_cd_lap_press", "wu_cd_skip_pace"];
+const KEYS = [
+  "add_warmup", "add_cooldown", "wu_cd_lap_press", "wu_cd_skip_pace", "schedule_dates",
+];
 
 const tg = window.Telegram && window.Telegram.WebApp;
 const statusEl = document.getElementById("status");
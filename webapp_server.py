@@ -4,13 +4,15 @@ Runs inside the bot process on Pyrogram's event loop — same reasoning that
 keeps the workout flow in one process: Mongo helpers, token crypto, and (in
 the future login flow) the Garmin client are all here, and a Mini App backend
 in a separate service would have to re-implement or RPC to every one of them.
+With TELEGRAM_UPDATES=webhook it is also where Telegram delivers updates
+(webhook.py).
 
 Auth model: every /api request carries `Authorization: tma <initData>` where
 initData is the raw signed launch payload from the Telegram webview. A valid
 HMAC (tg_init_data.py) authenticates the request exactly as strongly as a
 chat message from that telegram user id; there are no sessions or cookies to
 manage, and nothing here is callable anonymously except the static page and
-the health check.
+the health checks.
 
 The page itself must be reachable over public HTTPS (Telegram refuses plain
 HTTP webapps) — TLS termination is the deploy's job (Railway domain, tunnel,
@@ -24,7 +26,10 @@ from aiohttp import web
 
 import prefs
 import user
+import webhook
+import write_behind
 from tg_init_data import InitDataError, validate_init_data
+from workout_ai import llm_stats
 
 _WEBAPP_DIR = Path(__file__).resolve().parent / "webapp"
 
@@ -99,6 +104,18 @@ async def handle_healthz(request: web.Request) -> web.Response:
     return web.Response(text="ok", headers=_COMMON_HEADERS)
 
 
+async def handle_healthz_llm(request: web.Request) -> web.Response:
+    """The adaptive LLM concurrency limit and queue depth, for monitoring.
+
+    Public like /healthz: counters only, nothing user-identifying."""
+    return web.json_response(llm_stats(), headers=_COMMON_HEADERS)
+
+
+async def handle_healthz_writes(request: web.Request) -> web.Response:
+    """Write-behind buffer depth and drops (audit, workout logs), for monitoring."""
+    return web.json_response(write_behind.stats(), headers=_COMMON_HEADERS)
+
+
 async def handle_get_prefs(request: web.Request) -> web.Response:
     uid = _authenticated_user_id(request)
     doc = await user.get_user(uid)
@@ -129,9 +146,11 @@ async def handle_put_prefs(request: web.Request) -> web.Response:
     return web.json_response(body, headers=_COMMON_HEADERS)
 
 
-def create_app(bot_token: str | None = None) -> web.Application:
+def create_app(bot_token: str | None = None, webhook_secret: str | None = None) -> web.Application:
     """Build the app. Reads the static files once — a missing page is a
-    packaging error and must fail the deploy here, not 500 at first open."""
+    packaging error and must fail the deploy here, not 500 at first open.
+
+    With `webhook_secret`, it also takes Telegram updates (webhook.py)."""
     app = web.Application(client_max_size=_MAX_BODY)
     app[BOT_TOKEN_KEY] = bot_token if bot_token is not None else os.getenv("TELEGRAM_BOT_TOKEN", "")
     app[PAGE_HTML_KEY] = (_WEBAPP_DIR / "index.html").read_text(encoding="utf-8")
@@ -141,17 +160,22 @@ def create_app(bot_token: str | None = None) -> web.Application:
             web.get("/", handle_page),
             web.get("/app.js", handle_app_js),
             web.get("/healthz", handle_healthz),
+            web.get("/healthz/llm", handle_healthz_llm),
+            web.get("/healthz/writes", handle_healthz_writes),
             web.get("/api/prefs", handle_get_prefs),
             web.put("/api/prefs", handle_put_prefs),
         ]
     )
+    if webhook_secret:
+        app[webhook.SECRET_KEY] = webhook_secret
+        app.add_routes(webhook.routes())
     return app
 
 
-async def start_webapp() -> web.AppRunner:
+async def start_webapp(webhook_secret: str | None = None) -> web.AppRunner:
     """Start serving on WEBAPP_PORT (default 8080). Caller owns cleanup()."""
     port = int(os.getenv("WEBAPP_PORT", "8080"))
-    runner = web.AppRunner(create_app())
+    runner = web.AppRunner(create_app(webhook_secret=webhook_secret))
     await runner.setup()
     await web.TCPSite(runner, host="0.0.0.0", port=port).start()
     print(f"✓ Webapp server listening on :{port}", flush=True)
@@ -0,0 +1,174 @@
+"""Webhook ingestion: Bot API updates over HTTPS instead of MTProto long-polling.
+
+With TELEGRAM_UPDATES=webhook, Telegram POSTs each update to
+WEBHOOK_PATH on the webapp server (webapp_server.create_app adds the route),
+and the Pyrogram client runs with no_updates — it only sends. The handler
+answers 200 as soon as the update is queued, so a slow workout never holds
+Telegram's connection open and a burst never turns into retransmissions;
+WEBHOOK_WORKERS tasks work the queue concurrently through bot.handle_update,
+which routes to the same handlers long-polling uses.
+
+The queue is bounded (WEBHOOK_QUEUE_MAX). When it is full the update is
+refused with 503 and Telegram delivers it again later — backpressure instead
+of unbounded memory. An update_id already accepted is acknowledged and
+skipped, which covers Telegram's retries of an update whose 200 got lost.
+
+Only that dedupe window is per process. What the handlers keep between
+updates — the login handshake, the per-user lease, the workout queue — is in
+Redis, so several ingress processes can sit behind one load balancer.
+
+Every request must carry WEBHOOK_SECRET in X-Telegram-Bot-Api-Secret-Token
+(set with setWebhook); anything else is 401, before the body is read.
+"""
+
+import asyncio
+import hmac
+import json
+import os
+from typing import Awaitable, Callable
+
+from aiohttp import web
+from cachetools import TTLCache
+
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+# How long stop() lets queued updates finish before cancelling them.
+WEBHOOK_DRAIN_S = int(os.getenv("WEBHOOK_DRAIN_S", "20"))
+
+# A Telegram update is a message of up to 4096 characters plus metadata. The
+# webapp's own client_max_size is far smaller, so the body is read here.
+_MAX_UPDATE_BYTES = 64 * 1024
+
+SECRET_KEY = web.AppKey("webhook_secret", str)
+
+# Handles one update: bot.handle_update.
+Handler = Callable[[dict], Awaitable[None]]
+
+_queue: asyncio.Queue | None = None
+_tasks: list[asyncio.Task] = []
+_seen: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+
+
+class Message:
+    """The slice of a pyrogram Message the bot's handlers use, built from a
+    Bot API update and replying through the (send-only) Pyrogram client."""
+
+    def __init__(self, raw: dict, client):
+        self._client = client
+        self.id = raw["message_id"]
+        self.text = raw["text"]
+        self.chat = _Obj(id=raw["chat"]["id"])
+        self.from_user = _Obj(id=raw["from"]["id"])
+
+    @property
+    def command(self) -> str | None:
+        """The command a message starts with ("start" for "/start@SomeBot ..."),
+        or None for plain text."""
+        if not self.text.startswith("/"):
+            return None
+        words = self.text[1:].split(maxsplit=1)
+        return words[0].split("@")[0].lower() if words else None
+
+    async def reply(self, text: str, **kwargs):
+        return await self._client.send_message(self.chat.id, text, **kwargs)
+
+    async def delete(self):
+        return await self._client.delete_messages(self.chat.id, self.id)
+
+
+class _Obj:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def message_from(update: dict, client) -> Message | None:
+    """The update's private text message, or None for anything the bot ignores
+    (as filters.text & filters.private does when polling)."""
+    raw = update.get("message")
+    if not raw or "text" not in raw or "from" not in raw:
+        return None
+    if raw.get("chat", {}).get("type") != "private":
+        return None
+    return Message(raw, client)
+
+
+async def _read_body(request: web.Request) -> bytes:
+    body = bytearray()
+    async for chunk in request.content.iter_any():
+        body += chunk
+        if len(body) > _MAX_UPDATE_BYTES:
+            raise web.HTTPRequestEntityTooLarge(max_size=_MAX_UPDATE_BYTES, actual_size=len(body))
+    return bytes(body)
+
+
+async def handle_webhook(request: web.Request) -> web.Response:
+    secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(secret.encode(), request.app[SECRET_KEY].encode()):
+        raise web.HTTPUnauthorized(text="bad secret")
+    try:
+        update = json.loads(await _read_body(request))
+        update_id = update["update_id"]
+    except (ValueError, KeyError, TypeError):
+        raise web.HTTPBadRequest(text="not an update") from None
+    if update_id in _seen:
+        return web.Response(text="ok")
+    if _queue is None:
+        raise web.HTTPServiceUnavailable(text="not ready")
+    try:
+        _queue.put_nowait(update)
+    except asyncio.QueueFull:
+        print(f"⚠️  webhook queue full ({WEBHOOK_QUEUE_MAX}) — Telegram will retry", flush=True)
+        raise web.HTTPServiceUnavailable(text="busy") from None
+    _seen[update_id] = True
+    return web.Response(text="ok")
+
+
+def routes() -> list[web.RouteDef]:
+    return [web.post(WEBHOOK_PATH, handle_webhook)]
+
+
+async def _work(queue: asyncio.Queue, handle: Handler) -> None:
+    while True:
+        update = await queue.get()
+        try:
+            await handle(update)
+        except Exception as e:
+            print(f"⚠️  update {update.get('update_id')} failed: {type(e).__name__}: {e}", flush=True)
+        finally:
+            queue.task_done()
+
+
+def start(handle: Handler) -> bool:
+    """Open the queue and start the workers on the running loop. False if
+    already running."""
+    global _queue
+    if _queue is not None:
+        return False
+    _queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_MAX)
+    _tasks.extend(
+        asyncio.create_task(_work(_queue, handle), name=f"webhook-{i}")
+        for i in range(WEBHOOK_WORKERS)
+    )
+    return True
+
+
+async def stop() -> bool:
+    """Let queued updates finish (up to WEBHOOK_DRAIN_S), then cancel the
+    workers. Call after the HTTP server stops accepting. False if not running."""
+    global _queue
+    if _queue is None:
+        return False
+    queue, _queue = _queue, None
+    try:
+        await asyncio.wait_for(queue.join(), WEBHOOK_DRAIN_S)
+    except TimeoutError:
+        print(f"⚠️  {queue.qsize()} webhook update(s) unfinished at shutdown", flush=True)
+    tasks = _tasks[:]
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return True
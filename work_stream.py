@@ -0,0 +1,95 @@
+"""Redis stream that hands workout work from the dispatcher to worker processes.
+
+One bot token can only have one update consumer — two Pyrogram processes on it
+split updates unpredictably (see session.py) — so the bot could never run more
+than one process, and every workout shared its cores. With
+WORKOUT_DISPATCH=stream, bot.py stays the single thin receiver: it queues an
+authorized user's plan on their workout_queue list and signals this stream.
+Any number of worker.py processes read the stream through one consumer group,
+so each signal goes to exactly one worker.
+
+A stream entry says only "user N has plans waiting", never the plan: the
+per-user list keeps a user's plans in order and bounded, as it already did,
+and the worker that takes the user's user_lock drains all of them. A signal
+that finds the lock taken is acknowledged and dropped — the holder re-signals
+if anything is left when it lets go (worker.drain).
+
+Entries are acknowledged after the handler returns. A worker that dies holding
+some is covered by XAUTOCLAIM: after WORK_CLAIM_IDLE_MS idle, another worker
+takes them over. The stream is capped near WORK_STREAM_MAXLEN entries.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+from redis.exceptions import ResponseError
+
+import redis_conn
+
+STREAM = "workq:stream"
+GROUP = "workers"
+WORK_STREAM_MAXLEN = int(os.getenv("WORK_STREAM_MAXLEN", "10000"))
+WORK_CLAIM_IDLE_MS = int(os.getenv("WORK_CLAIM_IDLE_MS", "60000"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+BLOCK_MS = 5000
+
+# Handles one user's signal: worker.drain.
+Handler = Callable[[int], Awaitable[None]]
+
+
+async def init_group() -> None:
+    """Create the stream and its consumer group, if not there yet."""
+    try:
+        await redis_conn.client.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def signal(uid: int) -> None:
+    """Tell the workers that `uid` has plans queued."""
+    await redis_conn.client.xadd(
+        STREAM, {"uid": str(uid)}, maxlen=WORK_STREAM_MAXLEN, approximate=True
+    )
+
+
+async def _handle(entry_id: str, fields: dict, handler: Handler) -> None:
+    try:
+        await handler(int(fields["uid"]))
+    except Exception as e:
+        print(f"⚠️  work stream handler for {fields} failed: {e}", flush=True)
+    finally:
+        await redis_conn.client.xack(STREAM, GROUP, entry_id)
+
+
+async def poll(handler: Handler, consumer: str, block_ms: int | None = BLOCK_MS) -> int:
+    """Handle one entry: a stale one left by a dead worker first, else the
+    next new one (waiting up to `block_ms`). Returns how many were handled."""
+    r = redis_conn.client
+    _, claimed, *_ = await r.xautoclaim(
+        STREAM, GROUP, consumer, min_idle_time=WORK_CLAIM_IDLE_MS, start_id="0-0", count=1
+    )
+    entries = [e for e in claimed if e[1]]  # trimmed away meanwhile: nothing to do
+    if not claimed:
+        read = await r.xreadgroup(GROUP, consumer, {STREAM: ">"}, count=1, block=block_ms)
+        entries = [e for _, stream_entries in read or () for e in stream_entries]
+    for entry_id, fields in entries:
+        await _handle(entry_id, fields, handler)
+    return len(entries)
+
+
+async def _loop(handler: Handler, consumer: str) -> None:
+    while True:
+        try:
+            await poll(handler, consumer)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  work stream read failed: {e}", flush=True)
+            await asyncio.sleep(1)
+
+
+async def run(handler: Handler, consumer: str) -> None:
+    """Work the stream with WORKER_CONCURRENCY users in flight at once."""
+    await asyncio.gather(*(_loop(handler, consumer) for _ in range(WORKER_CONCURRENCY)))
@@ -0,0 +1,128 @@
+"""Workout worker for stream dispatch (WORKOUT_DISPATCH=stream).
+
+Runs workouts that bot.py, the single update receiver, has queued: it reads
+"user N has plans" signals from work_stream, takes the user's user_lock, and
+drains their workout_queue in order through workout_service.process_workout —
+the same per-user single flight as local dispatch, held in Redis so any number
+of these processes, on any number of hosts, can share the load. Replies go
+out through bot_api, worded by replies.py exactly as bot.py words them.
+
+Run one or more with `python worker.py` next to a bot started with
+WORKOUT_DISPATCH=stream and the same .env. Each handles up to
+WORKER_CONCURRENCY users at once. Background jobs (token refresh, the upload
+outbox) stay with the bot process.
+"""
+
+import asyncio
+import os
+import socket
+import traceback
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+import bot_api
+import redis_conn
+import replies
+import token_crypto
+import user_lock
+import work_stream
+import workout_queue
+import write_behind
+from garmin import close_http
+from rate_limiter import close_connections
+from rate_limiter import init as init_rate_limiter
+from user import get_user
+from workout_ai import Priority, close_clients
+from workout_service import process_workout
+
+load_dotenv()
+
+AUTHORIZED = "authorized"  # bot.AUTHORIZED; bot.py is not importable here (it builds the client)
+
+# A resend after a failure that was ours jumps the LLM queue (bot._priority_hint).
+# Per worker: a user's next plan may land on another one, which only costs it a
+# little queue position.
+_priority_hint: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+
+
+def _reply_to(entry: dict):
+    async def reply(text: str):
+        return await bot_api.send_message(entry["chat_id"], text, entry["message_id"])
+
+    return reply
+
+
+async def _run(lease: user_lock.Lease, user_data: dict, entry: dict) -> None:
+    uid = lease.uid
+    reply = _reply_to(entry)
+
+    async def on_accepted():
+        depth = await workout_queue.depth(uid)
+        message_id = await reply(replies.PROCESSING_TEXT + replies.queued_suffix(depth))
+        # So the bot can update it when more plans arrive mid-flight.
+        await user_lock.set_notice(lease, (entry["chat_id"], message_id))
+
+    hint = Priority(entry["priority"]) if entry.get("priority") else Priority.INTERACTIVE
+    try:
+        outcome = await process_workout(
+            uid, user_data, entry["text"], notify=reply, on_accepted=on_accepted,
+            priority=_priority_hint.pop(uid, hint),
+        )
+    except Exception:
+        traceback.print_exc()
+        await reply(replies.CRASHED_TEXT)
+        return
+    if replies.resend_after(outcome):
+        _priority_hint[uid] = Priority.RESEND
+    await reply(replies.outcome_text(outcome))
+
+
+async def drain(uid: int) -> None:
+    """Run every plan the user has queued, unless another worker already is."""
+    lease = await user_lock.acquire(uid)
+    if lease is None:
+        return  # the holder re-signals whatever it leaves behind
+    try:
+        # A lost lease has a new holder, who owns the queue from here.
+        while not lease.lost and (entry := await workout_queue.pop(uid)) is not None:
+            if workout_queue.expired(entry):
+                await _reply_to(entry)(replies.EXPIRED_TEXT)
+                continue
+            # Read per plan: the previous one may have refreshed the token, or
+            # the user may have logged out while this one waited.
+            user_data = await get_user(uid)
+            if not user_data or user_data.get("state") != AUTHORIZED:
+                await workout_queue.clear(uid)
+                break
+            await user_lock.set_notice(lease, None)
+            await _run(lease, user_data, entry)
+    finally:
+        await user_lock.release(lease)
+    # A plan queued after our last pop whose signal met our lock: nobody else
+    # will pick it up.
+    if await workout_queue.depth(uid):
+        await work_stream.signal(uid)
+
+
+async def main() -> None:
+    await init_rate_limiter()
+    token_crypto.init()
+    if redis_conn.client is None:
+        raise RuntimeError("worker.py needs Redis: set REDIS_URL (RATE_LIMIT_DISABLED has none).")
+    await work_stream.init_group()
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"✓ Worker {consumer} reading {work_stream.STREAM} "
+          f"({work_stream.WORKER_CONCURRENCY} at a time)", flush=True)
+    try:
+        await work_stream.run(drain, consumer)
+    finally:
+        await bot_api.close()
+        await write_behind.flush_all()
+        await close_clients()
+        await close_http()
+        await close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
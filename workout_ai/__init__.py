@@ -1,19 +1,34 @@
 """Workout AI package: LLM providers, provider dispatch, and the concurrency gate.
 
 Env configuration lives in config.py; provider dispatch in planner.py; the
-global concurrency gate in gate.py. bot.py should call parse_plan (gated);
+global concurrency gate in gate.py, behind the rule-based fast path in
+fastpath.py; pooled SDK clients in clients.py (closed via close_clients on
+shutdown). bot.py should call parse_plan (gated), or parse_plan_batch for a
+message batch.looks_like_batch says holds several workouts;
 plan_to_json / plan_to_json_async are the ungated primitives for CLI/eval use.
 """
 
+from .batch import looks_like_batch
+from .clients import close_all as close_clients
 from .errors import LLMBusy, LLMQuotaExhausted, WorkoutAIConfigError
-from .gate import parse_plan
+from .gate import parse_plan, parse_plan_batch
+from .gate import stats as llm_stats
+from .limiter import Priority
 from .planner import plan_to_json, plan_to_json_async
+from .trace import ParseTrace, Usage
 
 __all__ = [
     "LLMBusy",
     "LLMQuotaExhausted",
+    "ParseTrace",
+    "Priority",
+    "Usage",
     "WorkoutAIConfigError",
+    "close_clients",
+    "llm_stats",
+    "looks_like_batch",
     "parse_plan",
+    "parse_plan_batch",
     "plan_to_json",
     "plan_to_json_async",
 ]
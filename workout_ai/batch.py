@@ -0,0 +1,41 @@
+"""Detects a message that carries several workouts (a coach's week).
+
+A batch is parsed with a different output model (models.WorkoutPlan) and a
+prompt addendum (SYSTEM_PROMPT_BATCH.md), so the decision has to be made
+before the LLM is called, and it has to be cheap and conservative: a single
+workout misread as a batch still parses (into a one-entry plan), but a week
+misread as a single workout gets merged into one nonsense session. What counts
+is labels: two or more distinct day labels — weekday names or abbreviations in
+English or Russian, "Day N" / "День N", or a dd.mm or ISO date — each at the start of
+a line or a comma/semicolon clause and followed by a separator, as in
+"Mon: …, Wed: …" or "Вт — …". A dd.mm date takes only ":", "—" or ")": with
+"-" or "–" it is as likely a distance range.
+"""
+
+import re
+
+_WEEKDAYS = (
+    r"mon(?:day)?|tue(?:s|sday)?|wed(?:nesday)?|thu(?:rs|rsday)?|fri(?:day)?"
+    r"|sat(?:urday)?|sun(?:day)?"
+    r"|понедельник|вторник|среда|среду|четверг|пятница|пятницу|суббота|субботу|воскресенье"
+    r"|пн|вт|ср|чт|пт|сб|вс"
+)
+DAY_LABEL = rf"{_WEEKDAYS}|(?:day|день)\s*\d{{1,2}}|\d{{4}}-\d{{2}}-\d{{2}}"
+# dd.mm reads just like a distance: "2.5 - 3 km warmup" is a range, not 2 May,
+# so it needs a separator a range never uses.
+DATE_LABEL = r"\d{1,2}\.\d{1,2}(?:\.\d{4})?"
+DATE_SEP = r"[:—)]"
+_LABEL_RE = re.compile(
+    rf"(?:^|[\n,;])\s*(?:(?P<day>{DAY_LABEL})\s*(?:[:—–)]|-\s)|(?P<ddmm>{DATE_LABEL})\s*{DATE_SEP})",
+    re.IGNORECASE,
+)
+
+
+def labels(text: str) -> list[str]:
+    """The day labels in `text`, in order, lower-cased."""
+    return [" ".join((m["day"] or m["ddmm"]).lower().split()) for m in _LABEL_RE.finditer(text)]
+
+
+def looks_like_batch(text: str) -> bool:
+    """True when `text` names two or more distinct days."""
+    return len(set(labels(text))) >= 2
@@ -0,0 +1,92 @@
+"""Content-addressed cache of parsed workouts, in front of the LLM gate.
+
+The same plan text arrives over and over — a coach posts one session in a group
+and twenty athletes forward it — and each copy used to cost a full provider
+round trip. The parse is a pure function of (plan text, provider, model, system
+prompt), so the cache key is exactly those four: change the model or edit
+SYSTEM_PROMPT.md and every old entry simply stops matching, no flush needed.
+
+Two tiers. An in-process LRU keeps the hot set without a network hop; Redis
+(redis_conn.client, already required by the limiter) backs it with a TTL so a
+restart or a second replica doesn't start cold. Both are best-effort: a Redis
+error is a miss, never a failed parse.
+
+What is cached is the provider's output BEFORE prefs.apply — preferences are a
+per-user post-parse transform, so one entry serves every user. Callers get a
+copy; the LRU's value is never handed out for mutation.
+"""
+
+import copy
+import hashlib
+import json
+
+from cachetools import LRUCache
+
+import redis_conn
+
+from .config import PARSE_CACHE_SIZE, PARSE_CACHE_TTL_S
+
+_memory: LRUCache = LRUCache(maxsize=max(PARSE_CACHE_SIZE, 1))
+
+
+def normalize(text: str) -> str:
+    """Collapse the whitespace noise forwarding and copy-paste introduce.
+
+    Runs of spaces/tabs become one space, lines are trimmed, blank lines drop.
+    Case and punctuation are left alone — "5:00" vs "5.00" or a capitalised
+    unit can change what the model reads, whitespace can't.
+    """
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def key(text: str, provider: str, model: str, prompt_sha: str) -> str:
+    material = "\0".join((provider, model, prompt_sha, normalize(text)))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _redis_key(k: str) -> str:
+    return f"parse:{k}"
+
+
+async def get(k: str) -> dict | list[dict] | None:
+    hit = _memory.get(k)
+    if hit is not None:
+        return copy.deepcopy(hit)
+
+    r = redis_conn.client
+    if r is None or PARSE_CACHE_TTL_S <= 0:
+        return None
+    try:
+        raw = await r.get(_redis_key(k))
+    except Exception as e:
+        print(f"⚠️  parse cache read failed: {e}", flush=True)
+        return None
+    if raw is None:
+        return None
+    try:
+        workout = json.loads(raw)
+    except ValueError as e:
+        # Corrupt or truncated: a miss, and drop it so the reparse replaces it.
+        print(f"⚠️  parse cache entry unreadable, dropping it: {e}", flush=True)
+        try:
+            await r.delete(_redis_key(k))
+        except Exception:
+            pass
+        return None
+    if PARSE_CACHE_SIZE > 0:
+        _memory[k] = workout
+    return copy.deepcopy(workout)
+
+
+async def put(k: str, workout: dict | list[dict]) -> None:
+    if PARSE_CACHE_SIZE > 0:
+        _memory[k] = copy.deepcopy(workout)
+
+    r = redis_conn.client
+    if r is None or PARSE_CACHE_TTL_S <= 0:
+        return
+    try:
+        await r.set(_redis_key(k), json.dumps(workout), ex=PARSE_CACHE_TTL_S)
+    except Exception as e:
+        print(f"⚠️  parse cache write failed: {e}", flush=True)
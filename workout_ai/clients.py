@@ -0,0 +1,46 @@
+"""Process-wide provider SDK clients, one per (provider, api key, timeout).
+
+Each AsyncOpenAI / AsyncAnthropic owns an httpx connection pool. Building one
+inside every plan() call threw that pool away per workout — a fresh DNS lookup
+and TLS handshake on the critical path of every parse — and never closed it.
+Clients are now built on first use and reused, so consecutive parses ride the
+same keep-alive connections; bot.shutdown() closes them via close_all().
+
+The key includes the API key (hashed — this dict is not a place to keep
+secrets readable) and the timeout, so rotating either builds a new client
+rather than silently reusing one configured for the old value.
+
+A factory that raises (missing key) caches nothing: the next call retries
+construction, and the provider still surfaces WorkoutAIConfigError before any
+request is issued.
+"""
+
+import hashlib
+from typing import Any, Callable
+
+_clients: dict[tuple[str, str, float], Any] = {}
+
+
+def get(provider: str, api_key: str | None, timeout: float, factory: Callable[[], Any]) -> Any:
+    fingerprint = hashlib.sha256((api_key or "").encode()).hexdigest()
+    key = (provider, fingerprint, timeout)
+    client = _clients.get(key)
+    if client is None:
+        client = factory()
+        _clients[key] = client
+    return client
+
+
+async def close_all() -> int:
+    """Close every pooled client. Best-effort: never blocks the exit.
+
+    Returns how many clients were closed.
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            print(f"⚠️  LLM client close failed: {e}", flush=True)
+    return len(clients)
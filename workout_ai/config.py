@@ -18,7 +18,38 @@ load_dotenv()
 #   WORKOUT_AI_MODEL     optional override of the provider's default model
 PROVIDER = os.environ.get("WORKOUT_AI_PROVIDER", "openai").lower()
 MODEL = os.environ.get("WORKOUT_AI_MODEL")
+# Optional second provider for hedging and failover (router.py); unset = off.
+#   WORKOUT_AI_FALLBACK_PROVIDER  "claude" | "openai", not the same as PROVIDER
+#   WORKOUT_AI_FALLBACK_MODEL     optional override of its default model
+FALLBACK_PROVIDER = os.environ.get("WORKOUT_AI_FALLBACK_PROVIDER", "").lower() or None
+FALLBACK_MODEL = os.environ.get("WORKOUT_AI_FALLBACK_MODEL")
 
 LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
 LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "45"))
 LLM_QUEUE_WAIT_S = float(os.getenv("LLM_QUEUE_WAIT_S", "10"))
+
+# Parse cache (cache.py). The LRU holds the hot set in process; Redis backs it so
+# a restart or a second replica doesn't start cold. 0 disables the tier.
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "512"))
+PARSE_CACHE_TTL_S = int(os.getenv("PARSE_CACHE_TTL_S", str(7 * 86400)))
+
+# Adaptive LLM concurrency (limiter.py). LLM_CONCURRENCY is the starting limit;
+# the limiter moves it within [LLM_CONCURRENCY_MIN, LLM_CONCURRENCY_MAX] from
+# observed provider latency and errors.
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "16"))
+# Waiters beyond this are shed lowest-priority first (limiter.Priority).
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "64"))
+
+# Deterministic fast path (fastpath.py) in front of the cache and the gate. On by
+# default; "1" sends every plan to the LLM, e.g. to compare the two on traffic.
+FASTPATH_DISABLED = os.getenv("WORKOUT_AI_FASTPATH_DISABLED", "") == "1"
+
+# Hedging and failover (router.py), only with a fallback provider configured.
+# Hedge once the primary passes this percentile of its recent healthy latency,
+# at most LLM_HEDGE_BUDGET hedges per request on average (the cost cap).
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+# This many overload errors in a row take a provider out for the cooldown.
+LLM_FAILOVER_ERRORS = int(os.getenv("LLM_FAILOVER_ERRORS", "3"))
+LLM_FAILOVER_COOLDOWN_S = float(os.getenv("LLM_FAILOVER_COOLDOWN_S", "30"))
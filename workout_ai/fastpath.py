@@ -0,0 +1,262 @@
+"""Deterministic parser for the mechanical plan shapes, run before the LLM.
+
+A large share of real traffic needs no language model at all: "2 km warmup,
+10x400m @ 3:45 / 200m jog, 2 km cooldown", or a slash skeleton such as
+"4000/500/2000/500/4000" followed by one pace line per distance. Sending those
+to a provider cost seconds, a gate slot and tokens to produce an answer a
+regular grammar gets right in microseconds. parse() handles exactly those
+shapes and returns None for everything else, and parse_plan falls through to
+the cache, the gate and the provider as before.
+
+Confidence is all-or-nothing: every non-blank line must match one of the rules
+below, or the whole text goes to the LLM. There is no partial credit — a line
+we skip is a step the athlete loses on the watch — and no guessing: anything
+SYSTEM_PROMPT.md resolves by judgement (easy runs that become warmup, ranges,
+pace ceilings, distance budgets, subdivisions, a bare "400/200" pair, time-based
+jogs, an unmarked time after a sub-km distance — split or pace?) is left to the
+model. The rules, one per line:
+
+    [dist] warmup|WU|разминка [dist] [pace]      warmup (same for cooldown/CD/заминка)
+    N x dist [pace] [/ recovery]                  repeat group; also "N раз по dist"
+    dist pace                                     one paced run
+    a/b/c[/...]                                   skeleton: 3+ distances, metres, or
+                                                  km when every annotation says km
+
+A recovery is "200m jog" (RecoveryStep) or a rest time "90s", "2 min rest",
+"отдых 90 сек" (RestStep). A skeleton is followed by paced-run lines that
+annotate it by distance; every distinct distance must be annotated exactly
+once, and the skeleton is emitted one run per segment, in skeleton order — the
+same reading SYSTEM_PROMPT.md asks of the model.
+
+The result goes through the Workout model like any provider output, so the
+semantic bounds hold here too. evals/run.py scores this parser as the
+"rules/fastpath" model against the same checks as the providers; an
+abstention shows up there as an error row, never as a wrong answer.
+"""
+
+import re
+
+from pydantic import ValidationError
+
+from .models import Workout
+
+
+class _Unsure(Exception):
+    """Some line is outside the grammar: the LLM decides."""
+
+
+_NUM = r"\d+(?:\.\d+)?"
+# Longest alternatives first; the lookahead stops "м" from eating "мин".
+_UNIT = r"km|k|км|meters|meter|metres|metre|m|метров|метра|метр|м"
+_DIST = rf"{_NUM}\s*(?:{_UNIT})?(?![a-zа-яё])"
+_DIST_RE = re.compile(rf"(?P<n>{_NUM})\s*(?P<u>{_UNIT})?")
+
+_PACE = (
+    r"(?P<pace_text>(?:(?:@|at|в темпе|темп|по|ближе к|около)\s*)?(?P<pace>\d{1,2}:\d{2})"
+    r"(?:\s*(?:/\s*(?:km|км)|min/km|мин/км|per km))?(?:\s*pace)?)"
+)
+
+_WARMUP = r"warm[- ]?up|wu|разминк[аиу]"
+_COOLDOWN = r"cool[- ]?down|cd|заминк[аиу]"
+_SEGMENT_RE = re.compile(
+    rf"(?:(?P<d1>{_DIST})\s+)?(?:(?P<wu>{_WARMUP})|(?P<cd>{_COOLDOWN}))"
+    rf"(?:\s+(?P<d2>{_DIST}))?(?:\s+{_PACE})?"
+)
+_RUN_RE = re.compile(rf"(?P<d>{_DIST})\s*{_PACE}")
+_REPEAT_RE = re.compile(
+    rf"(?P<n>\d+)\s*(?:x|раза? по)\s*(?P<d>{_DIST})(?:\s*{_PACE})?"
+    r"(?:\s*(?:/|\+|with|then|через)\s*(?P<rec>.+))?"
+)
+_SKELETON_RE = re.compile(r"\d+(?:\s*/\s*\d+){2,}")
+
+_JOG = r"jog|easy|recovery|трусцой|трусца|легко"
+_JOG_RE = re.compile(rf"(?P<d1>{_DIST})\s+(?:{_JOG})|(?:{_JOG})\s+(?P<d2>{_DIST})")
+_REST = r"rest|отдых|standing|постоять"
+_REST_RE = re.compile(
+    rf"(?:(?:{_REST})\s+)?(?P<t>\d+)\s*"
+    r"(?P<u>seconds|second|secs|sec|s|секунды|секунда|секунд|сек|с"
+    r"|minutes|minute|mins|min|минуты|минута|минут|мин)(?![a-zа-яё])"
+    rf"(?:\s+(?:{_REST}))?"
+)
+
+
+def _normalize(line: str) -> str:
+    line = line.strip().lower().replace("ё", "е")
+    line = re.sub(r"(?<=\d),(?=\d)", ".", line)  # 1,5 км
+    line = re.sub(r"(?<=\d)\s*[x×х*]\s*(?=\d)", "x", line)  # 10 × 400, 10х400
+    line = re.sub(r"\s+", " ", line)
+    return line.rstrip(".;:,").strip()
+
+
+def _meters(text: str, unitless: bool = False) -> int:
+    """Distance in metres. A bare number is metres only where `unitless` allows
+    it (rep and recovery lengths) and only when it can't be kilometres. A short
+    "m" is no safer: runners write "5x3m" for three minutes."""
+    m = _DIST_RE.fullmatch(text.strip())
+    if m is None:
+        raise _Unsure(text)
+    value, unit = float(m["n"]), m["u"]
+    if unit in ("km", "k", "км"):
+        value *= 1000
+    elif unit is None and not (unitless and value >= 100):
+        raise _Unsure(f"unitless distance {text!r}")
+    elif unit in ("m", "м") and value < 100:
+        raise _Unsure(f"metres or minutes {text!r}")
+    if value != int(value):
+        raise _Unsure(f"fractional metres {text!r}")
+    return int(value)
+
+
+def _pace(m: re.Match, distance: int) -> str | None:
+    """The match's pace, unless it is a bare time after a sub-km distance:
+    "800m 2:50" is most likely 2:50 for the 800 (3:32/km), not 2:50/km. Any
+    marker ("@", "темп", "/km", "pace"...) makes it a pace."""
+    if m["pace"] and distance < 1000 and m["pace_text"].strip() == m["pace"]:
+        raise _Unsure(f"split or pace {m['pace_text']!r}")
+    return m["pace"]
+
+
+def _recovery(text: str) -> dict:
+    m = _REST_RE.fullmatch(text)
+    if m is not None:
+        seconds = int(m["t"]) * (60 if m["u"].startswith(("m", "м")) else 1)
+        return {"type": "rest", "rest": seconds}
+    m = _JOG_RE.fullmatch(text)
+    if m is not None:
+        return {"type": "recovery", "distance": _meters(m["d1"] or m["d2"], unitless=True)}
+    raise _Unsure(f"recovery {text!r}")
+
+
+class _Skeleton:
+    def __init__(self, line: str):
+        self.raw = [int(v) for v in line.split("/")]
+        if all(v >= 100 for v in self.raw):
+            self.km = False
+        elif all(v < 100 for v in self.raw):
+            self.km = True
+        else:
+            raise _Unsure(f"mixed-unit skeleton {line!r}")
+        self.paces: dict[int, str] = {}
+
+    @property
+    def distances(self) -> list[int]:
+        return [v * 1000 for v in self.raw] if self.km else self.raw
+
+    def annotate(self, distance: int, pace: str, km_unit: bool) -> None:
+        if self.km and not km_unit:
+            raise _Unsure("unitless skeleton annotated in metres")
+        if distance not in self.distances or distance in self.paces:
+            raise _Unsure(f"annotation {distance} does not bind to the skeleton")
+        self.paces[distance] = pace
+
+    def steps(self) -> list[dict]:
+        if set(self.paces) != set(self.distances):
+            raise _Unsure("skeleton distance without an annotation")
+        return [{"type": "run", "distance": d, "pace": self.paces[d]} for d in self.distances]
+
+
+def parse(text: str) -> dict | None:
+    """The workout dict for a plan in the grammar above, or None to use the LLM."""
+    try:
+        return _parse(text)
+    except (_Unsure, ValidationError):
+        return None
+
+
+def _name(element: dict | str) -> str:
+    """Name part for one main-set element, in the "10×400/200 @ 3:45" style the
+    prompt asks the model for. Skeletons arrive already formatted."""
+    if isinstance(element, str):
+        return element
+    if element["type"] == "run":
+        return f"{element['distance']} @ {element['pace']}"
+    rep, *rest = element["steps"]
+    name = f"{element['repeat']}×{rep['distance']}"
+    if rest and rest[0]["type"] == "recovery":
+        name += f"/{rest[0]['distance']}"
+    return name + (f" @ {rep['pace']}" if rep["pace"] else "")
+
+
+def _parse(text: str) -> dict:
+    warmup = cooldown = None
+    intervals: list[dict] = []
+    names: list[dict | str] = []
+    skeleton: _Skeleton | None = None
+    open_repeat: dict | None = None  # a repeat on this line still without a recovery
+
+    def close_skeleton() -> None:
+        nonlocal skeleton
+        if skeleton is not None:
+            intervals.extend(skeleton.steps())
+            names.append("/".join(map(str, skeleton.raw)))
+            skeleton = None
+
+    for raw in text.splitlines():
+        # A one-line plan separates its parts with commas, and the clause after
+        # a repeat may be its recovery: "6x1km @ 4:00, 2 min rest".
+        open_repeat = None
+        for clause in re.split(r"[,;](?!\d)", raw):
+            line = _normalize(clause)
+            if not line:
+                continue
+            if open_repeat is not None:
+                repeat, open_repeat = open_repeat, None
+                try:
+                    repeat["steps"].append(_recovery(line))
+                    continue
+                except _Unsure:
+                    pass
+            if cooldown is not None:
+                raise _Unsure("text after the cooldown")
+
+            if m := _SEGMENT_RE.fullmatch(line):
+                if m["d1"] and m["d2"]:
+                    raise _Unsure(line)
+                distance = m["d1"] or m["d2"]
+                segment = {"distance": _meters(distance) if distance else None, "pace": m["pace"]}
+                if m["wu"]:
+                    if warmup is not None or intervals or skeleton is not None:
+                        raise _Unsure("warmup not at the start")
+                    warmup = segment
+                else:
+                    close_skeleton()
+                    if not intervals:
+                        raise _Unsure("cooldown before any work")
+                    cooldown = segment
+            elif _SKELETON_RE.fullmatch(line):
+                close_skeleton()
+                skeleton = _Skeleton(line.replace(" ", ""))
+            elif m := _RUN_RE.fullmatch(line):
+                distance = _meters(m["d"])
+                if skeleton is not None:
+                    km_unit = _DIST_RE.fullmatch(m["d"].strip())["u"] in ("km", "k", "км")
+                    skeleton.annotate(distance, _pace(m, distance), km_unit)
+                    continue
+                run = {"type": "run", "distance": distance, "pace": _pace(m, distance)}
+                intervals.append(run)
+                names.append(run)
+            elif m := _REPEAT_RE.fullmatch(line):
+                close_skeleton()
+                if int(m["n"]) < 2:
+                    raise _Unsure(line)
+                distance = _meters(m["d"], unitless=True)
+                rep = {"type": "run", "distance": distance, "pace": _pace(m, distance)}
+                steps = [rep] + ([_recovery(m["rec"])] if m["rec"] else [])
+                repeat = {"type": "repeat", "repeat": int(m["n"]), "steps": steps}
+                intervals.append(repeat)
+                names.append(repeat)
+                if not m["rec"]:
+                    open_repeat = repeat
+            else:
+                raise _Unsure(line)
+
+    close_skeleton()
+    if not intervals:
+        raise _Unsure("no main set")
+    workout = Workout.model_validate({
+        "name": " + ".join(map(_name, names))[:100],
+        "warmup": warmup,
+        "intervals": intervals,
+        "cooldown": cooldown,
+    })
+    return workout.model_dump(exclude_none=True)
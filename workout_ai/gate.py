@@ -9,50 +9,222 @@ one hung request stalled every user behind it for the SDK's 600s default.
 
 The two bounds are orthogonal: the limiter is per-user and cannot see a spike of
 N distinct users each firing their first, fully-in-quota request at once. That
-spike is what the semaphore is for — it keeps us under the provider's org-wide
-RPM/TPM ceiling.
+spike is what the concurrency limit is for — it keeps us under the provider's
+org-wide RPM/TPM ceiling. The limit itself is adaptive (limiter.py): it climbs
+while the provider stays fast and healthy and backs off on 429s, 5xx, timeouts,
+or rising latency, within [LLM_CONCURRENCY_MIN, LLM_CONCURRENCY_MAX].
 
 Bound the *wait* as well as the concurrency. An unbounded queue turns a provider
 slowdown into a silent pile-up: at concurrency 4 and a 45s timeout, the 500th
 queued request waits ~90 minutes before its own timeout clock even starts, long
 after Telegram (and the user) gave up. Failing fast with "busy" is worse latency
-on paper and much better behaviour in practice.
+on paper and much better behaviour in practice. The queue is also bounded in
+length (LLM_QUEUE_MAX) and is not FIFO across request classes: waiters carry a
+Priority, slots are shared by weight, and a full queue sheds its lowest class
+first (see limiter.py).
 
 This bound is cross-user only. Keeping a single user to one workout at a time is
-the bot's job, not this module's — bot.py holds a per-user single-flight gate
-across the whole parse+upload flow and ignores further messages while one is in
-progress, so a per-user bound here would be redundant.
+the bot's job, not this module's — whoever runs a user's workouts (bot.py, or a
+worker.py under stream dispatch) holds their user_lock lease across the whole
+parse+upload flow, and a plan sent meanwhile waits in workout_queue until the
+holder drains it, so a per-user bound here would be redundant.
+
+The deterministic fast path (fastpath.py) runs before everything else: a plan
+in its grammar is answered in-process and never touches the cache, a slot, or
+a provider. Only what it declines continues below.
+
+Behind it, the parse cache (cache.py) sits in front of the gate: a hit never
+queues for a slot and never reaches a provider, so it cannot be shed as busy
+either.
+
+Behind the cache, identical misses are single-flighted: when a coach's plan
+goes out, dozens of copies arrive within seconds — before the first parse has
+landed in the cache — and each used to take its own slot and its own billable
+call, shedding unrelated users as busy. Now the first miss for a key starts one
+shared parse and later arrivals for the same key await it. The shared parse
+runs as its own task under asyncio.shield, so a waiter that times out or is
+cancelled walks away alone; the call finishes for everyone else (and the cache).
 """
 
 import asyncio
+import copy
+import time
 
-from .config import LLM_CONCURRENCY, LLM_QUEUE_WAIT_S, LLM_TIMEOUT_S
+from . import cache, fastpath, limiter, router
+from .config import (
+    FASTPATH_DISABLED,
+    LLM_CONCURRENCY,
+    LLM_CONCURRENCY_MAX,
+    LLM_CONCURRENCY_MIN,
+    LLM_QUEUE_MAX,
+    LLM_QUEUE_WAIT_S,
+    LLM_TIMEOUT_S,
+)
 from .errors import LLMBusy
-from .planner import plan_to_json_async
+from .limiter import Priority
+from .planner import (
+    plan_batch_async,
+    plan_to_json_async,
+    prompt_sha,
+    resolve,
+    resolve_fallback,
+)
+from .providers import is_overload
+from .trace import ParseTrace
+
+_limiter = limiter.AdaptiveLimiter(
+    LLM_CONCURRENCY, LLM_CONCURRENCY_MIN, LLM_CONCURRENCY_MAX, max_queue=LLM_QUEUE_MAX
+)
+
+# cache key -> the shared parse task for that key while it is in flight.
+_inflight: dict[str, asyncio.Task] = {}
+
+
+async def _parse_uncached(
+    workout_plan: str, cache_key: str, priority: Priority, trace: ParseTrace, batch: bool
+) -> dict | list[dict]:
+    queued = time.monotonic()
+    try:
+        async with asyncio.timeout(LLM_QUEUE_WAIT_S):
+            await _limiter.acquire(priority)
+    except TimeoutError as e:
+        raise LLMBusy(f"no LLM slot within {LLM_QUEUE_WAIT_S}s") from e
+
+    start = time.monotonic()
+    trace.timings["queue_wait_ms"] = round((start - queued) * 1000, 1)
+    outcome = limiter.NEUTRAL
+    try:
+        plan = plan_batch_async if batch else plan_to_json_async
+        workout = await asyncio.wait_for(plan(workout_plan, trace), timeout=LLM_TIMEOUT_S)
+        outcome = limiter.OK
+    except Exception as e:
+        # Our own timeout counts: a provider that can't answer within budget
+        # at this concurrency is the clearest overload signal there is.
+        if isinstance(e, TimeoutError) or is_overload(e):
+            outcome = limiter.OVERLOAD
+        raise
+    finally:
+        latency = time.monotonic() - start
+        trace.timings["provider_ms"] = round(latency * 1000, 1)
+        _limiter.release(latency, outcome)
+    await cache.put(_winner_key(workout_plan, cache_key, trace, batch), workout)
+    return workout
+
+
+def _cache_key(workout_plan: str, provider, model: str, batch: bool) -> str:
+    return cache.key(workout_plan, provider.NAME, model, prompt_sha(provider, model, batch))
+
+
+def _winner_key(workout_plan: str, cache_key: str, trace: ParseTrace, batch: bool) -> str:
+    """The cache key for the route that produced the output. After a hedge or
+    a failover that is the fallback (trace.usage says whose call won), and its
+    parse must not be served later as the primary's."""
+    won = trace.usage
+    fallback = resolve_fallback()
+    if won is not None and fallback is not None and (won.provider, won.model) == (
+        fallback[0].NAME, fallback[1]
+    ):
+        return _cache_key(workout_plan, *fallback, batch)
+    return cache_key
+
 
-_llm_sem = asyncio.Semaphore(LLM_CONCURRENCY)
+def _start_shared(
+    workout_plan: str, cache_key: str, priority: Priority, trace: ParseTrace, batch: bool
+) -> asyncio.Task:
+    # The starter's trace receives the provider usage: it is the request that
+    # pays for the call. Coalesced waiters consumed nothing of their own.
+    task = asyncio.create_task(
+        _parse_uncached(workout_plan, cache_key, priority, trace, batch)
+    )
+    _inflight[cache_key] = task
 
+    def _done(t: asyncio.Task) -> None:
+        if _inflight.get(cache_key) is t:
+            del _inflight[cache_key]
+        # Every waiter may have given up already; retrieve the exception so
+        # asyncio doesn't log "never retrieved" for a failure someone handled.
+        if not t.cancelled():
+            t.exception()
 
-async def parse_plan(workout_plan: str) -> dict:
+    task.add_done_callback(_done)
+    return task
+
+
+def stats() -> dict:
+    """Current concurrency limit, slots in use, and queue depth, for monitoring,
+    plus the hedge/failover counters under "routing"."""
+    return {**_limiter.stats(), "routing": router.stats()}
+
+
+async def parse_plan(
+    workout_plan: str,
+    trace: ParseTrace | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> dict:
     """Turn free text into a validated workout dict. The only billable step.
 
+    Tries the deterministic fast path first, then the parse cache, then joins
+    an identical parse already in flight; `trace`, when given, records which of
+    these happened.
+    `priority` orders this request among other waiters for a slot; a shared
+    parse queues at the priority of the request that started it.
+
     Two bounds. LLM_QUEUE_WAIT_S caps how long we queue for a global slot; then
     LLM_TIMEOUT_S covers the provider call, its clock starting only once the slot
     is held — a request must never burn its provider budget queueing.
 
     Raises:
-        LLMBusy:               every global slot was busy. Nothing was billed.
-        asyncio.TimeoutError:  the provider call itself exceeded LLM_TIMEOUT_S.
+        LLMBusy:               every global slot was busy, or the full queue
+                               shed this request for a higher-priority one.
+                               Nothing was billed.
+        asyncio.TimeoutError:  the provider call itself exceeded LLM_TIMEOUT_S, or
+                               this caller's own queue+provider budget ran out
+                               while waiting on a shared parse.
     """
-    try:
-        async with asyncio.timeout(LLM_QUEUE_WAIT_S):
-            await _llm_sem.acquire()
-    except TimeoutError as e:
-        raise LLMBusy(f"no LLM slot within {LLM_QUEUE_WAIT_S}s") from e
+    trace = trace if trace is not None else ParseTrace()
+    if not FASTPATH_DISABLED:
+        workout = fastpath.parse(workout_plan)
+        if workout is not None:
+            trace.cache = "rules"
+            return workout
+    return await _parse(workout_plan, trace, priority, batch=False)
 
-    try:
-        return await asyncio.wait_for(
-            plan_to_json_async(workout_plan), timeout=LLM_TIMEOUT_S
-        )
-    finally:
-        _llm_sem.release()
+
+async def parse_plan_batch(
+    workout_plan: str,
+    trace: ParseTrace | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> list[dict]:
+    """parse_plan for a multi-workout plan (batch.looks_like_batch): one
+    provider call returning one workout dict per entry, in plan order.
+
+    Same cache, single-flight, bounds and raises as parse_plan; the fast path
+    is skipped, since its grammar describes one workout.
+    """
+    trace = trace if trace is not None else ParseTrace()
+    return await _parse(workout_plan, trace, priority, batch=True)
+
+
+async def _parse(
+    workout_plan: str, trace: ParseTrace, priority: Priority, batch: bool
+) -> dict | list[dict]:
+    cache_key = _cache_key(workout_plan, *resolve(), batch)
+    cached = await cache.get(cache_key)
+    if cached is not None:
+        trace.cache = "hit"
+        return cached
+
+    task = _inflight.get(cache_key)
+    if task is None:
+        trace.cache = "miss"
+        task = _start_shared(workout_plan, cache_key, priority, trace, batch)
+    else:
+        trace.cache = "coalesced"
+
+    # The caller's own budget is the same as an unshared call's: queue wait plus
+    # provider time, counted from when THIS caller arrived. The shared task
+    # enforces its own bounds too, so this only fires for a late joiner whose
+    # deadline is the tighter one.
+    async with asyncio.timeout(LLM_QUEUE_WAIT_S + LLM_TIMEOUT_S):
+        workout = await asyncio.shield(task)
+    return copy.deepcopy(workout)
@@ -0,0 +1,210 @@
+"""Adaptive (AIMD) concurrency limit for the provider calls.
+
+A fixed LLM_CONCURRENCY was wrong twice a day: at night it left provider quota
+unused, at peak it was either too low (shedding users as busy while the
+provider had headroom) or too high (piling requests onto a provider that was
+already answering with 429s). The right number is whatever the provider is
+currently absorbing, so measure it instead of guessing.
+
+The rule is TCP's. Every healthy completion made while the limit was actually
+in use adds 1/limit — about +1 per round of `limit` calls. A congestion signal
+multiplies the limit by BACKOFF. Signals are the provider telling us outright
+(429, 5xx, connection failure, our own timeout) and the provider telling us
+quietly: a fast moving average of healthy latency drifting above
+LATENCY_TOLERANCE times the slow baseline. Errors that say nothing about
+capacity (a refusal, a validation failure) leave the limit alone.
+
+Backoff happens at most once per cooldown: the calls already in flight when
+the provider tipped over all fail together, and counting each of them would
+collapse the limit to the floor on a single incident.
+
+The limit never leaves [floor, ceiling]. The caller bounds the wait (gate.py
+turns it into LLMBusy).
+
+Waiters are not served in plain arrival order. Each request carries a Priority
+class, and a freed slot goes to the class that has received the least service
+relative to its weight (stride scheduling): a heavy source — an eval run sharing
+the process — still makes progress, but cannot starve interactive users by
+sheer volume. Within a class, arrival order holds. The queue itself is bounded
+(max_queue): when it is full, the newest waiter of the lowest class present is
+shed with LLMBusy to make room, or the newcomer is, if nothing queued ranks
+below it.
+"""
+
+import asyncio
+import time
+from collections import deque
+from enum import Enum
+
+from .errors import LLMBusy
+
+
+class Priority(Enum):
+    """Who is waiting for an LLM slot. Declared most important first."""
+
+    FIRST_TIME = "first_time"    # first workout since logging in — onboarding
+    RESEND = "resend"            # retry after a failure that wasn't the user's fault
+    INTERACTIVE = "interactive"  # everyday Telegram traffic
+    BATCH = "batch"              # CLI / eval runs sharing the process
+
+
+# Share of freed slots under contention, relative to one another.
+WEIGHTS = {
+    Priority.FIRST_TIME: 8,
+    Priority.RESEND: 6,
+    Priority.INTERACTIVE: 4,
+    Priority.BATCH: 1,
+}
+# Shedding order: higher rank survives longer.
+_RANK = {p: -i for i, p in enumerate(Priority)}
+
+OK = "ok"              # healthy completion — evidence of spare capacity
+OVERLOAD = "overload"  # 429/5xx/connection/timeout — back off
+NEUTRAL = "neutral"    # says nothing about capacity (refusal, cancellation)
+
+BACKOFF = 0.75
+LATENCY_TOLERANCE = 2.0
+_FAST_ALPHA = 0.3
+_SLOW_ALPHA = 0.05
+_MIN_COOLDOWN_S = 1.0
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int, floor: int, ceiling: int, max_queue: int | None = None):
+        if not 1 <= floor <= ceiling:
+            raise ValueError(f"need 1 <= floor <= ceiling, got {floor}..{ceiling}")
+        self.floor = floor
+        self.ceiling = ceiling
+        self.max_queue = max_queue
+        self._limit = float(min(max(initial, floor), ceiling))
+        self._in_flight = 0
+        self._waiters: dict[Priority, deque[asyncio.Future]] = {p: deque() for p in Priority}
+        # Stride scheduling: each class's virtual finish time, advanced by
+        # 1/weight per grant; the smallest pass among non-empty classes goes next.
+        self._pass: dict[Priority, float] = dict.fromkeys(Priority, 0.0)
+        self._vtime = 0.0
+        self._recent: float | None = None    # fast EWMA of healthy latency
+        self._baseline: float | None = None  # slow EWMA: what "uncongested" looks like
+        self._last_backoff = float("-inf")
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._depth(p) for p in Priority)
+
+    def _depth(self, priority: Priority) -> int:
+        return sum(1 for f in self._waiters[priority] if not f.done())
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queued": {p.value: self._depth(p) for p in Priority},
+        }
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        """Wait for a slot. The wait itself is unbounded — wrap it in a timeout.
+
+        Raises:
+            LLMBusy: the queue is full and this request ranks lowest in it, or
+                     it was queued and later shed to make room for a higher one.
+        """
+        if self._in_flight < self.limit and not self.queue_depth:
+            self._in_flight += 1
+            return
+        if self.max_queue is not None and self.queue_depth >= self.max_queue:
+            self._shed_for(priority)
+        if not self._depth(priority):
+            # A class returning from idle starts at the current virtual time:
+            # sitting out must not bank credit to burst with later.
+            self._pass[priority] = max(self._pass[priority], self._vtime)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                # Granted in the same tick we were cancelled: the slot is ours
+                # and nobody will release it. Hand it straight on. (Shed in
+                # that tick instead, we never had one.)
+                self._in_flight -= 1
+                self._wake()
+            elif fut in self._waiters[priority]:  # _wake may have discarded it
+                self._waiters[priority].remove(fut)
+            raise
+
+    def _shed_for(self, priority: Priority) -> None:
+        """Make room for `priority` in a full queue, or refuse it."""
+        for victim in sorted(Priority, key=_RANK.get):
+            if _RANK[victim] >= _RANK[priority]:
+                break
+            queue = self._waiters[victim]
+            while queue:
+                fut = queue.pop()  # newest first: it has waited least
+                if not fut.done():
+                    fut.set_exception(LLMBusy(f"shed for a {priority.value} request"))
+                    return
+        raise LLMBusy(f"LLM queue full ({self.max_queue} waiting)")
+
+    def release(self, latency_s: float | None = None, outcome: str = NEUTRAL) -> None:
+        was_saturated = self._in_flight >= self.limit
+        self._in_flight -= 1
+        self._adjust(latency_s, outcome, was_saturated)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._in_flight < self.limit:
+            ready = [p for p in Priority if self._depth(p)]
+            if not ready:
+                return
+            chosen = min(ready, key=lambda p: self._pass[p])  # ties: declaration order
+            queue = self._waiters[chosen]
+            fut = queue.popleft()
+            if fut.done():  # cancelled or shed while queued
+                continue
+            self._vtime = self._pass[chosen]
+            self._pass[chosen] += 1 / WEIGHTS[chosen]
+            self._in_flight += 1
+            fut.set_result(None)
+
+    def _adjust(self, latency_s: float | None, outcome: str, was_saturated: bool) -> None:
+        now = time.monotonic()
+        if outcome == OVERLOAD:
+            self._backoff(now)
+            return
+        if outcome != OK or latency_s is None:
+            return
+
+        self._recent = latency_s if self._recent is None else (
+            _FAST_ALPHA * latency_s + (1 - _FAST_ALPHA) * self._recent
+        )
+        if self._baseline is None:
+            self._baseline = latency_s
+        if self._recent > self._baseline * LATENCY_TOLERANCE:
+            self._backoff(now)
+            return
+
+        # Samples past the tolerance never reach the baseline — otherwise a
+        # slow creep would teach it that slow is normal.
+        self._baseline = _SLOW_ALPHA * latency_s + (1 - _SLOW_ALPHA) * self._baseline
+        # Grow only on evidence: a limit nobody is using proves nothing, and
+        # would drift to the ceiling overnight and overshoot at the first burst.
+        if was_saturated or self.queue_depth:
+            self._limit = min(self.ceiling, self._limit + 1 / self._limit)
+
+    def _backoff(self, now: float) -> None:
+        cooldown = max(self._recent or 0.0, _MIN_COOLDOWN_S)
+        if now - self._last_backoff < cooldown:
+            return
+        self._last_backoff = now
+        self._limit = max(self.floor, self._limit * BACKOFF)
@@ -1,4 +1,4 @@
-from typing import List, Literal, Optional, Union
+from typing import List, Literal, Optional, TypeVar, Union
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -13,6 +13,7 @@ MAX_REST_S = 3_600
 MAX_REPEAT = 100
 MIN_PACE_S = 90    # 1:30/km — faster than the world record
 MAX_PACE_S = 1200  # 20:00/km — slower than walking
+MAX_WORKOUTS = 7   # one plan message holds at most a week of workouts
 
 
 def _pad_pace(value: Optional[str]) -> Optional[str]:
@@ -93,3 +94,25 @@ class Workout(BaseModel):
     warmup: Optional[Segment] = None
     intervals: List[Element] = Field(description="Main workout segment of run/rest steps or repeat groups")
     cooldown: Optional[Segment] = None
+
+
+class WorkoutPlan(BaseModel):
+    """Several workouts sent as one message — a coach's week — in the order given.
+
+    The count bound is a validator, not a schema constraint: neither provider's
+    structured outputs reliably enforces array lengths, and the upper bound is
+    what stops one message from fanning out into unbounded uploads.
+    """
+
+    workouts: List[Workout] = Field(description="One entry per workout, in the order given")
+
+    @field_validator("workouts")
+    @classmethod
+    def _count(cls, value: List[Workout]) -> List[Workout]:
+        if not 1 <= len(value) <= MAX_WORKOUTS:
+            raise ValueError(f"a plan holds 1-{MAX_WORKOUTS} workouts, got {len(value)}")
+        return value
+
+
+# What a provider call can be asked to produce: one workout, or a plan of them.
+Output = TypeVar("Output", Workout, WorkoutPlan)
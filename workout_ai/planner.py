@@ -1,39 +1,126 @@
-"""Provider dispatch: free text in, validated workout dict out."""
+"""Provider dispatch: free text in, validated workout dict out.
+
+The configured provider is the primary; an optional fallback provider lets
+router.py hedge slow calls and fail over on overload (see there).
+"""
 
 import asyncio
+import hashlib
 from pathlib import Path
 
-from . import config
+from . import clients, config, router
 from .errors import WorkoutAIConfigError
+from .models import WorkoutPlan
 from .providers import REGISTRY
+from .trace import ParseTrace
 
 # Two prompt variants live at the repo root, resolved relative to this package so
 # they load regardless of the CWD. SYSTEM_PROMPT.md is the full version tuned for
 # chat models; SYSTEM_PROMPT_REASONING.md is the condensed one for reasoning
 # models. A provider opts its model into the short one by exposing
 # wants_reasoning_prompt(model); absent that, the full prompt is used.
+#
+# Both are read once, at import, and hashed once. They used to be re-read from
+# disk on every call and re-hashed for every parse-cache key. The prompt is the
+# static prefix of every request, which the providers cache (see the providers
+# for how each is marked). A prompt edit now needs a restart, like any other
+# code change.
+#
+# A multi-workout plan (batch.py) gets either prompt with SYSTEM_PROMPT_BATCH.md
+# appended, and is parsed into a WorkoutPlan. Appended, not prepended: the
+# single-workout rules stay the cached prefix, and the batch variant is its own
+# prompt with its own hash, so batch and single parses never share a cache key.
 _ROOT = Path(__file__).resolve().parent.parent
 _PROMPT_PATH = _ROOT / "SYSTEM_PROMPT.md"
 _REASONING_PROMPT_PATH = _ROOT / "SYSTEM_PROMPT_REASONING.md"
+_BATCH_ADDENDUM = (_ROOT / "SYSTEM_PROMPT_BATCH.md").read_text(encoding="utf-8")
+
+_PROMPTS = {
+    (path, batch): path.read_text(encoding="utf-8") + (f"\n\n{_BATCH_ADDENDUM}" if batch else "")
+    for path in (_PROMPT_PATH, _REASONING_PROMPT_PATH)
+    for batch in (False, True)
+}
+_PROMPT_SHAS = {
+    key: hashlib.sha256(text.encode("utf-8")).hexdigest() for key, text in _PROMPTS.items()
+}
 
 
-def load_system_prompt(provider, model: str) -> str:
+def _prompt_path(provider, model: str) -> Path:
     wants = getattr(provider, "wants_reasoning_prompt", None)
-    path = _REASONING_PROMPT_PATH if wants and wants(model) else _PROMPT_PATH
-    return path.read_text(encoding="utf-8")
+    return _REASONING_PROMPT_PATH if wants and wants(model) else _PROMPT_PATH
 
 
-def plan_to_json(description: str) -> dict:
-    return asyncio.run(plan_to_json_async(description))
+def load_system_prompt(provider, model: str, batch: bool = False) -> str:
+    return _PROMPTS[_prompt_path(provider, model), batch]
 
 
-async def plan_to_json_async(description: str) -> dict:
+def prompt_sha(provider, model: str, batch: bool = False) -> str:
+    """Content hash of the prompt this provider/model would be sent."""
+    return _PROMPT_SHAS[_prompt_path(provider, model), batch]
+
+
+def resolve():
+    """The configured (provider module, model). Raises before any request."""
     provider = REGISTRY.get(config.PROVIDER)
     if provider is None:
         raise WorkoutAIConfigError(
             f"Unknown WORKOUT_AI_PROVIDER={config.PROVIDER!r}; expected one of {sorted(REGISTRY)}"
         )
+    return provider, config.MODEL or provider.DEFAULT_MODEL
+
 
-    model = config.MODEL or provider.DEFAULT_MODEL
-    workout = await provider.plan(load_system_prompt(provider, model), description, model)
+def resolve_fallback():
+    """The (provider module, model) to hedge and fail over to, or None."""
+    if config.FALLBACK_PROVIDER is None:
+        return None
+    provider = REGISTRY.get(config.FALLBACK_PROVIDER)
+    if provider is None or config.FALLBACK_PROVIDER == config.PROVIDER:
+        raise WorkoutAIConfigError(
+            f"WORKOUT_AI_FALLBACK_PROVIDER={config.FALLBACK_PROVIDER!r} must be one of "
+            f"{sorted(REGISTRY)} other than WORKOUT_AI_PROVIDER"
+        )
+    return provider, config.FALLBACK_MODEL or provider.DEFAULT_MODEL
+
+
+def _route(provider, model: str, description: str, batch: bool = False) -> router.Route:
+    prompt = load_system_prompt(provider, model, batch)
+    if batch:
+        return router.Route(
+            provider.NAME, lambda: provider.plan(prompt, description, model, WorkoutPlan)
+        )
+    return router.Route(provider.NAME, lambda: provider.plan(prompt, description, model))
+
+
+def plan_to_json(description: str) -> dict:
+    # Pooled SDK clients are bound to the loop they first ran on, and
+    # asyncio.run tears that loop down — close them with it.
+    async def _run() -> dict:
+        try:
+            return await plan_to_json_async(description)
+        finally:
+            await clients.close_all()
+
+    return asyncio.run(_run())
+
+
+async def _plan(description: str, trace: ParseTrace | None, batch: bool):
+    primary = _route(*resolve(), description, batch)
+    fallback = resolve_fallback()
+    output, usage = await router.run(
+        primary, _route(*fallback, description, batch) if fallback else None
+    )
+    if trace is not None:
+        trace.usage = usage
+    return output
+
+
+async def plan_to_json_async(description: str, trace: ParseTrace | None = None) -> dict:
+    """`trace`, when given, receives the provider call's Usage."""
+    workout = await _plan(description, trace, batch=False)
     return workout.model_dump(exclude_none=True)
+
+
+async def plan_batch_async(description: str, trace: ParseTrace | None = None) -> list[dict]:
+    """A multi-workout plan in one provider call: one workout dict per entry."""
+    plan = await _plan(description, trace, batch=True)
+    return [workout.model_dump(exclude_none=True) for workout in plan.workouts]
@@ -1,8 +1,29 @@
+from anthropic import APIConnectionError as AnthropicConnectionError
+from openai import APIConnectionError as OpenAIConnectionError
+
+from ..errors import LLMQuotaExhausted
 from . import claude, openai
 
 # Each provider module exposes NAME, DEFAULT_MODEL, and an async plan() with the
-# signature plan(system_prompt, description, model) -> Workout. To add a provider,
+# signature plan(system_prompt, description, model) -> (Workout, Usage). To add a provider,
 # drop a new module here and append it to _MODULES.
 _MODULES = (openai, claude)
 
 REGISTRY = {module.NAME: module for module in _MODULES}
+
+
+def is_overload(e: BaseException) -> bool:
+    """Whether a provider error means "too much load", not "bad request".
+
+    429 rate limits, 5xx/529 overloaded, and connection failures/timeouts
+    (both SDKs' APITimeoutError subclasses APIConnectionError). An exhausted
+    account balance also arrives as a 429 but is no capacity signal — backing
+    off won't refill it — so it is excluded. Duck-typed on status_code so a
+    provider added later is covered without a new import here.
+    """
+    if isinstance(e, LLMQuotaExhausted):
+        return False
+    if isinstance(e, (OpenAIConnectionError, AnthropicConnectionError)):
+        return True
+    status = getattr(e, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
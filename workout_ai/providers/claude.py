@@ -2,9 +2,12 @@ import os
 
 from anthropic import AnthropicError, AsyncAnthropic, BadRequestError
 
+from .. import clients
 from ..config import LLM_TIMEOUT_S
 from ..errors import LLMQuotaExhausted, WorkoutAIConfigError
-from ..models import Workout
+from ..models import Output, Workout
+from ..streaming import check_partial
+from ..trace import Usage
 
 NAME = "claude"
 DEFAULT_MODEL = "claude-haiku-4-5"
@@ -19,7 +22,25 @@ THINKING_BUDGET = 2000
 MAX_TOKENS = 8000
 
 
-async def plan(system_prompt: str, description: str, model: str) -> Workout:
+def _usage(message, model: str) -> Usage:
+    usage = message.usage
+    cached = usage.cache_read_input_tokens or 0
+    written = usage.cache_creation_input_tokens or 0
+    thinking = getattr(usage, "output_tokens_details", None)
+    return Usage(
+        NAME,
+        model,
+        input_tokens=usage.input_tokens + cached + written,
+        output_tokens=usage.output_tokens,
+        cached_tokens=cached,
+        cache_write_tokens=written,
+        reasoning_tokens=thinking.thinking_tokens if thinking else 0,
+    )
+
+
+async def plan(
+    system_prompt: str, description: str, model: str, output: type[Output] = Workout
+) -> tuple[Output, Usage]:
     # A missing key must surface as our misconfiguration BEFORE any request is
     # issued, so the caller can refund the quota unit. The SDK only raises a
     # TypeError at request-build time, so check explicitly instead.
@@ -27,18 +48,34 @@ async def plan(system_prompt: str, description: str, model: str) -> Workout:
     if not api_key:
         raise WorkoutAIConfigError("ANTHROPIC_API_KEY is not set")
     try:
-        client = AsyncAnthropic(api_key=api_key, timeout=LLM_TIMEOUT_S)
+        client = clients.get(
+            NAME, api_key, LLM_TIMEOUT_S,
+            lambda: AsyncAnthropic(api_key=api_key, timeout=LLM_TIMEOUT_S),
+        )
     except AnthropicError as e:
         raise WorkoutAIConfigError(f"Anthropic client init failed: {e}") from e
+    # The system prompt is the static prefix of every call. Marking it as a
+    # cache breakpoint means repeat calls read it at a tenth of the input price
+    # instead of paying for it again. The cache lives 5 minutes, and each hit
+    # refreshes it, so real traffic keeps it warm. A prompt shorter than the
+    # model's minimum cacheable length is sent uncached, with no error; the
+    # cache counts in the workout log show which case applies.
+    system = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
     try:
-        message = await client.messages.parse(
+        # Streamed for early rejection of out-of-bounds output; see streaming.py.
+        # Thinking deltas aren't "text" events, so only the JSON is checked.
+        async with client.messages.stream(
             model=model,
             max_tokens=MAX_TOKENS,
             thinking={"type": "enabled", "budget_tokens": THINKING_BUDGET},
-            system=system_prompt,
+            system=system,
             messages=[{"role": "user", "content": description}],
-            output_format=Workout,
-        )
+            output_format=output,
+        ) as stream:
+            async for event in stream:
+                if event.type == "text":
+                    check_partial(event.snapshot)
+            message = await stream.get_final_message()
     except BadRequestError as e:
         # Anthropic has no dedicated error code for an empty balance — it comes
         # back as a 400 invalid_request_error whose message says "credit balance
@@ -48,4 +85,4 @@ async def plan(system_prompt: str, description: str, model: str) -> Workout:
         raise
     if message.parsed_output is None:  # refusal or truncation
         raise ValueError(f"Model did not return a structured workout: {message.stop_reason}")
-    return message.parsed_output
+    return message.parsed_output, _usage(message, model)
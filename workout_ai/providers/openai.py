@@ -1,10 +1,15 @@
+import hashlib
 import os
+from functools import lru_cache
 
 from openai import AsyncOpenAI, OpenAIError, RateLimitError
 
+from .. import clients
 from ..config import LLM_TIMEOUT_S
 from ..errors import LLMQuotaExhausted, WorkoutAIConfigError
-from ..models import Workout
+from ..models import Output, Workout
+from ..streaming import check_partial
+from ..trace import Usage
 
 NAME = "openai"
 DEFAULT_MODEL = "gpt-5.6-luna"
@@ -26,17 +31,52 @@ def _is_chat_model(model: str) -> bool:
     return model.startswith(_CHAT_PREFIXES)
 
 
+@lru_cache(maxsize=8)
+def _prompt_cache_key(system_prompt: str) -> str:
+    # OpenAI caches any prompt prefix of 1024+ tokens automatically; the key
+    # routes requests sharing this prompt to the same cache shard, which keeps
+    # the hit rate up under load. Derived from the prompt text, so an edit
+    # starts a fresh cache line instead of sharing one with the old prompt. The
+    # prompt is one of two strings loaded once (planner.py), so this hashes
+    # twice per process.
+    return "workout-" + hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def _usage(completion, model: str) -> Usage:
+    usage = completion.usage
+    if usage is None:
+        return Usage(NAME, model)
+    prompt_details = usage.prompt_tokens_details
+    completion_details = usage.completion_tokens_details
+    return Usage(
+        NAME,
+        model,
+        input_tokens=usage.prompt_tokens,
+        output_tokens=usage.completion_tokens,
+        cached_tokens=(prompt_details.cached_tokens or 0) if prompt_details else 0,
+        reasoning_tokens=(
+            (completion_details.reasoning_tokens or 0) if completion_details else 0
+        ),
+    )
+
+
 def wants_reasoning_prompt(model: str) -> bool:
     """Reasoning models get the condensed SYSTEM_PROMPT_REASONING.md (the full
     prompt's repetition and emphasis are band-aids for chat-model arithmetic)."""
     return not _is_chat_model(model)
 
 
-async def plan(system_prompt: str, description: str, model: str) -> Workout:
+async def plan(
+    system_prompt: str, description: str, model: str, output: type[Output] = Workout
+) -> tuple[Output, Usage]:
     # Construction raises on a missing key — before any request is issued, which
     # is what lets the caller refund the quota unit for our misconfiguration.
+    api_key = os.environ.get("OPENAI_API_KEY")
     try:
-        client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), timeout=LLM_TIMEOUT_S)
+        client = clients.get(
+            NAME, api_key, LLM_TIMEOUT_S,
+            lambda: AsyncOpenAI(api_key=api_key, timeout=LLM_TIMEOUT_S),
+        )
     except OpenAIError as e:
         raise WorkoutAIConfigError(f"OpenAI client init failed: {e}") from e
     if _is_chat_model(model):
@@ -46,15 +86,24 @@ async def plan(system_prompt: str, description: str, model: str) -> Workout:
             max_completion_tokens=REASONING_MAX_TOKENS, reasoning_effort=REASONING_EFFORT
         )
     try:
-        completion = await client.chat.completions.parse(
+        # Streamed so an output that has already broken a Workout bound is
+        # dropped mid-generation instead of paid for to the last token (see
+        # streaming.py). The final completion is still parsed and validated
+        # whole, exactly as the non-streaming call did.
+        async with client.chat.completions.stream(
             model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": description},
             ],
-            response_format=Workout,
+            response_format=output,
+            prompt_cache_key=_prompt_cache_key(system_prompt),
             **params,
-        )
+        ) as stream:
+            async for event in stream:
+                if event.type == "content.delta":
+                    check_partial(event.snapshot)
+            completion = await stream.get_final_completion()
     except RateLimitError as e:
         # OpenAI reuses 429 for two very different things: a transient RPM/TPM
         # limit (retryable, stays a RateLimitError) and an exhausted account
@@ -67,4 +116,4 @@ async def plan(system_prompt: str, description: str, model: str) -> Workout:
     message = completion.choices[0].message
     if message.parsed is None:  # refusal or truncation
         raise ValueError(f"Model did not return a structured workout: {message.refusal}")
-    return message.parsed
+    return message.parsed, _usage(completion, model)
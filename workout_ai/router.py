@@ -0,0 +1,196 @@
+"""Provider routing: hedged requests and failover across providers.REGISTRY.
+
+With a single provider, that provider's bad minute is our bad minute: every
+parse waits out LLM_TIMEOUT_S while it is slow, and every parse fails while it
+answers 429/5xx. Both API keys already live in .env, so a second provider is
+available; this module uses it in two ways, only when
+WORKOUT_AI_FALLBACK_PROVIDER names one (unset, it calls the primary directly
+and nothing else changes).
+
+Hedging (the tail-at-scale trick). A call to the primary that is still running
+when it reaches LLM_HEDGE_PERCENTILE of the primary's recent healthy latency is
+probably stuck in the tail. A second request then goes to the fallback, the
+first valid Workout wins, and the loser is cancelled. Because providers stream
+(streaming.py), cancelling closes the stream and stops its token generation
+rather than letting it run to the end. Until the primary has MIN_SAMPLES
+healthy latencies there is no percentile, and so no hedging.
+
+Hedging is what could break the cost cap, since a hedged parse is two billable
+calls for one quota unit. A token bucket bounds it: every routed request earns
+LLM_HEDGE_BUDGET of a token, and a hedge spends a whole one. At the default 0.1,
+hedges stay under ~10% of traffic however slow the primary gets; when the
+bucket is empty the request just waits on the primary as before.
+
+Failover. A primary call that fails with an overload error (429, 5xx,
+connection — providers.is_overload) or an exhausted account is retried on the
+fallback at once. This spends no hedge budget: the failed call was rejected at
+the door and not billed. LLM_FAILOVER_ERRORS such errors in a row mark the
+provider down for LLM_FAILOVER_COOLDOWN_S. While it is down the fallback is
+tried first, and the down provider is neither hedged to nor failed over to.
+After the cooldown it gets traffic again, so one probe decides whether it stays.
+
+State is per process, like the adaptive limit in limiter.py: each replica
+learns its own latencies and trips on its own errors.
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from .config import (
+    LLM_FAILOVER_COOLDOWN_S,
+    LLM_FAILOVER_ERRORS,
+    LLM_HEDGE_BUDGET,
+    LLM_HEDGE_PERCENTILE,
+)
+from .errors import LLMQuotaExhausted
+from .models import Workout, WorkoutPlan
+from .providers import is_overload
+from .trace import Usage
+
+LATENCY_WINDOW = 200  # healthy latencies kept per provider
+MIN_SAMPLES = 20      # below this the percentile is noise: don't hedge
+HEDGE_BURST = 10      # most hedges the bucket can save up for one slow spell
+
+
+Planned = tuple[Workout | WorkoutPlan, Usage]
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str                              # provider NAME
+    call: Callable[[], Awaitable[Planned]]  # issues one provider request
+
+
+class _Health:
+    def __init__(self):
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.overloads = 0  # consecutive
+        self.down_until = float("-inf")
+
+    @property
+    def up(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def hedge_delay(self) -> float | None:
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(LLM_HEDGE_PERCENTILE * len(ordered)))]
+
+    def ok(self, latency_s: float) -> None:
+        self.latencies.append(latency_s)
+        self.overloads = 0
+
+    def failed(self, name: str, e: Exception) -> None:
+        if not _fails_over(e):
+            return  # a bad output says nothing about the provider's health
+        self.overloads += 1
+        if self.overloads >= LLM_FAILOVER_ERRORS:
+            self.overloads = 0
+            self.down_until = time.monotonic() + LLM_FAILOVER_COOLDOWN_S
+            _stats["marked_down"] += 1
+            print(f"[llm] {name} marked down for {LLM_FAILOVER_COOLDOWN_S:.0f}s "
+                  f"after {LLM_FAILOVER_ERRORS} overload errors: {e}", flush=True)
+
+
+class _HedgeBudget:
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def earn(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+_health: dict[str, _Health] = {}
+_budget = _HedgeBudget(LLM_HEDGE_BUDGET, HEDGE_BURST)
+_stats: Counter = Counter()
+
+
+def _fails_over(e: BaseException) -> bool:
+    return is_overload(e) or isinstance(e, LLMQuotaExhausted)
+
+
+def _state(name: str) -> _Health:
+    return _health.setdefault(name, _Health())
+
+
+def stats() -> dict:
+    """Hedge/failover counters and which providers are currently down."""
+    return {
+        **_stats,
+        "hedge_tokens": round(_budget.tokens, 2),
+        "down": sorted(name for name, h in _health.items() if not h.up),
+    }
+
+
+async def _timed(route: Route) -> Planned:
+    start = time.monotonic()
+    try:
+        planned = await route.call()
+    except Exception as e:
+        _state(route.name).failed(route.name, e)
+        raise
+    _state(route.name).ok(time.monotonic() - start)
+    return planned
+
+
+async def run(primary: Route, fallback: Route | None = None) -> Planned:
+    """One parse over up to two providers: the winning call's (output, Usage).
+    Raises the last attempt's error if none produced a Workout."""
+    if fallback is None:
+        return await _timed(primary)
+    if not _state(primary.name).up and _state(fallback.name).up:
+        primary, fallback = fallback, primary
+
+    _budget.earn()
+    running: dict[asyncio.Task, Route] = {}
+
+    def launch(route: Route) -> None:
+        running[asyncio.create_task(_timed(route))] = route
+
+    launch(primary)
+    fallback_used = not _state(fallback.name).up
+    hedge_after = None if fallback_used else _state(primary.name).hedge_delay()
+    error: Exception | None = None
+    try:
+        while running:
+            done, _ = await asyncio.wait(
+                running, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:  # the primary crossed the hedge percentile
+                hedge_after = None
+                if _budget.spend():
+                    _stats["hedged"] += 1
+                    fallback_used = True
+                    launch(fallback)
+                continue
+            for task in done:
+                route = running.pop(task)
+                if task.exception() is None:
+                    if route is fallback:
+                        _stats["won_by_fallback"] += 1
+                    return task.result()
+                error = task.exception()
+                if route is primary and not fallback_used and _fails_over(error):
+                    _stats["failed_over"] += 1
+                    fallback_used = True
+                    hedge_after = None
+                    launch(fallback)
+        raise error
+    finally:
+        # The loser, or everything if our caller's timeout cancelled us.
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.wait(running)
@@ -0,0 +1,91 @@
+"""Early rejection of a streamed structured output that can no longer validate.
+
+The semantic bounds in models.py (repeat <= MAX_REPEAT, distances, rest, pace
+window) are enforced by Pydantic once the whole response has arrived. A
+response that is going to fail them — `"repeat": 500` — used to be generated to
+the last token, billed, and only then rejected, holding a gate slot throughout.
+The providers now stream, and feed every accumulated snapshot through
+check_partial(), which raises as soon as a bound is *clearly* broken so the
+provider can drop the stream.
+
+"Clearly" is the whole design. A partial parse sees a prefix: the number being
+typed may be incomplete and the string being typed is not there at all
+(jiter's partial_mode="on" drops unterminated strings). So only upper bounds
+are checked on numbers — a prefix of a non-negative integer never exceeds the
+final value, so a prefix already over the cap is conclusive — and a pace is
+checked only once its string has closed. Lower bounds, required fields, and
+types are left to the final Pydantic validation; nothing here may reject an
+output that would have validated.
+"""
+
+import re
+
+import jiter
+
+from .models import MAX_DISTANCE_M, MAX_PACE_S, MAX_REPEAT, MAX_REST_S, MIN_PACE_S, PACE
+
+_PACE_RE = re.compile(PACE)
+
+
+class OutputOutOfBounds(ValueError):
+    """The streamed output already breaks a Workout bound; it cannot validate.
+
+    A ValueError like any other unusable model output: the call was issued and
+    billed, so callers treat it as a failed parse, not as our misconfiguration.
+    """
+
+
+def check_partial(snapshot: str) -> None:
+    """Raise OutputOutOfBounds if this partial JSON already breaks a bound."""
+    try:
+        doc = jiter.from_json(snapshot.encode("utf-8"), partial_mode="on")
+    except ValueError:
+        return  # nothing parseable yet
+    if not isinstance(doc, dict):
+        return
+    if "workouts" in doc:  # a WorkoutPlan: every entry is a Workout
+        for workout in _list(doc["workouts"]):
+            if isinstance(workout, dict):
+                _check_workout(workout)
+    else:
+        _check_workout(doc)
+
+
+def _check_workout(doc: dict) -> None:
+    for section in ("warmup", "cooldown"):
+        body = doc.get(section)
+        if isinstance(body, dict):
+            _check_step(body, section)
+    for element in _list(doc.get("intervals")):
+        if not isinstance(element, dict):
+            continue
+        _check_step(element, "interval")
+        repeat = element.get("repeat")
+        if _is_number(repeat) and repeat > MAX_REPEAT:
+            raise OutputOutOfBounds(f"repeat {repeat} > {MAX_REPEAT}")
+        for step in _list(element.get("steps")):
+            if isinstance(step, dict):
+                _check_step(step, "repeat step")
+
+
+def _check_step(step: dict, where: str) -> None:
+    distance = step.get("distance")
+    if _is_number(distance) and distance > MAX_DISTANCE_M:
+        raise OutputOutOfBounds(f"{where} distance {distance} > {MAX_DISTANCE_M}")
+    rest = step.get("rest")
+    if _is_number(rest) and rest > MAX_REST_S:
+        raise OutputOutOfBounds(f"{where} rest {rest} > {MAX_REST_S}")
+    pace = step.get("pace")
+    if isinstance(pace, str) and _PACE_RE.match(pace):
+        minutes, seconds = pace.split(":")
+        total = int(minutes) * 60 + int(seconds)
+        if not MIN_PACE_S <= total <= MAX_PACE_S:
+            raise OutputOutOfBounds(f"{where} pace {pace} outside {MIN_PACE_S}-{MAX_PACE_S} s/km")
+
+
+def _list(value) -> list:
+    return value if isinstance(value, list) else []
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
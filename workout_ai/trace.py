@@ -0,0 +1,58 @@
+"""Per-request record of what parse_plan did, for the workout log.
+
+parse_plan returns the workout dict and nothing else — callers that only want
+the workout (CLI, tests) shouldn't have to unpack anything. A caller that wants
+to know *how* the workout was produced passes a ParseTrace in and reads it back
+after the call, including after a raised failure. Lives in its own module so
+the gate and the providers can both fill it without an import cycle.
+"""
+
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass
+class Usage:
+    """What one provider call consumed, normalised across providers.
+
+    input_tokens counts the whole prompt, cached part included (OpenAI's
+    prompt_tokens already does; Anthropic reports cache reads and writes
+    separately, so they are added back). cached_tokens is the part served from
+    the provider's prompt cache at the discounted rate; cache_write_tokens the
+    part written to it this call (Anthropic only, billed at a premium).
+    reasoning_tokens is the hidden reasoning/thinking share of output_tokens:
+    billed as output, never seen in the JSON.
+    """
+
+    provider: str
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+    reasoning_tokens: int = 0
+
+
+@dataclass
+class ParseTrace:
+    # "hit" when the workout came out of the parse cache (no provider call, no
+    # gate slot), "coalesced" when it shared an identical parse another request
+    # already had in flight, "miss" when this request's own parse ran, "rules"
+    # when the deterministic fast path (fastpath.py) answered before any of
+    # that — no cache lookup, no gate slot, no provider. None: never got that
+    # far (e.g. a config error before the cache was consulted).
+    cache: str | None = None
+    # Set only for the request whose own parse called a provider ("miss"): a
+    # hit, a coalesced waiter, or the fast path consumed nothing. After a hedge
+    # this is the winning call's usage; the cancelled loser's is not reported.
+    usage: Usage | None = None
+    # Milliseconds per stage of this request's own parse: "queue_wait_ms" for a
+    # gate slot, "provider_ms" for the provider call (hedge included). Empty
+    # when no provider call was made on this request's behalf.
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def log_fields(self) -> dict:
+        """The trace as log_workout_request keyword arguments."""
+        return {
+            "parse_cache": self.cache,
+            "usage": asdict(self.usage) if self.usage else None,
+        }
@@ -2,11 +2,15 @@ import os
 from datetime import datetime, timezone
 from typing import Optional
 
+from bson import ObjectId
 from pymongo.errors import OperationFailure
 
 from db import db
+from write_behind import Buffer
 
 workout_logs_col = db["workout_logs"]
+# Log lines are written behind the reply (write_behind.py).
+_buffer = Buffer(workout_logs_col, "workout log")
 
 # Raw prompts are user data, not an audit trail — they must not accrue forever.
 RETENTION_DAYS = int(os.getenv("WORKOUT_LOG_RETENTION_DAYS", "90"))
@@ -18,15 +22,38 @@ async def log_workout_request(
     workout_json: Optional[dict] = None,
     garmin_workout_id: Optional[str] = None,
     error: Optional[str] = None,
-    processing_time_ms: Optional[float] = None
+    processing_time_ms: Optional[float] = None,
+    parse_cache: Optional[str] = None,
+    usage: Optional[dict] = None,
+    timings: Optional[dict] = None,
+    batch: Optional[list] = None,
+    scheduled: Optional[list] = None,
 ) -> str:
     """
     Log a workout generation request with its result.
 
+    `parse_cache` is "rules"/"hit"/"coalesced"/"miss" (see workout_ai.ParseTrace;
+    None when the request never reached it) — everything but "miss" is a
+    provider call saved. `usage` is that provider call's token counts
+    (workout_ai.Usage as a dict), including how much of the prompt the
+    provider served from its prompt cache; None when no call was made.
+    `timings` breaks processing_time_ms down by stage, in ms: parse (and
+    within it queue_wait and provider), prefs, token_decrypt, convert,
+    upload, refresh, schedule — whichever the request reached.
+    `batch` is set for a multi-workout plan, one {"name", "garmin_workout_id"}
+    or {"name", "error"} per workout in plan order; workout_json is then
+    {"workouts": [...]} and `error` counts the failed uploads, if any.
+    `scheduled` is set when the schedule_dates preference is on: per workout,
+    the ISO date it was put on the Garmin calendar, or None where it wasn't.
+
+    The entry is buffered and inserted shortly after (write_behind.py); this
+    never waits on Mongo and never raises on a failed write.
+
     Returns:
-        The inserted document ID as string
+        The document ID as string, assigned here since the insert comes later
     """
     log_entry = {
+        "_id": ObjectId(),
         "user_id": user_id,
         "prompt": prompt,
         # tz-aware: utcnow() is deprecated and naive, and the TTL index below
@@ -37,10 +64,15 @@ async def log_workout_request(
         "garmin_workout_id": garmin_workout_id,
         "error": error,
         "processing_time_ms": processing_time_ms,
+        "parse_cache": parse_cache,
+        "usage": usage,
+        "timings": timings,
+        "batch": batch,
+        "scheduled": scheduled,
     }
 
-    result = await workout_logs_col.insert_one(log_entry)
-    return str(result.inserted_id)
+    _buffer.add(log_entry)
+    return str(log_entry["_id"])
 
 
 async def get_user_workout_history(user_id: int, limit: int = 10) -> list:
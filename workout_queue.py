@@ -0,0 +1,102 @@
+"""Per-user FIFO of workout plans that arrived while one was in flight.
+
+bot.py runs one workout per user at a time. It used to drop anything sent in
+the meantime and ask for a resend, so a user pasting three plans back to back
+lost two. Those plans now wait here, and the in-flight handler drains them one
+after another, keeping the single-flight guarantee.
+
+Bounded twice: at most WORKOUT_QUEUE_MAX plans per user (past that the message
+is refused, as before), and a plan older than WORKOUT_QUEUE_MAX_AGE_S is
+dropped with a note rather than uploaded long after the user moved on.
+
+Backed by a Redis list when Redis is configured, like session.py, so queued
+plans survive a restart: the leftovers are drained after the user's next
+workout, if still young enough. Falls back to in-process deques when Redis is
+absent. The bounded append is one Lua script: a push used to RPUSH and then
+RPOP its own entry on overflow, and a pop plus another push landing between
+the two made that RPOP take someone else's plan, which was lost with no
+reply. An entry is the plan text plus where to reply (chat and message id),
+never a token; it holds the same user data workout_logs does.
+"""
+
+import json
+import os
+import time
+from collections import deque
+
+import redis_conn
+
+WORKOUT_QUEUE_MAX = int(os.getenv("WORKOUT_QUEUE_MAX", "3"))
+WORKOUT_QUEUE_MAX_AGE_S = int(os.getenv("WORKOUT_QUEUE_MAX_AGE_S", "600"))
+
+_fallback: dict[int, deque] = {}
+
+# KEYS: queue. ARGV: entry, max length, ttl s. The new length, or 0 if full.
+_PUSH_LUA = """
+if redis.call('llen', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+local depth = redis.call('rpush', KEYS[1], ARGV[1])
+redis.call('expire', KEYS[1], ARGV[3])
+return depth
+"""
+
+
+def _key(uid: int) -> str:
+    return f"workq:{uid}"
+
+
+def expired(entry: dict) -> bool:
+    return time.time() - entry["ts"] > WORKOUT_QUEUE_MAX_AGE_S
+
+
+async def push(
+    uid: int, chat_id: int, message_id: int, text: str, priority: str | None = None
+) -> int | None:
+    """Queue a plan. Its 1-based position, or None when the queue is full.
+
+    `priority` carries the dispatcher's LLM-queue hint (a workout_ai.Priority
+    value) to the worker that runs the plan, in stream dispatch."""
+    entry = {"chat_id": chat_id, "message_id": message_id, "text": text, "ts": time.time()}
+    if priority is not None:
+        entry["priority"] = priority
+    r = redis_conn.client
+    if r is not None:
+        depth = await r.eval(
+            _PUSH_LUA, 1, _key(uid), json.dumps(entry), WORKOUT_QUEUE_MAX, WORKOUT_QUEUE_MAX_AGE_S
+        )
+        return depth or None
+    queue = _fallback.setdefault(uid, deque())
+    if len(queue) >= WORKOUT_QUEUE_MAX:
+        return None
+    queue.append(entry)
+    return len(queue)
+
+
+async def pop(uid: int) -> dict | None:
+    """The oldest queued plan for this user, or None."""
+    r = redis_conn.client
+    if r is not None:
+        raw = await r.lpop(_key(uid))
+        return json.loads(raw) if raw is not None else None
+    queue = _fallback.get(uid)
+    if not queue:
+        _fallback.pop(uid, None)
+        return None
+    return queue.popleft()
+
+
+async def depth(uid: int) -> int:
+    r = redis_conn.client
+    if r is not None:
+        return await r.llen(_key(uid))
+    return len(_fallback.get(uid, ()))
+
+
+async def clear(uid: int) -> None:
+    """Forget a user's queued plans (they logged out)."""
+    r = redis_conn.client
+    if r is not None:
+        await r.delete(_key(uid))
+    else:
+        _fallback.pop(uid, None)
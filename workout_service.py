@@ -7,9 +7,11 @@ logging. Telegram stays in bot.py — this module never sees a Message; it
 returns a typed Outcome and bot.py owns the copy.
 
 The invariant the quota handling draws: REFUND IFF NOTHING WAS BILLED AND THE
-FAILURE IS OURS. LLMBusy and WorkoutAIConfigError are raised strictly before
-any provider call, and LLMQuotaExhausted means the provider bounced the request
-at the door (empty account balance — no tokens consumed); all three refund.
+FAILURE IS OURS. An open Garmin breaker (garmin_breaker) turns the request
+away before the parse; LLMBusy and WorkoutAIConfigError are raised strictly
+before any provider call; and LLMQuotaExhausted means the provider bounced the
+request at the door (empty account balance — no tokens consumed). All four
+refund.
 Past those, a billable call went out, so the quota stays consumed — refunding
 would make malformed input free to retry in a loop, the exact "failures cost
 nothing" hole that consuming up-front closes.
@@ -17,22 +19,45 @@ nothing" hole that consuming up-front closes.
 
 import asyncio
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import date, datetime, timezone
 from enum import Enum
 from typing import Awaitable, Callable
 
+import garmin_breaker
+import plan_dates
 import prefs
+import upload_outbox
 from audit import log_auth_event
-from garmin import GarminAuthExpired, refresh_token_async, upload_parsed_workout
+from garmin import (
+    GarminAuthExpired,
+    refresh_token_async,
+    schedule_workout_async,
+    token_expires_at,
+    upload_garmin_payload_async,
+)
+from garmin_convert import convert
 from rate_limiter import RateLimiterUnavailable, RateLimitExceeded, consume, refund
-from user import get_garmin_token, save_user
-from workout_ai import LLMBusy, LLMQuotaExhausted, WorkoutAIConfigError, parse_plan
+from user import get_garmin_token, save_token
+from workout_ai import (
+    LLMBusy,
+    LLMQuotaExhausted,
+    ParseTrace,
+    Priority,
+    WorkoutAIConfigError,
+    llm_stats,
+    looks_like_batch,
+    parse_plan,
+    parse_plan_batch,
+)
 from workout_log import log_workout_request
 
 
 class FailureCode(Enum):
     RATE_LIMITED = "rate_limited"        # over quota; detail is the human-readable limit message
     LIMITER_DOWN = "limiter_down"        # Redis unreachable; fail closed, nothing processed
+    GARMIN_DOWN = "garmin_down"          # Garmin breaker open, before any parse; quota refunded
     LLM_BUSY = "llm_busy"                # load shed before any provider call; quota refunded
     CONFIG_ERROR = "config_error"        # our env/misconfig, pre-request; quota refunded
     PROVIDER_QUOTA = "provider_quota"    # provider account out of credits; quota refunded
@@ -41,12 +66,18 @@ class FailureCode(Enum):
     TOKEN_UNREADABLE = "token_unreadable"  # stored credential undecryptable; re-login required
     AUTH_EXPIRED = "auth_expired"        # 401 and the refresh also failed; re-login required
     UPLOAD_FAILED = "upload_failed"      # Garmin rejected the upload; billed
+    UPLOAD_DEFERRED = "upload_deferred"  # Garmin unwell; queued in upload_outbox; billed
 
 
 @dataclass
 class Success:
     workout_id: str
     processing_ms: float
+    # With the schedule_dates preference: the calendar date the workout was
+    # put on, or schedule_failed when the plan named a date but Garmin refused
+    # it. The upload stands either way.
+    scheduled_for: date | None = None
+    schedule_failed: bool = False
 
 
 @dataclass
@@ -55,7 +86,21 @@ class Failure:
     detail: str = ""
 
 
-Outcome = Success | Failure
+@dataclass
+class BatchOutcome:
+    """A multi-workout plan that reached upload: one result per workout, in
+    plan order. Parsed and billed as one request; each upload stands alone."""
+
+    names: list[str]
+    results: list[Success | Failure]
+    processing_ms: float
+
+
+Outcome = Success | Failure | BatchOutcome
+
+# Uploads of one batch in flight at once. They share the user's token (and, on
+# the default transport, garmin's one HTTP session).
+BATCH_UPLOAD_CONCURRENCY = 4
 
 # Mid-flow progress hook (e.g. "refreshed, retrying"). Async so the bot can
 # surface it as a chat message without this module importing Telegram.
@@ -67,6 +112,33 @@ Notify = Callable[[str], Awaitable[None]]
 OnAccepted = Callable[[], Awaitable[None]]
 
 
+class _Stopwatch:
+    """Wall time per stage of one request, in ms, for the workout log.
+
+    processing_time_ms alone could not say whether a slow request queued for a
+    gate slot, waited on the provider, or waited on Garmin. A stage that runs
+    twice (the upload retried after a refresh) accumulates.
+    """
+
+    def __init__(self):
+        self.ms: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = (time.monotonic() - start) * 1000
+            self.ms[f"{name}_ms"] = round(self.ms.get(f"{name}_ms", 0.0) + elapsed, 1)
+
+
+def _log_fields(trace: ParseTrace, clock: _Stopwatch) -> dict:
+    # The gate's stages (queue wait, provider) come from the trace; ours from
+    # the stopwatch.
+    return {**trace.log_fields(), "timings": {**trace.timings, **clock.ms}}
+
+
 async def _noop_notify(_: str) -> None:
     return None
 
@@ -81,9 +153,24 @@ async def process_workout(
     plan_text: str,
     notify: Notify = _noop_notify,
     on_accepted: OnAccepted = _noop_accepted,
+    priority: Priority = Priority.INTERACTIVE,
 ) -> Outcome:
     """Run one workout request end to end. Never raises on expected failures.
 
+    A plan holding several workouts (workout_ai.looks_like_batch) is parsed in
+    one call and its workouts uploaded concurrently; it returns a BatchOutcome
+    unless it failed as a whole (quota, parse, token, auth).
+
+    With the schedule_dates preference on, every uploaded workout whose plan
+    label names a day (plan_dates) is also put on the Garmin calendar. A
+    scheduling failure is reported on the Success, never as a failed upload.
+
+    An upload that fails because Garmin is unwell goes to upload_outbox and is
+    reported as UPLOAD_DEFERRED: uploaded later, with no second parse.
+
+    `priority` is the request's class in the LLM queue (workout_ai.Priority);
+    it only matters when the gate is contended.
+
     May mutate and persist `user_data` (refreshed Garmin token). The caller is
     responsible for per-user single-flighting; this function assumes it is the
     only in-flight request for `user_id`.
@@ -99,18 +186,36 @@ async def process_workout(
         # Fail closed: without a working limiter we cannot bound spend.
         return Failure(FailureCode.LIMITER_DOWN)
 
+    if not await garmin_breaker.allow():
+        # Garmin (or the proxy Worker) has been failing: the upload would fail
+        # after a billed parse. Nothing is spent yet, so turn the request away
+        # here, before the "Uploading..." notice, and hand the quota back.
+        await refund(user_id, receipt)
+        await log_workout_request(user_id=user_id, prompt=plan_text, error="Garmin breaker open")
+        return Failure(FailureCode.GARMIN_DOWN)
+
     await on_accepted()
     start = time.monotonic()
+    trace = ParseTrace()
+    clock = _Stopwatch()
+    batch = looks_like_batch(plan_text)
 
     try:
         # Parse once. The refresh retry below reuses this result rather than
-        # paying for a second LLM call.
-        workout_json = await parse_plan(plan_text)
+        # paying for a second LLM call. A multi-workout plan is still one parse
+        # (and one quota unit), returning every workout at once.
+        with clock.stage("parse"):
+            if batch:
+                workouts = await parse_plan_batch(plan_text, trace, priority)
+            else:
+                workouts = [await parse_plan(plan_text, trace, priority)]
     except LLMBusy:
         # Load shed, not a failure of this request — nothing was billed. Logged
-        # so the rate of shedding is visible; it's the signal to raise
-        # LLM_CONCURRENCY (or that the provider is degraded).
+        # so the rate of shedding is visible; shedding while the adaptive limit
+        # sits at LLM_CONCURRENCY_MAX is the signal to raise the ceiling, at
+        # the floor that the provider is degraded.
         await refund(user_id, receipt)
+        print(f"[llm] user={user_id} shed as busy {llm_stats()}", flush=True)
         await log_workout_request(user_id=user_id, prompt=plan_text, error="LLM busy")
         return Failure(FailureCode.LLM_BUSY)
     except WorkoutAIConfigError as e:
@@ -130,12 +235,17 @@ async def process_workout(
         await log_workout_request(user_id=user_id, prompt=plan_text, error=f"provider quota: {e}")
         return Failure(FailureCode.PROVIDER_QUOTA)
     except asyncio.TimeoutError:
-        await log_workout_request(user_id=user_id, prompt=plan_text, error="LLM timeout")
+        await log_workout_request(
+            user_id=user_id, prompt=plan_text, error="LLM timeout", **_log_fields(trace, clock)
+        )
         return Failure(FailureCode.PARSE_TIMEOUT)
     except Exception as e:
         print(f"[parse] user={user_id} err={type(e).__name__}: {e}", flush=True)
         await log_workout_request(
-            user_id=user_id, prompt=plan_text, error=f"{type(e).__name__}: {e}"
+            user_id=user_id,
+            prompt=plan_text,
+            error=f"{type(e).__name__}: {e}",
+            **_log_fields(trace, clock),
         )
         return Failure(FailureCode.PARSE_FAILED)
 
@@ -143,68 +253,245 @@ async def process_workout(
     # here — after the LLM, before upload and logging — so the logged
     # workout_json is exactly what went to Garmin. Pure dict surgery, cannot
     # fail, costs nothing when the prefs change nothing.
-    workout_json = prefs.apply(workout_json, prefs.resolve(user_data.get("prefs")))
+    with clock.stage("prefs"):
+        resolved = prefs.resolve(user_data.get("prefs"))
+        workouts = [prefs.apply(workout, resolved) for workout in workouts]
 
     try:
-        token = await get_garmin_token(user_data)
+        with clock.stage("token_decrypt"):
+            token = await get_garmin_token(user_data)
     except Exception as e:
         # InvalidTag (tampered/swapped ciphertext) or a key mismatch after a
         # bad rotation. The stored credential is unusable; re-login is the fix.
         print(f"[token] user={user_id} decrypt failed: {type(e).__name__}: {e}", flush=True)
-        await log_workout_request(user_id=user_id, prompt=plan_text, error="token decrypt failed")
+        await log_workout_request(
+            user_id=user_id,
+            prompt=plan_text,
+            error="token decrypt failed",
+            **_log_fields(trace, clock),
+        )
         return Failure(FailureCode.TOKEN_UNREADABLE)
 
     try:
-        try:
-            workout_id, refreshed = await upload_parsed_workout(token, workout_json)
-        except GarminAuthExpired:
+        # Converted once: the retry after a refresh re-sends the same payloads.
+        with clock.stage("convert"):
+            payloads = [convert(workout) for workout in workouts]
+        expires_at = token_expires_at(token)
+        if len(payloads) > 1 and expires_at is not None and expires_at < time.time():
+            # Uploaded concurrently, every upload would refresh the expired
+            # token on its own; refresh it once for all of them instead. An
+            # unreadable expiry proves nothing: the uploads go ahead, and a
+            # 401 refreshes below.
+            token = await _refresh(user_id, user_data, token, clock, "pre-batch")
+        with clock.stage("upload"):
+            results = await _upload_all(user_id, token, payloads)
+        expired = [i for i, r in enumerate(results) if isinstance(r, GarminAuthExpired)]
+        if expired:
             # Token expired — refresh via OAuth1 (no SSO hit) and re-upload the
-            # ALREADY-PARSED workout. Re-running the plan through the LLM here
+            # ALREADY-PARSED workouts. Re-running the plan through the LLM here
             # would double the token spend for a single recorded request.
-            #
-            # refresh_token_async raises whatever curl_cffi/json/consumer lookup
-            # throws, never GarminAuthExpired. Left unwrapped, a failed refresh
-            # lands in the generic `except Exception` below and the user is told
-            # to "try again" against a token that will never work. Retag it so
-            # the auth handler owns the whole auth story.
-            try:
-                new_token = await refresh_token_async(token)
-            except Exception as e:
-                await log_auth_event(user_id, "token_refresh", outcome="fail", detail=type(e).__name__)
-                raise GarminAuthExpired(f"refresh failed: {e}") from e
-            user_data["garmin_auth"] = new_token
-            await save_user(user_id, user_data)
-            await log_auth_event(user_id, "token_refresh", detail="reactive-401")
+            token = await _refresh(user_id, user_data, token, clock, "reactive-401")
             await notify("Session refreshed, retrying upload...")
-            workout_id, refreshed = await upload_parsed_workout(new_token, workout_json)
+            with clock.stage("upload"):
+                retried = await _upload_all(user_id, token, [payloads[i] for i in expired])
+            for i, result in zip(expired, retried, strict=True):
+                results[i] = result
     except GarminAuthExpired:
-        await log_workout_request(user_id=user_id, prompt=plan_text, error="auth refresh failed")
+        await log_workout_request(
+            user_id=user_id,
+            prompt=plan_text,
+            error="auth refresh failed",
+            **_log_fields(trace, clock),
+        )
         return Failure(FailureCode.AUTH_EXPIRED)
     except Exception as e:
-        # Garmin rejected the upload. The LLM call was still billed, so the
-        # quota stays consumed — that spend was real.
+        # Anything else before the uploads came back (convert, or a refresh
+        # that broke in an unexpected way). The LLM call was still billed, so
+        # the quota stays consumed — that spend was real.
         print(f"[upload] user={user_id} err={type(e).__name__}: {e}", flush=True)
         await log_workout_request(
             user_id=user_id,
             prompt=plan_text,
-            workout_json=workout_json,
+            workout_json={"workouts": workouts} if batch else workouts[0],
             error=f"{type(e).__name__}: {e}",
+            **_log_fields(trace, clock),
         )
         return Failure(FailureCode.UPLOAD_FAILED)
 
+    refreshed = next((r[1] for r in results if not isinstance(r, BaseException) and r[1]), None)
     if refreshed:
         # garth refreshed OAuth2 inside the upload. Persist it or every
         # subsequent upload re-pays this refresh round-trip forever.
-        user_data["garmin_auth"] = refreshed
-        await save_user(user_id, user_data)
-        await log_auth_event(user_id, "token_refresh", detail="garth-internal")
+        await _save_refreshed(user_id, user_data, refreshed, "garth-internal")
+
+    dates: list[date | None] = [None] * len(results)
+    scheduled: list[date | BaseException | None] = [None] * len(results)
+    if resolved["schedule_dates"]:
+        try:
+            dates = plan_dates.workout_dates(
+                plan_text, workouts, datetime.now(timezone.utc).date()
+            )
+        except Exception as e:
+            # The uploads stand; they just aren't put on the calendar.
+            print(f"[schedule] user={user_id} no dates: {type(e).__name__}: {e}", flush=True)
+        with clock.stage("schedule"):
+            scheduled = await _schedule_all(user_id, refreshed or token, results, dates)
+
+    # An upload that failed because Garmin is unwell keeps its parsed (and
+    # paid-for) workout: the outbox uploads it once Garmin recovers, and the
+    # user is told so instead of being asked to resend and re-parse.
+    deferred = [
+        isinstance(r, Exception)
+        and garmin_breaker.counts(r)
+        and await upload_outbox.defer(user_id, workout["name"], payload, on)
+        for workout, payload, r, on in zip(workouts, payloads, results, dates, strict=True)
+    ]
 
     processing_ms = (time.monotonic() - start) * 1000
+    outcomes = [
+        _upload_outcome(user_id, r, processing_ms, on, later)
+        for r, on, later in zip(results, scheduled, deferred, strict=True)
+    ]
+    scheduled_log = (
+        [on.isoformat() if isinstance(on, date) else None for on in scheduled]
+        if resolved["schedule_dates"]
+        else None
+    )
+    if batch:
+        failed = sum(isinstance(o, Failure) for o in outcomes)
+        await log_workout_request(
+            user_id=user_id,
+            prompt=plan_text,
+            workout_json={"workouts": workouts},
+            error=f"{failed} of {len(outcomes)} uploads failed" if failed else None,
+            processing_time_ms=processing_ms,
+            batch=[
+                {"name": workout["name"], "garmin_workout_id": r[0]}
+                if not isinstance(r, BaseException)
+                else {"name": workout["name"], "error": f"{type(r).__name__}: {r}",
+                      "deferred": later}
+                for workout, r, later in zip(workouts, results, deferred, strict=True)
+            ],
+            scheduled=scheduled_log,
+            **_log_fields(trace, clock),
+        )
+        return BatchOutcome(
+            names=[workout["name"] for workout in workouts],
+            results=outcomes,
+            processing_ms=processing_ms,
+        )
+
+    (workout_json,), (result,), (outcome,) = workouts, results, outcomes
+    if isinstance(result, BaseException):
+        # Garmin rejected the upload. The LLM call was still billed, so the
+        # quota stays consumed — that spend was real.
+        await log_workout_request(
+            user_id=user_id,
+            prompt=plan_text,
+            workout_json=workout_json,
+            error=f"{type(result).__name__}: {result}" + (" (deferred)" if deferred[0] else ""),
+            **_log_fields(trace, clock),
+        )
+        return outcome
     await log_workout_request(
         user_id=user_id,
         prompt=plan_text,
         workout_json=workout_json,
-        garmin_workout_id=workout_id,
+        garmin_workout_id=result[0],
         processing_time_ms=processing_ms,
+        scheduled=scheduled_log,
+        **_log_fields(trace, clock),
     )
-    return Success(workout_id=workout_id, processing_ms=processing_ms)
+    return outcome
+
+
+async def _upload_all(
+    user_id: int, token: str, payloads: list[dict]
+) -> list[tuple[str, str | None] | BaseException]:
+    """Upload every payload with the same token, concurrently, at most
+    BATCH_UPLOAD_CONCURRENCY at a time. One result per payload, in order: the
+    upload's (workout_id, refreshed_token) or the exception it raised."""
+    sem = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def upload(payload: dict):
+        async with sem:
+            return await upload_garmin_payload_async(token, payload, user_id)
+
+    return list(await asyncio.gather(*map(upload, payloads), return_exceptions=True))
+
+
+async def _schedule_all(
+    user_id: int,
+    token: str,
+    results: list[tuple[str, str | None] | BaseException],
+    dates: list[date | None],
+) -> list[date | BaseException | None]:
+    """Schedule every uploaded, dated workout, concurrently like the uploads.
+    One result per upload, in order: the date it was scheduled on, the
+    exception scheduling raised, or None when there was nothing to schedule."""
+    sem = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def schedule(result, on: date | None):
+        if on is None or isinstance(result, BaseException):
+            return None
+        async with sem:
+            await schedule_workout_async(token, result[0], on, user_id)
+        return on
+
+    return list(
+        await asyncio.gather(*map(schedule, results, dates), return_exceptions=True)
+    )
+
+
+def _upload_outcome(
+    user_id: int,
+    result,
+    processing_ms: float,
+    scheduled: date | BaseException | None = None,
+    deferred: bool = False,
+) -> Success | Failure:
+    if not isinstance(result, BaseException):
+        if isinstance(scheduled, BaseException):
+            print(f"[schedule] user={user_id} workout={result[0]} "
+                  f"err={type(scheduled).__name__}: {scheduled}", flush=True)
+            return Success(result[0], processing_ms, schedule_failed=True)
+        return Success(result[0], processing_ms, scheduled_for=scheduled)
+    if isinstance(result, GarminAuthExpired):
+        # Still 401 with a token we just refreshed: nothing more to try.
+        return Failure(FailureCode.AUTH_EXPIRED)
+    print(f"[upload] user={user_id} err={type(result).__name__}: {result}", flush=True)
+    return Failure(FailureCode.UPLOAD_DEFERRED if deferred else FailureCode.UPLOAD_FAILED)
+
+
+async def _refresh(
+    user_id: int, user_data: dict, token: str, clock: _Stopwatch, reason: str
+) -> str:
+    """Refresh OAuth2 via OAuth1 (no SSO hit) and persist it; the new token.
+
+    refresh_token_async raises whatever curl_cffi/json/consumer lookup throws,
+    never GarminAuthExpired. Left unwrapped, a failed refresh would land in the
+    upload failure path and the user would be told to "try again" against a
+    token that will never work. Retag it so the auth handler owns the whole
+    auth story.
+    """
+    try:
+        with clock.stage("refresh"):
+            new_token = await refresh_token_async(token)
+    except Exception as e:
+        await log_auth_event(user_id, "token_refresh", outcome="fail", detail=type(e).__name__)
+        raise GarminAuthExpired(f"refresh failed: {e}") from e
+    await _save_refreshed(user_id, user_data, new_token, reason)
+    return new_token
+
+
+async def _save_refreshed(user_id: int, user_data: dict, token: str, reason: str) -> None:
+    """Persist a refreshed token. A failed write is printed, not raised: the
+    token in hand works, and the uploads made with it must still be reported
+    as what they are. The next request just refreshes again."""
+    user_data["garmin_auth"] = token
+    try:
+        await save_token(user_id, token)
+    except Exception as e:
+        print(f"⚠️  token save failed (user={user_id}): {type(e).__name__}: {e}", flush=True)
+        return
+    await log_auth_event(user_id, "token_refresh", detail=reason)
@@ -0,0 +1,123 @@
+"""Write-behind buffers for the append-only collections (workout_logs, auth_events).
+
+A workout used to await one insert_one per log line and audit event on its way
+to the reply — token_decrypt, maybe token_refresh, then the workout log — each
+a sequential Mongo round trip the user waited on for a write nobody reads
+back. Those documents are now appended to a buffer and written with one
+insert_many when WRITE_BEHIND_BATCH have collected, or WRITE_BEHIND_FLUSH_S
+after the first one, whichever comes first.
+
+The trade: a crash loses at most the last WRITE_BEHIND_FLUSH_S of log lines.
+shutdown() calls flush_all(), so a deploy loses none. A failed flush is
+printed and dropped, as a failed insert_one was — these writes are
+best-effort and must never fail a workout. Batches are inserted with
+ordered=False, so one bad document costs only itself, not the rest of its
+batch.
+
+Memory is bounded: a buffer holds at most WRITE_BEHIND_MAX_PENDING documents,
+counting batches still being written. While Mongo is slow or down, anything
+past that is dropped and counted (Buffer.dropped, stats(), /healthz/writes)
+rather than queued without limit — the audit trail is the most frequent write
+we make (a token_decrypt per upload), so an outage would otherwise grow it
+for as long as it lasts.
+"""
+
+import asyncio
+import os
+
+from pymongo.errors import BulkWriteError
+
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "100"))
+WRITE_BEHIND_FLUSH_S = float(os.getenv("WRITE_BEHIND_FLUSH_S", "1"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+_buffers: list["Buffer"] = []
+
+
+class Buffer:
+    """Documents waiting for one collection. add() never awaits or raises."""
+
+    def __init__(self, collection, name: str):
+        self.collection = collection
+        self.name = name
+        self.dropped = 0      # refused for lack of room, since start
+        self._in_flight = 0   # documents in batches being written
+        self._docs: list[dict] = []
+        self._timer: asyncio.Task | None = None
+        self._flushes: set[asyncio.Task] = set()
+        _buffers.append(self)
+
+    def add(self, doc: dict) -> None:
+        if len(self._docs) + self._in_flight >= WRITE_BEHIND_MAX_PENDING:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"⚠️  {self.name} buffer full — {self.dropped} document(s) dropped", flush=True)
+            return
+        self._docs.append(doc)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop to write on; the next add or flush_all takes it
+        if len(self._docs) >= WRITE_BEHIND_BATCH:
+            self._spawn(self._write(self._take()))
+        elif self._timer is None or self._timer.done():
+            self._timer = self._spawn(self._flush_later())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+        return task
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(WRITE_BEHIND_FLUSH_S)
+        self._timer = None
+        await self.flush()
+
+    def _take(self) -> list[dict]:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        docs, self._docs = self._docs, []
+        return docs
+
+    async def flush(self) -> int:
+        """Write what is buffered now. Returns how many documents were written."""
+        return await self._write(self._take())
+
+    async def _write(self, docs: list[dict]) -> int:
+        if not docs:
+            return 0
+        self._in_flight += len(docs)
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            written = e.details.get("nInserted", 0)
+            print(f"⚠️  {self.name} write partly failed, {len(docs) - written} document(s) lost: "
+                  f"{e.details.get('writeErrors', [{}])[0].get('errmsg')}", flush=True)
+            return written
+        except Exception as e:
+            print(f"⚠️  {self.name} write failed, {len(docs)} document(s) lost: {e}", flush=True)
+            return 0
+        finally:
+            self._in_flight -= len(docs)
+        return len(docs)
+
+    async def close(self) -> int:
+        """Flush everything, including batches already on their way."""
+        written = await self.flush()
+        pending = [t for t in self._flushes if t is not asyncio.current_task()]
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        return written + sum(r for r in results if isinstance(r, int))
+
+
+def stats() -> dict[str, dict[str, int]]:
+    """Per buffer: documents waiting (buffered or being written) and dropped."""
+    return {
+        b.name: {"pending": len(b._docs) + b._in_flight, "dropped": b.dropped} for b in _buffers
+    }
+
+
+async def flush_all() -> int:
+    """Flush every buffer (at shutdown). Returns how many documents were written."""
+    return sum([await buffer.close() for buffer in _buffers])